@@ -2,16 +2,42 @@ import customtkinter as ctk
 import threading
 import time
 import os
+import sys
+import argparse
 import datetime
 import re
+import random
+import statistics
+import json
+import socket
+import asyncio
+import base64
+import ctypes
+import queue
+import zipfile
+import collections
+import concurrent.futures
+import functools
+import itertools
+import hashlib
+import html as html_lib
+import contextlib
+import http.server
+import urllib.parse
 import urllib.request
 import unicodedata
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import (
+    TimeoutException, NoSuchElementException, StaleElementReferenceException
+)
+
+from reservas import ReservasProcessos
 
 # ==============================
 # CONFIGURAÇÕES INICIAIS
@@ -24,6 +50,91 @@ RESPONSAVEIS = {
 }
 
 LOG_FILE = "logs_ueci.txt"
+LOG_RECENTE_LINHAS = 200          # linhas mantidas em memória para os pacotes de falha
+# Rotação do log: por tamanho e na virada do dia; mantém os N arquivos mais recentes
+LOG_MAX_BYTES = int(float(os.getenv("UECI_LOG_MAX_MB", "5")) * 1024 * 1024)
+LOG_BACKUPS = int(os.getenv("UECI_LOG_BACKUPS", "30"))
+LOG_VISOR_LINHAS = 1000           # máximo de linhas exibidas por filtro no visualizador
+
+# Pacotes de diagnóstico de falhas (HTML, screenshot, URL, campos e log recente por processo)
+FALHAS_DIR = os.getenv("UECI_FALHAS_DIR", "falhas_ueci")
+FALHAS_MAX_ARQUIVOS = int(os.getenv("UECI_FALHAS_MAX_ARQUIVOS", "50"))
+FALHAS_MAX_MB = float(os.getenv("UECI_FALHAS_MAX_MB", "200"))
+
+# Arquivo dos relatórios de tramitação (comprovantes), um diretório por processo. Vazio = desativado.
+# Modo: 'auto' (PDF baixado pela URL com os cookies da sessão; páginas HTML via CDP Page.printToPDF),
+# 'url' (sempre baixa pela URL; não espera a página) ou 'pdf' (sempre imprime via CDP). Imprimir espera a
+# página carregar e roda na thread da automação (segundos por processo); sem orçamento, cai para a URL.
+RELATORIOS_DIR = os.getenv("UECI_RELATORIOS_DIR", "")
+RELATORIOS_MODO = os.getenv("UECI_RELATORIOS_MODO", "auto").lower()
+RELATORIO_ESPERA_CARGA = 5.0      # máximo aguardando a aba do relatório carregar antes de arquivar
+RELATORIO_MIN_IMPRESSAO = 8.0     # orçamento mínimo restante (s) para imprimir via CDP em vez de baixar
+
+# Perfil por amostragem (--profile ou chave na interface): flame graph e top-N por execução
+PERFIL_DIR = os.getenv("UECI_PERFIL_DIR", "perfis_ueci")
+PERFIL_INTERVALO = 0.005          # 200 amostras/s
+PERFIL_TOP = 25
+
+# Endpoint local de métricas (formato texto do Prometheus). 0 = desativado.
+# Ex.: UECI_METRICAS_PORTA=9464 → http://127.0.0.1:9464/metrics
+METRICAS_PORTA = int(os.getenv("UECI_METRICAS_PORTA", "0") or 0)
+METRICAS_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Gravação de fixtures (HTML e respostas de postback via CDP Network) para testes offline.
+# Ative com UECI_GRAVAR_FIXTURES=arquivo.zip ou --gravar arquivo.zip; reproduza com --replay arquivo.zip
+GRAVACAO_ARQUIVO = os.getenv("UECI_GRAVAR_FIXTURES", "")
+GRAVACAO_TIPOS = ("Document", "XHR", "Fetch", "Script", "Stylesheet")
+REPLAY_PORTA = 8765
+
+# Modo pipeline: uma aba recebe em lotes enquanto outras tramitam (UECI_PIPELINE=1)
+# Atenção (vale também para o orquestrador abaixo): as abas dividem a mesma sessão do SISPREV, e
+# várias abas editando processos ao mesmo tempo NÃO foram validadas contra o SISPREV (a tela pode guardar o processo aberto na sessão).
+# Cada aba confere o número na tela antes de salvar e de tramitar (conferir_processo_aberto).
+PIPELINE_ATIVO = os.getenv("UECI_PIPELINE", "0") == "1"
+PIPELINE_ABAS = int(os.getenv("UECI_PIPELINE_ABAS", "1"))      # abas de tramitação
+PIPELINE_LOTE = int(os.getenv("UECI_PIPELINE_LOTE", "10"))     # processos recebidos por lote
+PIPELINE_FILA = int(os.getenv("UECI_PIPELINE_FILA", "30"))     # capacidade da fila entre estágios
+# Orquestrador assíncrono (UECI_ASYNC=1): um laço asyncio conduz várias abas; cada processo é uma corrotina
+ASYNC_ATIVO = os.getenv("UECI_ASYNC", "0") == "1"
+ASYNC_ABAS = int(os.getenv("UECI_ASYNC_ABAS", "4"))            # abas de tramitação
+ASYNC_FILA = int(os.getenv("UECI_ASYNC_FILA", "20"))           # capacidade da fila recebimento → abas
+ASYNC_FECHAR_TIMEOUT = float(os.getenv("UECI_ASYNC_FECHAR_TIMEOUT", "10"))  # espera máx. (s) ao fechar cada aba
+# Prioridade da fila de tramitação (UECI_PRIORIDADE): grid (ordem da tela), antigos (chegada mais
+# antiga primeiro), prazo (coluna de prazo ou chegada + UECI_PRIORIDADE_PRAZO_DIAS) ou pesos
+# (UECI_PRIORIDADE_PESOS='{"judicial": 10, "TCE": 5}', termo buscado no tipo/linha; maior primeiro)
+PRIORIDADE_POLITICA = os.getenv("UECI_PRIORIDADE", "grid").strip().lower()
+POLITICAS_PRIORIDADE = ("grid", "antigos", "prazo", "pesos")
+PRIORIDADE_PRAZO_DIAS = int(os.getenv("UECI_PRIORIDADE_PRAZO_DIAS", "30"))
+try:
+    PRIORIDADE_PESOS = {str(k): float(v) for k, v in json.loads(os.getenv("UECI_PRIORIDADE_PESOS", "{}") or "{}").items()}
+except (ValueError, TypeError, AttributeError):
+    PRIORIDADE_PESOS = {}
+# Painel de acompanhamento: janela (s) do ritmo móvel de processos por minuto usado na previsão de término
+PAINEL_JANELA = float(os.getenv("UECI_PAINEL_JANELA", "300"))
+
+# Governador de memória do navegador: amostra Performance.getMetrics entre processos e
+# recicla a aba de trabalho ao passar de um limite (ou a cada N processos).
+MEMORIA_HEAP_MB = float(os.getenv("UECI_MEMORIA_HEAP_MB", "350"))
+MEMORIA_NOS = int(os.getenv("UECI_MEMORIA_NOS", "150000"))
+MEMORIA_DOCUMENTOS = int(os.getenv("UECI_MEMORIA_DOCUMENTOS", "50"))
+MEMORIA_RECICLAR_A_CADA = int(os.getenv("UECI_MEMORIA_RECICLAR_A_CADA", "150"))   # 0 = só por limite
+
+# Estratégia (seletor/caminho alternativo) que funcionou por último, por BASE_URL/página/operação
+ESTRATEGIAS_ARQUIVO = os.getenv("UECI_ESTRATEGIAS", "estrategias_ueci.json")
+
+# Cache do chromedriver resolvido pelo Selenium Manager (revalidado pela versão do Chrome)
+DRIVER_CACHE_ARQUIVO = os.getenv("UECI_DRIVER_CACHE", "chromedriver_ueci.json")
+
+# Reservas compartilhadas entre operadores (arquivo SQLite em compartilhamento de rede).
+# Vazio = desativado. Ex.: UECI_RESERVAS_DB=\\servidor\ueci\reservas_ueci.db
+# Melhor esforço: depende das travas de arquivo do compartilhamento (ver reservas.py).
+RESERVAS_ARQUIVO = os.getenv("UECI_RESERVAS_DB", "")
+RESERVA_TTL = float(os.getenv("UECI_RESERVA_TTL", "600"))                 # validade da reserva em andamento
+RESERVA_TTL_CONCLUIDO = float(os.getenv("UECI_RESERVA_TTL_CONCLUIDO", "3600"))  # bloqueio após tramitar
+RESERVA_TOLERANCIA_RELOGIO = float(os.getenv("UECI_RESERVA_TOLERANCIA_RELOGIO", "900"))  # folga p/ relógios diferentes
+
+# Número do processo na linha do grid (ex.: 2024.123456, 12345/2024)
+RE_NUMERO_PROCESSO = r"\b\d{2,}[./-]\d{2,}(?:[./-]\d+)*\b"
 
 # Detecta o usuário do computador
 USUARIO_PC = os.getenv("USERNAME", "Usuário")
@@ -39,6 +150,7 @@ ASSINANTES_POR_USUARIO = {
     "gabriela.novaes": "GABRIELA LOPES SALGADO NOVAES",
 }
 
+@functools.lru_cache(maxsize=None)
 def obter_assinante_nome():
     try:
         return ASSINANTES_POR_USUARIO.get((USUARIO_PC or "").lower())
@@ -60,26 +172,244 @@ def _normalize_text(s: str) -> str:
     except Exception:
         return (s or "").upper()
 
+# Modelos de despacho: embutidos abaixo e sobrescritos/estendidos pelo arquivo JSON (mesma estrutura).
+# Estrutura: {destino: {tipo: {"despacho": valor ddlDespacho, "setor": valor ddlSetor, "html": modelo}}}
+# O marcador {assinante} no modelo é substituído pelo nome de quem assina.
+DESPACHOS_ARQUIVO = os.getenv("UECI_DESPACHOS_ARQUIVO", "despachos_ueci.json")
+DESPACHO_DESTINO = os.getenv("UECI_DESPACHO_DESTINO", "presidente")
+DESPACHO_TIPO = os.getenv("UECI_DESPACHO_TIPO", "assinatura")
+DESPACHOS_PADRAO = {
+    "presidente": {
+        "assinatura": {
+            "despacho": "4",
+            "setor": "15",   # Gabinete do Presidente
+            "html": (
+                "<p>Ao Gabinete do Presidente Executivo,</p>"
+                "<p>Encaminha-se, para assinatura, o ato constante da minuta anexa ao processo.</p>"
+                "<p>Registre-se que a análise desta Unidade de Controle Interno quanto às concessões de aposentadoria, reserva remunerada, reforma e pensão, nos termos do Anexo VII da Instrução Normativa TCE nº 68, de 8 de dezembro de 2020, ainda depende de regulamentação específica, razão pela qual não houve emissão de parecer técnico sobre o presente ato.</p>"
+                "<p>Respeitosamente,</p>"
+                "<div style='text-align:center; margin-top:12px;'><b>{assinante}</b></div>"
+            ),
+        },
+    },
+}
+
 # Timings (ajustáveis) para a etapa de tramitação
 MODAL_OPEN_DELAY = 0.6            # antes: 1.2
 AFTER_SELECT_DELAY = 0.3          # antes: 0.6
 SYNC_TIMEOUT_PRIMARY = 1.2        # antes: 8.0 (espera curta após colar)
 SYNC_TIMEOUT_PRECLICK = 0.5       # antes: 2.0 (espera curtíssima antes do clique)
+ESPERA_ELEMENTO = 5.0             # teto (s) de cada espera por elemento nas etapas do processo
+ESPERA_IMPLICITA = 2.0            # implicitly_wait do driver: custo de cada find_element(s) sem resultado
+
+# Política de retentativa por classe de erro: (tentativas, espera_base, espera_máxima) em segundos.
+# A espera cresce exponencialmente (base * 2^tentativa) até o teto, com jitter.
+POLITICA_RETENTATIVA = {
+    "stale":           (3, 0.2, 1.0),    # elemento recriado por postback: repete quase de imediato
+    "timeout":         (2, 1.0, 6.0),
+    "sessao_expirada": (2, 0.5, 2.0),    # reabre a Concessão (login) e tenta de novo
+    "servidor":        (3, 2.0, 30.0),
+    "desconhecido":    (1, 1.0, 3.0),
+    "travamento":      (1, 1.0, 3.0),    # etapa estourou o prazo do vigia: segue para o próximo processo
+    "orcamento":       (1, 1.0, 3.0),    # processo consumiu seu orçamento de tempo: segue a fila
+}
+# Disjuntor: após N erros de servidor consecutivos, pausa toda a fila por alguns segundos
+CIRCUITO_LIMITE_FALHAS = int(os.getenv("UECI_CIRCUITO_LIMITE", "3"))
+CIRCUITO_PAUSA = float(os.getenv("UECI_CIRCUITO_PAUSA", "60"))
+CIRCUITO_PAUSA_MAXIMA = 600.0
+
+# Trechos que identificam página de erro do servidor/IIS ou do próprio Chrome
+MARCAS_ERRO_SERVIDOR = (
+    "server error", "erro de servidor", "runtime error", "service unavailable",
+    "bad gateway", "gateway timeout", "http error 500", "http error 502", "http error 503",
+    "err_connection", "err_timed_out", "err_empty_response", "net::err_",
+    "não é possível acessar esse site", "this site can’t be reached", "this site can't be reached",
+)
+
+# Vigia de travamentos: prazo máximo (s) por etapa. Estourado o prazo, a etapa é interrompida;
+# se continuar presa após a carência (chamada bloqueada no navegador), a aba é fechada via CDP.
+PRAZOS_ETAPA = {
+    "entrar_no_setor": 150,   # inclui a espera pelo login
+    "receber": 180,
+    "abrir_processo": 30,
+    "controle_interno": 60,
+    "tramitar": 90,
+    "relatorio": 45,          # fechar/arquivar o relatório, depois do envio
+    "voltar_lista": 30,
+    "recuperar": 60,
+    "capturar": 20,
+}
+VIGIA_CARENCIA = 5.0
+
+# Orçamento de tempo por tentativa de um processo (s): todas as esperas da tentativa consomem deste total. 0 = sem limite.
+ORCAMENTO_PROCESSO = float(os.getenv("UECI_ORCAMENTO_PROCESSO", "60"))
 
 # ==============================
 # FUNÇÕES PRINCIPAIS
 # ==============================
 
+_log_recente = collections.deque(maxlen=LOG_RECENTE_LINHAS)
+_log_lock = threading.Lock()
+_log_estado = {"dia": None}
+_contexto_log = threading.local()
+
+def definir_processo_log(numero=None):
+    """Associa as próximas linhas de log desta thread a um processo (ou limpa com None)."""
+    _contexto_log.processo = numero
+
+def _rotacionar_log_se_preciso(agora: datetime.datetime):
+    """Rotaciona o LOG_FILE ao exceder LOG_MAX_BYTES ou ao mudar o dia (chamada sob _log_lock)."""
+    try:
+        tamanho = os.path.getsize(LOG_FILE)
+    except OSError:
+        _log_estado["dia"] = agora.date()
+        return
+    if _log_estado["dia"] is None:
+        _log_estado["dia"] = datetime.date.fromtimestamp(os.path.getmtime(LOG_FILE))
+    if tamanho < LOG_MAX_BYTES and _log_estado["dia"] == agora.date():
+        return
+    base, ext = os.path.splitext(LOG_FILE)
+    destino = f"{base}.{agora:%Y-%m-%d_%H%M%S}{ext}"
+    try:
+        os.replace(LOG_FILE, destino)
+    except OSError:
+        return
+    _log_estado["dia"] = agora.date()
+    for antigo in listar_logs()[1 + LOG_BACKUPS:]:
+        try:
+            os.remove(antigo)
+        except OSError:
+            pass
+
+def listar_logs() -> list:
+    """Arquivo de log atual seguido dos rotacionados, do mais recente para o mais antigo."""
+    base, ext = os.path.splitext(LOG_FILE)
+    pasta = os.path.dirname(os.path.abspath(LOG_FILE))
+    prefixo = os.path.basename(base) + "."
+    try:
+        rotacionados = sorted(
+            (os.path.join(pasta, n) for n in os.listdir(pasta)
+             if n.startswith(prefixo) and n.endswith(ext) and n != os.path.basename(LOG_FILE)),
+            reverse=True,
+        )
+    except OSError:
+        rotacionados = []
+    return [LOG_FILE] + rotacionados
+
 def registrar_log(mensagem):
     """Registra uma mensagem no arquivo de log com data e hora."""
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] {mensagem}\n")
+    agora = datetime.datetime.now()
+    processo = getattr(_contexto_log, "processo", None)
+    prefixo = f"[Proc {processo}] " if processo else ""
+    linha = f"[{agora:%Y-%m-%d %H:%M:%S}] {prefixo}{mensagem}"
+    _log_recente.append(linha)
+    with _log_lock:
+        _rotacionar_log_se_preciso(agora)
+        with open(LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(linha + "\n")
+
+_RE_LINHA_LOG = re.compile(rb"^\[(\d{4}-\d{2}-\d{2}) [\d:]{8}\] (?:\[Proc ([^\]]+)\] )?(?:\[([^\]]+)\])?")
+
+class IndiceLog:
+    """Índice leve de um arquivo de log: (offset, data, nível, processo) por linha.
+    É construído incrementalmente a partir do último byte lido, de modo que
+    acompanhar o arquivo (tail) e filtrar nunca exige carregar o histórico inteiro.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.entradas = []
+        self._lido = 0
+        self._inode = None
+
+    def atualizar(self) -> list:
+        """Indexa as linhas novas desde a última chamada e as retorna.
+        Se o arquivo foi rotacionado (trocado ou encolheu), recomeça do início.
+        """
+        try:
+            st = os.stat(self.caminho)
+        except OSError:
+            return []
+        chave = st.st_ino
+        if st.st_size < self._lido or (self._inode is not None and chave != self._inode):
+            self.entradas = []
+            self._lido = 0
+        self._inode = chave
+        if st.st_size == self._lido:
+            return []
+        novas = []
+        with open(self.caminho, "rb") as f:
+            f.seek(self._lido)
+            offset = self._lido
+            for bruta in f:
+                if not bruta.endswith(b"\n"):
+                    break  # linha ainda sendo escrita; lê na próxima chamada
+                m = _RE_LINHA_LOG.match(bruta)
+                if m:
+                    data = m.group(1).decode()
+                    processo = (m.group(2) or b"").decode("utf-8", "replace") or None
+                    nivel = (m.group(3) or b"Info").decode("utf-8", "replace")
+                else:
+                    # Continuação de mensagem multilinha: herda os dados da linha anterior
+                    ant = self.entradas[-1] if self.entradas else (0, "", "Info", None)
+                    data, nivel, processo = ant[1], ant[2], ant[3]
+                entrada = (offset, data, nivel, processo)
+                self.entradas.append(entrada)
+                novas.append(entrada)
+                offset += len(bruta)
+            self._lido = offset
+        return novas
+
+    @staticmethod
+    def corresponde(entrada, nivel=None, processo=None, data=None) -> bool:
+        _, e_data, e_nivel, e_proc = entrada
+        if nivel and e_nivel.lower() != nivel.lower():
+            return False
+        if processo and (not e_proc or processo not in e_proc):
+            return False
+        if data and not e_data.startswith(data):
+            return False
+        return True
+
+    def ler(self, entradas) -> list:
+        """Lê do disco apenas as linhas das entradas informadas (por offset)."""
+        linhas = []
+        with open(self.caminho, "rb") as f:
+            for offset, *_ in entradas:
+                f.seek(offset)
+                linhas.append(f.readline().decode("utf-8", "replace").rstrip("\r\n"))
+        return linhas
+
+    def filtrar(self, nivel=None, processo=None, data=None, limite: int = LOG_VISOR_LINHAS) -> list:
+        """Retorna as últimas `limite` linhas que atendem ao filtro, em ordem cronológica."""
+        escolhidas = []
+        for entrada in reversed(self.entradas):
+            if self.corresponde(entrada, nivel, processo, data):
+                escolhidas.append(entrada)
+                if len(escolhidas) >= limite:
+                    break
+        escolhidas.reverse()
+        return self.ler(escolhidas)
+
+    def niveis(self) -> list:
+        return sorted({e[2] for e in self.entradas})
 
 def atualizar_status(msg):
-    """Atualiza o texto do status dinamicamente."""
+    """Atualiza o texto do status dinamicamente. Fora da thread do Tk (automação, abas do
+    orquestrador, vigia), apenas publica a atualização para o laço da interface."""
+    if threading.current_thread() is not threading.main_thread():
+        publicar_gui(atualizar_status, msg)
+        return
     status_label.configure(text=msg)
     root.update_idletasks()
 
+def definir_progresso(valor: float):
+    """progress.set seguro de qualquer thread (fora da thread do Tk, via publicar_gui)."""
+    if threading.current_thread() is not threading.main_thread():
+        publicar_gui(progress.set, valor)
+        return
+    progress.set(valor)
+
 def mostrar_aviso_e_encerrar(msg: str, segundos: int = 5):
     """Exibe um aviso em uma janelinha por N segundos e encerra a aplicação."""
     def _show():
@@ -122,8 +452,8 @@ def mostrar_aviso_e_encerrar(msg: str, segundos: int = 5):
             # Fallback: encerra sem UI se algo der errado
             root.after(0, root.destroy)
 
-    # Garante execução no loop principal do Tk
-    root.after(0, _show)
+    # Garante execução no loop principal do Tk (chamada vem da thread da automação)
+    publicar_gui(_show)
 
 def porta_debug_aberta():
     """Verifica rapidamente se o Chrome está disponível em localhost:9222."""
@@ -133,295 +463,1744 @@ def porta_debug_aberta():
     except Exception:
         return False
 
-def abrir_concessao(driver, wait):
-    """Abre a tela Benefício > Concessão preferencialmente por URL direta, com fallback no menu.
-    Retorna True em caso de sucesso, False caso contrário.
-    """
-    url_concessao = f"{BASE_URL}/ProcessoBeneficio/ConProcessoBeneficio.aspx"
-    # Tenta por URL direta (mais rápido e estável) com pequenas tentativas
-    ultimo_erro = None
-    for tentativa in range(2):
-        try:
-            driver.get(url_concessao)
-            WebDriverWait(driver, 10, poll_frequency=0.3).until(
-                EC.presence_of_element_located((By.ID, "ctl00_ContentCampos_ddlSetor"))
-            )
-            registrar_log("Concessão aberta via URL direta")
-            return True
-        except Exception as e:
-            ultimo_erro = e
-            registrar_log(f"[Aviso] Falha ao abrir via URL direta (tentativa {tentativa+1}/2): {e}")
-            try:
-                time.sleep(1 + tentativa)
-            except Exception:
-                pass
 
-    # Falhou a abertura direta; tenta estabelecer contexto partindo da home/base
-    try:
-        driver.get(BASE_URL)
-        time.sleep(0.6)
-    except Exception as e:
-        registrar_log(f"[Aviso] Falha ao carregar BASE_URL: {e}")
-    # Verifica se caiu em tela de login/aviso e conduz o fluxo
+def versao_chrome() -> str | None:
+    """Versão do Chrome aberto em 9222 (ex.: '120.0.6099.109'), lida de /json/version."""
     try:
-        atual = driver.current_url
+        with urllib.request.urlopen("http://localhost:9222/json/version", timeout=0.8) as resp:
+            navegador = json.loads(resp.read().decode("utf-8")).get("Browser", "")
+        return navegador.split("/", 1)[1] if "/" in navegador else None
     except Exception:
-        atual = ""
+        return None
 
-    if ("/Login/" in atual) or ("AvisoLogin" in atual):
-        try:
-            # Clica em "Clique aqui para logar novamente." se existir
-            link = driver.find_elements(By.XPATH, "//a[contains(.,'Clique aqui') and contains(.,'logar')]")
-            if link:
-                driver.execute_script("arguments[0].click();", link[0])
-        except Exception:
-            pass
+# ==============================
+# CHROMEDRIVER (CACHE E SERVIÇO PERSISTENTE)
+# ==============================
 
-        atualizar_status("🔐 Sessão expirada — faça login. Aguardando até 60s…")
-        try:
-            WebDriverWait(driver, 60, poll_frequency=0.5).until(
-                lambda d: ("/Login/" not in d.current_url) and ("AvisoLogin" not in d.current_url)
-            )
-        except TimeoutException:
-            registrar_log("[Erro] Login não detectado no tempo limite (60s).")
-            return False
+_servico_driver = {"servico": None, "versao": None}
+_servico_lock = threading.Lock()
 
-    # Após base/login, tenta novamente via URL direta somente mais uma vez
+
+def _versao_principal(versao: str | None) -> str | None:
+    # chromedriver é compatível por versão principal (ex.: 120.x)
+    return versao.split(".", 1)[0] if versao else None
+
+
+def ler_cache_driver(versao: str | None) -> str | None:
+    """Caminho do chromedriver em cache, se ainda serve para a versão atual do Chrome."""
     try:
-        driver.get(url_concessao)
-        WebDriverWait(driver, 10, poll_frequency=0.3).until(
-            EC.presence_of_element_located((By.ID, "ctl00_ContentCampos_ddlSetor"))
-        )
-        registrar_log("Concessão aberta via URL direta após base/login")
-        return True
-    except Exception as e2:
-        registrar_log(f"[Aviso] Ainda não abriu via URL direta após base/login: {e2}")
+        with open(DRIVER_CACHE_ARQUIVO, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    caminho = cache.get("caminho")
+    if not caminho or not os.path.isfile(caminho):
+        return None
+    if _versao_principal(cache.get("versao_chrome")) != _versao_principal(versao):
+        registrar_log(f"[Info] Chrome mudou de versão ({cache.get('versao_chrome')} → {versao}); chromedriver será resolvido novamente.")
+        return None
+    return caminho
+
 
-    # Fallback: tenta via menu
+def salvar_cache_driver(versao: str | None, caminho: str | None):
+    if not versao or not caminho:
+        return
     try:
-        # Alguns layouts exigem normalizar espaços no texto
+        with open(DRIVER_CACHE_ARQUIVO, "w", encoding="utf-8") as f:
+            json.dump({
+                "versao_chrome": versao,
+                "caminho": caminho,
+                "resolvido_em": datetime.datetime.now().isoformat(timespec="seconds"),
+            }, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        registrar_log(f"[Aviso] Não foi possível gravar o cache do chromedriver: {e}")
+
+
+def obter_servico_chromedriver(versao: str | None):
+    """Serviço chromedriver de longa duração, iniciado a partir do caminho em cache.
+    Reaproveitado entre execuções (e entre abas do pipeline); None se não há cache válido.
+    """
+    with _servico_lock:
+        servico = _servico_driver["servico"]
+        if servico is not None:
+            if _versao_principal(_servico_driver["versao"]) == _versao_principal(versao) and servico.is_connectable():
+                return servico
+            _encerrar_servico()
+        caminho = ler_cache_driver(versao)
+        if not caminho:
+            return None
+        servico = Service(executable_path=caminho)
+        servico.start()
+        _servico_driver.update(servico=servico, versao=versao)
+        registrar_log(f"chromedriver iniciado a partir do cache ({caminho})")
+        return servico
+
+
+def _encerrar_servico():
+    servico = _servico_driver["servico"]
+    _servico_driver.update(servico=None, versao=None)
+    if servico is not None:
         try:
-            beneficio_menu = WebDriverWait(driver, 5, poll_frequency=0.2).until(
-                EC.element_to_be_clickable((By.XPATH, "//a[normalize-space(.)='Benefício']"))
-            )
+            servico.stop()
         except Exception:
-            beneficio_menu = driver.find_element(By.XPATH, "//a[contains(.,'Benef')]" )
-        beneficio_menu.click()
+            pass
 
-        concessao_link = WebDriverWait(driver, 5, poll_frequency=0.2).until(
-            EC.element_to_be_clickable((By.XPATH, "//a[normalize-space(.)='Concessão']"))
-        )
-        concessao_link.click()
 
-        WebDriverWait(driver, 10, poll_frequency=0.3).until(
-            EC.presence_of_element_located((By.ID, "ctl00_ContentCampos_ddlSetor"))
-        )
-        registrar_log("Concessão aberta via menu")
-        return True
-    except Exception as e:
-        registrar_log(f"[Erro] Não foi possível abrir Concessão por URL nem por menu: {e}")
-        if ultimo_erro:
-            registrar_log(f"[Det] Último erro de navegação direta: {ultimo_erro}")
-        return False
+def encerrar_servico_chromedriver():
+    """Encerra o chromedriver persistente (saída do app; evita processos presos no _MEI*)."""
+    with _servico_lock:
+        _encerrar_servico()
+
+
+class ChromeAnexado(webdriver.Remote):
+    """Sessão WebDriver num chromedriver já em execução (sem Selenium Manager nem novo processo)."""
 
-def preencher_informacoes_controle_interno(driver, wait, nome_responsavel, cpf_responsavel):
-    """Preenche o parecer e os dados do responsável do Controle Interno dentro do processo."""
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict):
+        return self.execute("executeCdpCommand", {"cmd": cmd, "params": cmd_args})["value"]
+
+
+def anexar_ao_servico(servico, chrome_options):
+    conexao = ChromiumRemoteConnection(
+        remote_server_addr=servico.service_url,
+        vendor_prefix="goog",
+        browser_name="chrome",
+    )
+    return ChromeAnexado(command_executor=conexao, options=chrome_options)
+
+# ==============================
+# RETENTATIVA E DISJUNTOR
+# ==============================
+
+def pagina_com_erro_servidor(driver) -> bool:
+    """Verifica (em uma única chamada) se a página atual é um erro do servidor/IIS ou do Chrome."""
     try:
-        # Abre aba "Mais Informações do Processo" - tenta pelo ID primeiro (mais rápido)
+        url = (driver.current_url or "").lower()
+        if url.startswith("chrome-error://"):
+            return True
+        texto = driver.execute_script(
+            "return ((document.title||'') + ' ' + ((document.body && document.body.innerText)||'').slice(0, 600)).toLowerCase();"
+        ) or ""
+        return any(m in texto for m in MARCAS_ERRO_SERVIDOR)
+    except Exception:
+        return False
+
+def classificar_erro(erro, driver=None) -> str:
+    """Classifica a falha para a política de retentativa.
+    Retorna 'stale', 'timeout', 'sessao_expirada', 'servidor' ou 'desconhecido'.
+    Com o driver informado, confere a URL (login) e o conteúdo da página (erro do servidor).
+    """
+    if isinstance(erro, StaleElementReferenceException):
+        return "stale"
+    if isinstance(erro, EtapaExcedida):
+        return "travamento"
+    if isinstance(erro, OrcamentoEsgotado):
+        return "orcamento"
+    msg = str(erro or "").lower()
+    if any(m in msg for m in ("invalid session id", "session deleted", "avisologin", "/login/")):
+        return "sessao_expirada"
+    if driver is not None:
         try:
-            aba_info = wait.until(EC.element_to_be_clickable(
-                (By.ID, "__tab_ctl00_ContentCampos_TabContainer1_tabTCE")
-            ))
-            driver.execute_script("arguments[0].click();", aba_info)
-            print("[OK] Aba clicada via ID")
-        except:
-            aba_info = wait.until(EC.element_to_be_clickable(
-                (By.XPATH, "//span[contains(text(),'Mais Informações do Processo')]")
-            ))
-            driver.execute_script("arguments[0].click();", aba_info)
-            print("[OK] Aba clicada via XPATH")
-        time.sleep(1)
+            url = driver.current_url or ""
+            if ("/Login/" in url) or ("AvisoLogin" in url):
+                return "sessao_expirada"
+        except Exception:
+            pass
+    if any(m in msg for m in MARCAS_ERRO_SERVIDOR):
+        return "servidor"
+    if driver is not None and pagina_com_erro_servidor(driver):
+        return "servidor"
+    if isinstance(erro, TimeoutException) or "timed out" in msg or "timeout" in msg:
+        return "timeout"
+    if "stale element" in msg:
+        return "stale"
+    return "desconhecido"
 
-        # Seleciona “Não foi objeto do exame”
-        select_parecer = Select(wait.until(
-            EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_parecerControleInternoTCE"))
-        ))
-        select_parecer.select_by_visible_text("Não foi objeto do exame")
+def calcular_espera(classe: str, tentativa: int) -> float:
+    """Backoff exponencial com jitter para a classe de erro e tentativa (0, 1, 2…)."""
+    _, base, teto = POLITICA_RETENTATIVA.get(classe, POLITICA_RETENTATIVA["desconhecido"])
+    limite = min(teto, base * (2 ** max(tentativa, 0)))
+    return limite / 2 + random.uniform(0, limite / 2)
 
-        # Ativa e preenche campos de CPF e Nome
-        driver.execute_script("document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_txtCPFRespControleInternoTCE').removeAttribute('disabled');")
-        driver.execute_script("document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_txtNomeRespControleInternoTCE').removeAttribute('disabled');")
-        time.sleep(0.3)
+def max_tentativas(classe: str) -> int:
+    """Quantidade máxima de tentativas permitidas para a classe de erro."""
+    return POLITICA_RETENTATIVA.get(classe, POLITICA_RETENTATIVA["desconhecido"])[0]
 
-        campo_cpf = driver.find_element(By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_txtCPFRespControleInternoTCE")
-        campo_nome = driver.find_element(By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_txtNomeRespControleInternoTCE")
+class DisjuntorServidor:
+    """Disjuntor (circuit breaker) para erros de servidor consecutivos.
+    Ao atingir o limite, abre e pausa a fila inteira; passado o período, libera uma
+    tentativa: se ela falhar de novo por erro de servidor, reabre com pausa dobrada.
+    """
 
-        campo_cpf.clear()
-        campo_cpf.send_keys(cpf_responsavel)
-        campo_nome.clear()
-        campo_nome.send_keys(nome_responsavel)
+    def __init__(self, limite: int = CIRCUITO_LIMITE_FALHAS, pausa: float = CIRCUITO_PAUSA,
+                 pausa_maxima: float = CIRCUITO_PAUSA_MAXIMA):
+        self.limite = max(1, limite)
+        self.pausa_base = pausa
+        self.pausa_maxima = pausa_maxima
+        self._lock = threading.Lock()
+        self._falhas = 0
+        self._pausa = pausa
+        self._aberto_ate = 0.0
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._pausa = self.pausa_base
+            self._aberto_ate = 0.0
+
+    def registrar_falha(self, classe: str):
+        """Contabiliza a falha; apenas erros de servidor aproximam a abertura do disjuntor."""
+        with self._lock:
+            if classe != "servidor":
+                self._falhas = 0
+                return
+            self._falhas += 1
+            if self._falhas >= self.limite:
+                self._aberto_ate = time.time() + self._pausa
+                registrar_log(f"[Disjuntor] {self._falhas} erro(s) de servidor seguidos; pausando a fila por {self._pausa:.0f}s")
+                self._pausa = min(self._pausa * 2, self.pausa_maxima)
+                # Meio-aberto: a próxima falha de servidor já reabre
+                self._falhas = self.limite - 1
+
+    def aberto(self) -> bool:
+        with self._lock:
+            return time.time() < self._aberto_ate
+
+    def pausa_restante(self) -> float:
+        """Segundos até o disjuntor fechar (0 se já está fechado)."""
+        with self._lock:
+            return max(0.0, self._aberto_ate - time.time())
 
-        # Salvar
-        btn_salvar = wait.until(EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_btnSalvar")))
-        driver.execute_script("arguments[0].click();", btn_salvar)
-        time.sleep(1)
+# ==============================
+# VIGIA DE TRAVAMENTOS
+# ==============================
 
-        print(f"[OK] Informações preenchidas para {nome_responsavel}")
-        registrar_log(f"[OK] Informações preenchidas para {nome_responsavel}")
+class EtapaExcedida(TimeoutException):
+    """Levantada na thread cuja etapa estourou o prazo do vigia."""
 
-    except Exception as e:
-        print(f"[Erro] Falha ao preencher informações de controle interno: {e}")
-        registrar_log(f"[Erro] Falha ao preencher informações de controle interno: {e}")
-        raise
 
+class _InterrupcaoVigia(BaseException):
+    """Injetada de forma assíncrona pelo vigia. Deriva de BaseException para não ser engolida
+    pelos `except Exception` das esperas; vira EtapaExcedida ao sair da etapa."""
 
-def preencher_editor_observacao(driver, wait, texto_html: str):
-    """Preenche o campo de observação do painel de tramitação.
-    Ordem de tentativa: contenteditable -> iframe -> textarea/hidden.
-    Sempre tenta sincronizar o hidden (se existir) após preencher o editor visual.
-    Retorna True se conseguiu preencher, senão False.
-    """
-    html = texto_html.replace("\n", "<br>")
 
-    # 1) Contenteditable direto (mais comum)
+def fechar_alvo_cdp(alvo: str) -> bool:
+    """Fecha uma aba pelo endpoint HTTP do DevTools (funciona mesmo com o renderer travado)."""
     try:
-        sucesso = driver.execute_script(
-            """
-            var el = document.querySelector('body[contenteditable="true"], [contenteditable="true"]');
-            if(!el) return false;
-            el.scrollIntoView({block:'center'});
-            el.focus();
-            el.innerHTML = arguments[0];
-            ['input','keyup','change','blur'].forEach(function(evt){
-                var e = new Event(evt, {bubbles:true}); el.dispatchEvent(e);
-            });
-            var ta = document.getElementById('ctl00_ContentToolBar_txtObservacao');
-            if(ta){
-                ta.value = el.innerText;
-                ['input','keyup','change','blur'].forEach(function(evt){
-                    var e = new Event(evt, {bubbles:true}); ta.dispatchEvent(e);
-                });
-            }
-            return !!(el.innerText && el.innerText.length);
-            """,
-            html
-        )
-        if sucesso:
-            return True
+        with urllib.request.urlopen(f"http://localhost:9222/json/close/{alvo}", timeout=3) as resp:
+            return resp.status == 200
     except Exception:
-        pass
+        return False
 
-    # 2) Editor em iframe
+
+def abrir_alvo_cdp(url: str = "about:blank") -> str | None:
+    """Cria uma aba pelo endpoint HTTP do DevTools e retorna o id (igual ao window handle do Selenium)."""
     try:
-        candidatos = driver.find_elements(By.XPATH, "//iframe[contains(@id,'txtObservacao') or contains(@name,'txtObservacao') or contains(@id,'ContentToolBar') or contains(@id,'Editor')]")
-        for frame in candidatos:
-            try:
-                driver.switch_to.frame(frame)
-                body = WebDriverWait(driver, 5, poll_frequency=0.2).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
-                body.click(); time.sleep(0.2)
-                driver.execute_script("arguments[0].innerHTML = arguments[1];", body, html)
-                ok = driver.execute_script("return arguments[0].innerText && arguments[0].innerText.length;", body)
-                driver.switch_to.default_content()
-                if ok and int(ok) > 0:
-                    # sincroniza hidden
-                    try:
-                        driver.execute_script(
-                            """
-                            var ta=document.getElementById('ctl00_ContentToolBar_txtObservacao');
-                            if(ta){
-                                ta.value=arguments[0];
-                                ['input','keyup','change','blur'].forEach(function(evt){
-                                    var e = new Event(evt, {bubbles:true}); ta.dispatchEvent(e);
-                                });
-                            }
-                            """,
-                            texto_html
-                        )
-                    except Exception:
-                        pass
-                    return True
-            except Exception:
-                driver.switch_to.default_content()
-                continue
+        req = urllib.request.Request(f"http://localhost:9222/json/new?{url}", method="PUT")
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return json.loads(resp.read().decode("utf-8")).get("id")
     except Exception:
-        pass
+        return None
 
-    # 3) Tentativa direta no elemento conhecido (textarea/hidden)
+
+def fechar_abas_relatorio_cdp() -> int:
+    """Fecha abas de relatório/PDF residuais listadas no DevTools."""
+    fechadas = 0
     try:
-        elem = WebDriverWait(driver, 5, poll_frequency=0.3).until(
-            EC.presence_of_element_located((By.ID, "ctl00_ContentToolBar_txtObservacao"))
-        )
-        driver.execute_script("arguments[0].scrollIntoView(true);", elem)
-        time.sleep(0.2)
-        try:
-            elem.clear()
-        except Exception:
-            pass
-        try:
-            elem.send_keys(texto_html)
-        except Exception:
-            driver.execute_script("arguments[0].value = arguments[1];", elem, texto_html)
+        with urllib.request.urlopen("http://localhost:9222/json/list", timeout=3) as resp:
+            alvos = json.loads(resp.read().decode("utf-8"))
+    except Exception:
+        return 0
+    for alvo in alvos:
+        url_l = (alvo.get("url") or "").lower()
+        if alvo.get("type") == "page" and ("visualizarelatorio.aspx" in url_l or url_l.split("?", 1)[0].endswith(".pdf")):
+            if fechar_alvo_cdp(alvo.get("id", "")):
+                fechadas += 1
+    return fechadas
+
+
+class VigiaEtapas:
+    """Thread vigia: conhece a etapa corrente de cada thread de automação e o seu prazo.
+    Ao estourar o prazo, interrompe a thread (PyThreadState_SetAsyncExc); se ela
+    continuar presa após a carência (comando bloqueado num renderer travado), fecha a aba
+    pelo DevTools para o chromedriver devolver o erro. A recuperação fica com quem chamou.
+    A aba fechada é a corrente no momento do disparo (trocar_aba informa cada troca), não a da
+    entrada na etapa: numa etapa que passou para a aba do relatório, é ela que está presa.
+    """
 
-        preenchido = driver.execute_script("return arguments[0].value || arguments[0].textContent || '';", elem)
-        if preenchido and len(preenchido.strip()) >= min(20, len(texto_html)//2):
-            return True
+    def __init__(self, intervalo: float = 0.5):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._etapas = {}   # ident da thread -> registro da etapa corrente
+        self._alvos = {}    # ident da thread -> aba (window handle) em uso agora
+        self._thread = None
+
+    def _garantir_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._monitorar, name="ueci-vigia", daemon=True)
+                self._thread.start()
+
+    @staticmethod
+    def _injetar(ident: int, excecao):
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(ident), ctypes.py_object(excecao) if excecao else None)
+
+    @contextlib.contextmanager
+    def etapa(self, nome: str, driver=None, prazo: float | None = None):
+        prazo = prazo or PRAZOS_ETAPA.get(nome, 60)
+        alvo = None
+        if driver is not None:
+            try:
+                alvo = driver.current_window_handle
+            except Exception:
+                pass
+        ident = threading.get_ident()
+        reg = {
+            "nome": nome, "prazo": prazo, "fecha_aba": driver is not None, "disparos": 0,
+            "limite": time.monotonic() + prazo,
+            "processo": getattr(_contexto_log, "processo", None),
+        }
+        self._garantir_thread()
+        with self._lock:
+            anterior = self._etapas.get(ident)
+            self._etapas[ident] = reg
+            if alvo:
+                self._alvos[ident] = alvo
+        try:
+            yield
+        finally:
+            while True:
+                try:
+                    with self._lock:
+                        if anterior is None:
+                            self._etapas.pop(ident, None)
+                            self._alvos.pop(ident, None)
+                        else:
+                            self._etapas[ident] = anterior
+                        if reg["disparos"]:
+                            # Interrupção ainda pendente (ou já entregue): descarta antes de sair
+                            self._injetar(ident, None)
+                    break
+                except _InterrupcaoVigia:
+                    continue   # entregue durante a saída; repete a limpeza
+            if reg["disparos"] and sys.exc_info()[0] in (None, _InterrupcaoVigia):
+                raise EtapaExcedida(f"Etapa '{nome}' excedeu o prazo de {prazo:.0f}s")
+
+    def mudar_alvo(self, alvo: str):
+        """Registra a aba para a qual a thread atual acabou de trocar (ver trocar_aba)."""
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._etapas:
+                self._alvos[ident] = alvo
+
+    def _monitorar(self):
+        while True:
+            time.sleep(self.intervalo)
+            agora = time.monotonic()
+            with self._lock:
+                vencidas = [(i, r) for i, r in self._etapas.items() if agora > r["limite"]]
+                for ident, reg in vencidas:
+                    reg["disparos"] += 1
+                    reg["limite"] = agora + VIGIA_CARENCIA
+                    reg["alvo"] = self._alvos.get(ident) if reg["fecha_aba"] else None
+                    self._injetar(ident, _InterrupcaoVigia)
+            for _, reg in vencidas:
+                proc = f"[Proc {reg['processo']}] " if reg["processo"] else ""
+                if reg["disparos"] == 1:
+                    METRICAS.incrementar("ueci_etapas_excedidas_total", etapa=reg["nome"])
+                    registrar_log(f"[Alerta] {proc}Etapa '{reg['nome']}' excedeu {reg['prazo']:.0f}s; interrompendo…")
+                    atualizar_status(f"⏱️ Etapa '{reg['nome']}' travou; recuperando…")
+                elif reg["disparos"] == 2 and reg["alvo"]:
+                    ok = fechar_alvo_cdp(reg["alvo"])
+                    registrar_log(f"[Alerta] {proc}Etapa '{reg['nome']}' continua presa; aba fechada via DevTools ({'ok' if ok else 'falhou'}).")
+
+
+VIGIA = VigiaEtapas()
+
+
+def trocar_aba(driver, alvo: str):
+    """driver.switch_to.window informando o vigia, que assim fecha a aba certa se a etapa travar."""
+    driver.switch_to.window(alvo)
+    VIGIA.mudar_alvo(alvo)
+
+
+def recuperar_contexto_navegador(driver, wait):
+    """Após um travamento: fecha relatórios residuais, garante uma aba válida para a sessão
+    (abrindo outra se a atual foi fechada) e volta à caixa do setor."""
+    n = fechar_abas_relatorio_cdp()
+    if n:
+        registrar_log(f"[Close] {n} aba(s) de relatório residual(is) fechada(s) via DevTools")
+    try:
+        driver.current_url
     except Exception:
-        pass
+        alvo = abrir_alvo_cdp()
+        if not alvo:
+            raise
+        trocar_aba(driver, alvo)
+        registrar_log("[Info] Aba de trabalho perdida; sessão movida para uma nova aba.")
+    driver.get(f"{BASE_URL}/ProcessoBeneficio/ConProcessoBeneficio.aspx")
+    estado = conduzir_ao_setor(driver, wait)
+    if estado != "dentro_setor":
+        raise RuntimeError(f"Recuperação não voltou à lista do setor (página em '{estado}').")
+    abrir_lista_setor(driver, wait)
 
-    return False
+# ==============================
+# ORÇAMENTO DE TEMPO POR PROCESSO
+# ==============================
 
+class OrcamentoEsgotado(TimeoutException):
+    """O processo consumiu todo o seu orçamento de tempo."""
 
-def aguardar_sincronizacao_observacao(driver, texto_html: str, timeout: int = 8) -> bool:
-    """Aguarda o editor/textarea refletir o texto inserido antes de clicar em Tramitar.
-    Considera sincronizado quando o comprimento do conteúdo visível/oculto atinge
-    pelo menos 60% do texto esperado (com mínimo de 30 caracteres).
+
+class Orcamento:
+    """Prazo total de um processo. Cada espera usa min(timeout próprio, tempo restante), de modo
+    que um processo lento falha cedo em vez de somar os timeouts de todas as etapas.
+    Orcamento(None) (ou 0) não limita: as esperas mantêm os timeouts originais.
+    Buscas diretas (find_element/find_elements) esperam o implicitly_wait do driver quando o
+    elemento não existe, fora de qualquer WebDriverWait: nas etapas do processo, use procurar()
+    para que também caibam no orçamento.
     """
-    min_len = max(15, int(len(texto_html) * 0.3))
-    try:
-        WebDriverWait(driver, timeout, poll_frequency=0.3).until(
-            lambda d: d.execute_script(
-                """
-                var el = document.querySelector('body[contenteditable="true"], [contenteditable="true"]');
-                var len1 = el ? (el.innerText || '').trim().length : 0;
-                var ta = document.getElementById('ctl00_ContentToolBar_txtObservacao');
-                var len2 = ta ? ((ta.value || ta.textContent || '').trim().length) : 0;
-                return Math.max(len1, len2) >= arguments[0];
-                """,
-                min_len
-            )
-        )
-        # pequenas pausas adicionais para estabilidade do DOM
-        time.sleep(0.3)
-        return True
-    except Exception:
-        return False
 
+    def __init__(self, segundos: float | None):
+        self.segundos = segundos or 0
+        self.limite = time.monotonic() + segundos if segundos else None
+
+    def restante(self) -> float:
+        if self.limite is None:
+            return float("inf")
+        return max(0.0, self.limite - time.monotonic())
+
+    def limitar(self, teto: float, minimo: float = 0.0) -> float:
+        """Timeout a usar numa espera. Com `minimo` (etapas após o clique final, que não podem
+        ser abandonadas no meio) nunca levanta: espera ao menos `minimo` segundos."""
+        restante = self.restante()
+        if restante <= 0 and not minimo:
+            raise OrcamentoEsgotado(f"Orçamento de {self.segundos:.0f}s do processo esgotado")
+        return max(minimo, min(teto, restante))
+
+    def esperar(self, driver, condicao, teto: float, poll: float = 0.3, minimo: float = 0.0):
+        """WebDriverWait limitado pelo orçamento."""
+        try:
+            return WebDriverWait(driver, self.limitar(teto, minimo), poll_frequency=poll).until(condicao)
+        except TimeoutException:
+            if not minimo and self.restante() <= 0:
+                raise OrcamentoEsgotado(f"Orçamento de {self.segundos:.0f}s do processo esgotado") from None
+            raise
+
+    def dormir(self, segundos: float):
+        time.sleep(self.limitar(segundos))
+
+    def procurar(self, driver, by, valor) -> list:
+        """find_elements limitado pelo orçamento: com menos de ESPERA_IMPLICITA segundos restantes,
+        a espera implícita é encurtada só para esta busca."""
+        restante = self.limitar(ESPERA_IMPLICITA)
+        if restante >= ESPERA_IMPLICITA:
+            return driver.find_elements(by, valor)
+        driver.implicitly_wait(restante)
+        try:
+            return driver.find_elements(by, valor)
+        finally:
+            driver.implicitly_wait(ESPERA_IMPLICITA)
 
-def forcar_sincronizacao_observacao(driver, texto_html: str) -> int:
-    """Força a sincronização do texto do despacho nos campos submetidos pelo formulário.
-    - Garante o HTML no editor contenteditable (se existir)
-    - Preenche todos os inputs/textarea com id ou name contendo 'Observacao'/'txtObservacao'
-    - Remove atributo 'disabled' para garantir que o valor seja submetido no postback
-    Retorna a quantidade de elementos atualizados.
+# ==============================
+# CAPTURA DE ALERTAS NA PÁGINA
+# ==============================
+
+# alert/confirm substituídos na página: a mensagem vai para o sessionStorage (sobrevive ao
+# postback) e o diálogo é aceito na hora, sem bloquear a página nem exigir espera do WebDriver.
+# Só vale em volta dos cliques que disparam os alertas (captura_dialogos): o Chrome é o do
+# operador, então o script é removido e as funções originais são restauradas em seguida.
+JS_CAPTURA_DIALOGOS = r"""
+(function(){
+    if(window.__ueciDialogos) return;
+    window.__ueciDialogos = {alert: window.alert, confirm: window.confirm};
+    function guardar(tipo, msg){
+        try{
+            var lista = JSON.parse(sessionStorage.getItem('__ueci_dialogos') || '[]');
+            lista.push({tipo: tipo, msg: String(msg === undefined ? '' : msg)});
+            sessionStorage.setItem('__ueci_dialogos', JSON.stringify(lista));
+        }catch(e){}
+    }
+    window.alert = function(msg){ guardar('alert', msg); };
+    window.confirm = function(msg){ guardar('confirm', msg); return true; };
+})();
+"""
+
+JS_RESTAURAR_DIALOGOS = r"""
+var orig = window.__ueciDialogos;
+if(orig){
+    window.alert = orig.alert;
+    window.confirm = orig.confirm;
+    delete window.__ueciDialogos;
+}
+"""
+
+JS_LER_DIALOGOS = r"""
+var lista = [];
+try{
+    lista = JSON.parse(sessionStorage.getItem('__ueci_dialogos') || '[]');
+    sessionStorage.removeItem('__ueci_dialogos');
+}catch(e){}
+return lista;
+"""
+
+
+@contextlib.contextmanager
+def captura_dialogos(driver):
+    """Captura alert/confirm na aba atual enquanto o bloco roda: script de novo documento
+    (DevTools, cobre a página que o postback carrega) e o documento já carregado. Na saída,
+    remove o script e restaura alert/confirm, para o Chrome do operador voltar ao normal.
     """
+    identificador = None
     try:
-        atualizados = driver.execute_script(
-            r"""
-            (function(html){
-                function syncIn(doc){
-                    var updated = 0;
-                    try{
-                        // Converte HTML para texto simples
-                        var tmp = doc.createElement('div');
-                        tmp.innerHTML = html;
-                        var plain = (tmp.innerText || tmp.textContent || '').trim();
-
-                        // 1) Todos os contenteditable
-                        var eds = Array.from(doc.querySelectorAll('body[contenteditable="true"], [contenteditable="true"]'));
-                        eds.forEach(function(ed){
-                            try{
+        identificador = driver.execute_cdp_cmd(
+            "Page.addScriptToEvaluateOnNewDocument", {"source": JS_CAPTURA_DIALOGOS}
+        ).get("identifier")
+    except Exception as e:
+        registrar_log(f"[Aviso] Captura de alertas via DevTools indisponível; valendo só para a página atual: {e}")
+    try:
+        driver.execute_script(JS_CAPTURA_DIALOGOS)
+    except Exception:
+        pass
+    try:
+        yield
+    finally:
+        if identificador:
+            try:
+                driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": identificador})
+            except Exception as e:
+                registrar_log(f"[Aviso] Não foi possível remover a captura de alertas da aba: {e}")
+        try:
+            driver.execute_script(JS_RESTAURAR_DIALOGOS)
+        except Exception:
+            pass
+
+
+def ler_dialogos(driver) -> list:
+    """Retorna (e consome) as mensagens de alert/confirm capturadas desde a última leitura.
+    Um alerta nativo (documento sem a captura) também é lido e aceito."""
+    mensagens = []
+    try:
+        mensagens = [str(d.get("msg", "")) for d in (driver.execute_script(JS_LER_DIALOGOS) or [])]
+    except Exception as e:
+        # Alerta nativo aberto bloqueia scripts; o chromedriver pode já tê-lo fechado
+        texto = getattr(e, "alert_text", None)
+        if texto:
+            mensagens.append(texto)
+        else:
+            try:
+                alerta = driver.switch_to.alert
+                mensagens.append(alerta.text)
+                alerta.accept()
+            except Exception:
+                pass
+    for msg in mensagens:
+        registrar_log(f"[Alerta] {msg}")
+    return mensagens
+
+
+def aguardar_dialogo(driver, teto: float, orcamento: Orcamento | None = None, minimo: float = 0.0) -> list:
+    """Aguarda até `teto` segundos (limitados pelo orçamento) por mensagens de alert/confirm.
+    Retorna a lista de mensagens, vazia se nada apareceu."""
+    orcamento = orcamento or Orcamento(None)
+    try:
+        return orcamento.esperar(driver, lambda d: ler_dialogos(d) or False, teto, poll=0.2, minimo=minimo)
+    except TimeoutException:
+        return []
+
+# ==============================
+# MEMÓRIA DE ESTRATÉGIAS (SELETORES E CAMINHOS ALTERNATIVOS)
+# ==============================
+
+class MemoriaEstrategias:
+    """Lembra, por BASE_URL/página/operação, qual estratégia (seletor ou caminho alternativo)
+    funcionou por último, e a coloca em primeiro lugar na próxima vez. Persistida em JSON.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._dados = None
+
+    def _carregar(self) -> dict:
+        if self._dados is None:
+            try:
+                with open(self.caminho, "r", encoding="utf-8") as f:
+                    self._dados = json.load(f)
+            except (OSError, ValueError):
+                self._dados = {}
+        return self._dados
+
+    @staticmethod
+    def _chave(pagina: str, operacao: str) -> str:
+        return f"{BASE_URL}|{pagina}|{operacao}"
+
+    def preferida(self, pagina: str, operacao: str) -> str | None:
+        with self._lock:
+            return self._carregar().get(self._chave(pagina, operacao))
+
+    def ordenar(self, pagina: str, operacao: str, estrategias: list) -> list:
+        """Estratégias [(nome, função)] com a última bem-sucedida à frente (demais na ordem original)."""
+        preferida = self.preferida(pagina, operacao)
+        return sorted(estrategias, key=lambda e: e[0] != preferida)
+
+    def lembrar(self, pagina: str, operacao: str, nome: str):
+        with self._lock:
+            dados = self._carregar()
+            chave = self._chave(pagina, operacao)
+            if dados.get(chave) == nome:
+                return
+            dados[chave] = nome
+            try:
+                temporario = f"{self.caminho}.tmp"
+                with open(temporario, "w", encoding="utf-8") as f:
+                    json.dump(dados, f, ensure_ascii=False, indent=2, sort_keys=True)
+                os.replace(temporario, self.caminho)
+            except OSError as e:
+                registrar_log(f"[Aviso] Não foi possível gravar a memória de estratégias: {e}")
+        registrar_log(f"[Info] Estratégia preferida para {pagina}/{operacao}: {nome}")
+
+
+ESTRATEGIAS = MemoriaEstrategias(ESTRATEGIAS_ARQUIVO)
+
+
+def tentar_estrategias(pagina: str, operacao: str, estrategias: list, ordem_fixa: bool = False,
+                       recursos: tuple = ()):
+    """Executa as estratégias [(nome, função sem argumentos)] começando pela última que funcionou.
+    A primeira que retornar valor verdadeiro é lembrada e seu resultado devolvido; a cadeia
+    completa só roda quando a lembrada falha. Se todas falharem, propaga o último erro (ou
+    retorna o último resultado falso). Interrupções do vigia e do orçamento não são absorvidas.
+    Com `ordem_fixa`, a ordem dada é sempre respeitada e nada é lembrado (para operações em
+    que a primeira estratégia é a segura e as demais são apenas recurso). Os nomes em `recursos`
+    são caminhos degradados: podem resolver a chamada, mas nunca são lembrados (nem respeitados,
+    se lembrados por uma versão anterior), para não passarem à frente das estratégias boas.
+    """
+    ultimo_erro = None
+    resultado = None
+    if ordem_fixa or ESTRATEGIAS.preferida(pagina, operacao) in recursos:
+        ordem = estrategias
+    else:
+        ordem = ESTRATEGIAS.ordenar(pagina, operacao, estrategias)
+    for nome, funcao in ordem:
+        try:
+            resultado = funcao()
+        except (EtapaExcedida, OrcamentoEsgotado):
+            raise
+        except Exception as e:
+            ultimo_erro = e
+            continue
+        if resultado:
+            if not ordem_fixa and nome not in recursos:
+                ESTRATEGIAS.lembrar(pagina, operacao, nome)
+            return resultado
+    if ultimo_erro is not None and not resultado:
+        raise ultimo_erro
+    return resultado
+
+
+# ==============================
+# E/S EM SEGUNDO PLANO E PACOTES DE FALHA
+# ==============================
+
+_fila_io = queue.Queue(maxsize=64)
+_thread_io = None
+_thread_io_lock = threading.Lock()
+
+def _trabalhador_io():
+    """Executa as gravações enfileiradas, uma por vez, fora da thread da automação."""
+    while True:
+        funcao, args = _fila_io.get()
+        try:
+            funcao(*args)
+        except Exception as e:
+            try:
+                registrar_log(f"[Aviso] Falha em gravação de segundo plano ({getattr(funcao, '__name__', '?')}): {e}")
+            except Exception:
+                pass
+        finally:
+            _fila_io.task_done()
+
+def enfileirar_io(funcao, *args) -> bool:
+    """Agenda `funcao(*args)` na thread de E/S. Não bloqueia: se a fila estiver cheia,
+    descarta a tarefa e retorna False (a automação tem prioridade sobre o diagnóstico).
+    """
+    global _thread_io
+    with _thread_io_lock:
+        if _thread_io is None or not _thread_io.is_alive():
+            _thread_io = threading.Thread(target=_trabalhador_io, name="ueci-io", daemon=True)
+            _thread_io.start()
+    try:
+        _fila_io.put_nowait((funcao, args))
+        return True
+    except queue.Full:
+        registrar_log(f"[Aviso] Fila de E/S cheia; descartando {getattr(funcao, '__name__', 'tarefa')}")
+        return False
+
+def aguardar_io(timeout: float = 10.0):
+    """Aguarda (com limite) as gravações pendentes; usado ao final da execução."""
+    t0 = time.time()
+    while _fila_io.unfinished_tasks and time.time() - t0 < timeout:
+        time.sleep(0.1)
+
+def capturar_falha(driver, processo, erro, classe: str = ""):
+    """Coleta o estado do navegador no momento da falha e agenda a gravação do pacote.
+    Só as leituras do navegador ocorrem aqui; serialização e compressão ficam na thread de E/S.
+    """
+    dados = {
+        "processo": str(processo or "desconhecido"),
+        "erro": f"{type(erro).__name__}: {erro}",
+        "classe": classe,
+        "momento": f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S}",
+        "url": "",
+        "diagnostico": "",
+    }
+    html = ""
+    png = b""
+    try:
+        dados["url"] = driver.current_url or ""
+    except Exception:
+        pass
+    try:
+        html = driver.page_source or ""
+    except Exception:
+        pass
+    try:
+        png = driver.get_screenshot_as_png() or b""
+    except Exception:
+        pass
+    try:
+        dados["diagnostico"] = diagnosticar_observacao_campos(driver)
+    except Exception:
+        pass
+    log = "\n".join(_log_recente)
+    enfileirar_io(_gravar_pacote_falha, dados, html, png, log)
+
+def _gravar_pacote_falha(dados: dict, html: str, png: bytes, log: str):
+    """Grava o pacote compactado da falha e aplica a retenção do diretório."""
+    os.makedirs(FALHAS_DIR, exist_ok=True)
+    seguro = re.sub(r"[^0-9A-Za-z_-]+", "_", dados.get("processo") or "desconhecido")
+    nome = os.path.join(FALHAS_DIR, f"{datetime.datetime.now():%Y%m%d_%H%M%S}_{seguro}.zip")
+    with zipfile.ZipFile(nome, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr("falha.json", json.dumps(dados, ensure_ascii=False, indent=2))
+        if html:
+            z.writestr("pagina.html", html)
+        if png:
+            z.writestr("tela.png", png)
+        z.writestr("log_recente.txt", log)
+    registrar_log(f"[Diag] Pacote de falha salvo em {nome}")
+    _aplicar_retencao_falhas()
+
+def _aplicar_retencao_falhas():
+    """Mantém no máximo FALHAS_MAX_ARQUIVOS pacotes e FALHAS_MAX_MB em disco (remove os mais antigos)."""
+    try:
+        arquivos = [os.path.join(FALHAS_DIR, n) for n in os.listdir(FALHAS_DIR) if n.endswith(".zip")]
+    except Exception:
+        return
+    arquivos.sort(key=lambda a: os.path.getmtime(a), reverse=True)
+    total = 0
+    limite = FALHAS_MAX_MB * 1024 * 1024
+    for idx, arq in enumerate(arquivos):
+        try:
+            total += os.path.getsize(arq)
+            if idx > 0 and (idx >= FALHAS_MAX_ARQUIVOS or total > limite):
+                os.remove(arq)
+        except Exception:
+            pass
+
+def _caminho_relatorio(processo: str, extensao: str) -> str:
+    seguro = re.sub(r"[^0-9A-Za-z_-]+", "_", processo or "desconhecido")
+    pasta = os.path.join(RELATORIOS_DIR, seguro)
+    os.makedirs(pasta, exist_ok=True)
+    return os.path.join(pasta, f"{datetime.datetime.now():%Y%m%d_%H%M%S}{extensao}")
+
+def arquivar_relatorio(driver, processo: str, orcamento: Orcamento | None = None) -> bool:
+    """Arquiva o relatório da aba atual (antes de fechá-la). No navegador só ocorre a leitura
+    (URL e cookies, ou o PDF impresso via CDP); download e gravação ficam na thread de E/S.
+    Baixar pela URL (modo 'url' e PDFs no 'auto') não espera a página carregar. Imprimir
+    (Page.printToPDF: páginas HTML no 'auto' e o modo 'pdf') exige a página carregada e custa
+    segundos na thread da automação: só ocorre se o `orcamento` do processo comportar (senão
+    baixa pela URL) e o tempo gasto vai para o log.
+    """
+    if not RELATORIOS_DIR or not processo:
+        return False
+    orcamento = orcamento or Orcamento(None)
+    try:
+        t0 = time.monotonic()
+        prazo = orcamento.limitar(RELATORIO_ESPERA_CARGA, minimo=0.5)
+        url, tipo, pronto = "", "", ""
+        # Só até a navegação ser confirmada: URL real e (fora do modo 'url') o tipo do documento
+        while time.monotonic() - t0 < prazo:
+            url = driver.current_url or ""
+            if url and not url.startswith("about:"):
+                if RELATORIOS_MODO == "url":
+                    break
+                pronto, tipo = driver.execute_script("return [document.readyState, document.contentType || '']") or ("", "")
+                if tipo:
+                    break
+            time.sleep(0.2)
+        # O visualizador serve PDFs em URLs .aspx: decide pelo tipo do documento, não pela extensão
+        pdf = (tipo or "").lower() == "application/pdf" or url.lower().split("?", 1)[0].endswith(".pdf")
+        imprimir = RELATORIOS_MODO == "pdf" or (RELATORIOS_MODO == "auto" and not pdf)
+        if imprimir and orcamento.restante() < RELATORIO_MIN_IMPRESSAO:
+            registrar_log(f"[Aviso] Orçamento do processo não comporta imprimir o relatório ({orcamento.restante():.0f}s); arquivando pela URL.")
+            imprimir = False
+        if not imprimir:
+            cookies = "; ".join(f"{c['name']}={c['value']}" for c in driver.get_cookies())
+            ok = enfileirar_io(_baixar_relatorio, processo, url, cookies)
+        else:
+            t_impressao = time.monotonic()
+            while pronto != "complete" and time.monotonic() - t0 < prazo:
+                time.sleep(0.2)
+                pronto = driver.execute_script("return document.readyState")
+            dados = driver.execute_cdp_cmd("Page.printToPDF", {"printBackground": True, "preferCSSPageSize": True})
+            custo = time.monotonic() - t_impressao
+            METRICAS.observar("ueci_etapa_segundos", custo, etapa="relatorio_impressao")
+            registrar_log(f"[Info] Relatório impresso (carga + printToPDF) em {custo:.1f}s")
+            ok = enfileirar_io(_gravar_relatorio, processo, base64.b64decode(dados["data"]), ".pdf")
+        if not ok:
+            registrar_log("[Aviso] Fila de E/S cheia; relatório do processo não foi arquivado.")
+        return ok
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao arquivar o relatório do processo: {e}")
+        return False
+
+def _baixar_relatorio(processo: str, url: str, cookies: str):
+    """Baixa o relatório com os cookies da sessão SISPREV (executa na thread de E/S)."""
+    req = urllib.request.Request(url, headers={"Cookie": cookies, "User-Agent": "UECI-Automacao"})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        conteudo = resp.read()
+        tipo = resp.headers.get("Content-Type", "")
+    extensao = ".pdf" if conteudo[:5] == b"%PDF-" or "pdf" in tipo else ".html"
+    _gravar_relatorio(processo, conteudo, extensao)
+
+def _gravar_relatorio(processo: str, conteudo: bytes, extensao: str):
+    nome = _caminho_relatorio(processo, extensao)
+    with open(nome, "wb") as f:
+        f.write(conteudo)
+    registrar_log(f"[Info] Relatório do processo {processo} arquivado em {nome}")
+
+# ==============================
+# MÉTRICAS (ENDPOINT LOCAL)
+# ==============================
+
+class Metricas:
+    """Registro de contadores, medidores e histogramas em memória.
+    As atualizações feitas pela automação custam apenas um lock e uma soma; a
+    formatação do texto acontece na thread do servidor HTTP, a cada leitura.
+    """
+
+    def __init__(self, buckets=METRICAS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._medidores = {}
+        self._histogramas = {}
+        self._calculados = {}
+        self._ajuda = {}
+
+    @staticmethod
+    def _chave(rotulos: dict):
+        return tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+    def descrever(self, nome: str, ajuda: str):
+        self._ajuda[nome] = ajuda
+
+    def incrementar(self, nome: str, valor: float = 1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._contadores.setdefault(nome, {})
+            serie[chave] = serie.get(chave, 0) + valor
+
+    def definir(self, nome: str, valor: float, **rotulos):
+        with self._lock:
+            self._medidores.setdefault(nome, {})[self._chave(rotulos)] = valor
+
+    def calcular(self, nome: str, funcao):
+        """Registra um medidor avaliado somente na leitura do endpoint (ex.: estado do Chrome)."""
+        self._calculados[nome] = funcao
+
+    def observar(self, nome: str, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._histogramas.setdefault(nome, {})
+            h = serie.get(chave)
+            if h is None:
+                h = serie[chave] = [[0] * len(self.buckets), 0, 0.0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    h[0][i] += 1
+            h[1] += 1
+            h[2] += valor
+
+    @contextlib.contextmanager
+    def medir(self, etapa: str):
+        """Mede a duração de uma etapa no histograma `ueci_etapa_segundos`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar("ueci_etapa_segundos", time.perf_counter() - t0, etapa=etapa)
+
+    @staticmethod
+    def _rotulos(chave, extra=()):
+        itens = list(chave) + list(extra)
+        if not itens:
+            return ""
+        def esc(v):
+            return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in itens) + "}"
+
+    def texto(self) -> str:
+        """Formata todas as séries no formato de exposição texto do Prometheus."""
+        with self._lock:
+            contadores = {n: dict(v) for n, v in self._contadores.items()}
+            medidores = {n: dict(v) for n, v in self._medidores.items()}
+            histogramas = {n: {k: (list(h[0]), h[1], h[2]) for k, h in v.items()} for n, v in self._histogramas.items()}
+        for nome, funcao in self._calculados.items():
+            try:
+                medidores[nome] = {(): float(funcao())}
+            except Exception:
+                pass
+        linhas = []
+        for tipo, grupo in (("counter", contadores), ("gauge", medidores)):
+            for nome in sorted(grupo):
+                if nome in self._ajuda:
+                    linhas.append(f"# HELP {nome} {self._ajuda[nome]}")
+                linhas.append(f"# TYPE {nome} {tipo}")
+                for chave, valor in sorted(grupo[nome].items()):
+                    linhas.append(f"{nome}{self._rotulos(chave)} {valor:g}")
+        for nome in sorted(histogramas):
+            if nome in self._ajuda:
+                linhas.append(f"# HELP {nome} {self._ajuda[nome]}")
+            linhas.append(f"# TYPE {nome} histogram")
+            for chave, (contagens, total, soma) in sorted(histogramas[nome].items()):
+                for limite, qtd in zip(self.buckets, contagens):
+                    linhas.append(f"{nome}_bucket{self._rotulos(chave, [('le', f'{limite:g}')])} {qtd}")
+                linhas.append(f"{nome}_bucket{self._rotulos(chave, [('le', '+Inf')])} {total}")
+                linhas.append(f"{nome}_sum{self._rotulos(chave)} {soma:.6f}")
+                linhas.append(f"{nome}_count{self._rotulos(chave)} {total}")
+        return "\n".join(linhas) + "\n"
+
+METRICAS = Metricas()
+METRICAS.descrever("ueci_processos_recebidos_total", "Processos marcados e recebidos em 'Processos a Receber'.")
+METRICAS.descrever("ueci_processos_ignorados_total", "Processos não recebidos pela regra de setor (CPAD/Protocolo).")
+METRICAS.descrever("ueci_processos_tramitados_total", "Processos tramitados com sucesso.")
+METRICAS.descrever("ueci_processos_falhas_total", "Tentativas de tramitação que falharam, por classe de erro.")
+METRICAS.descrever("ueci_controle_interno_reaproveitado_total", "Processos cujo Controle Interno já estava gravado (Salvar dispensado).")
+METRICAS.descrever("ueci_navegador_heap_bytes", "JSHeapUsedSize da aba de trabalho (CDP Performance).")
+METRICAS.descrever("ueci_navegador_nos", "Nós DOM da aba de trabalho.")
+METRICAS.descrever("ueci_navegador_documentos", "Documentos vivos na aba de trabalho.")
+METRICAS.descrever("ueci_navegador_reciclagens_total", "Reciclagens da aba de trabalho pelo governador de memória.")
+METRICAS.descrever("ueci_etapas_excedidas_total", "Etapas interrompidas pelo vigia de travamentos, por etapa.")
+METRICAS.descrever("ueci_processos_reservados_outro_total", "Processos pulados por estarem reservados por outro operador.")
+METRICAS.descrever("ueci_etapa_segundos", "Duração de cada etapa da automação.")
+METRICAS.descrever("ueci_fila_profundidade", "Itens visíveis nas caixas do setor (receber/dentro_setor).")
+METRICAS.descrever("ueci_sessao_idade_segundos", "Tempo desde a conexão do WebDriver atual (0 sem sessão).")
+METRICAS.descrever("ueci_chrome_conectado", "1 se o Chrome responde na porta de depuração 9222.")
+
+_sessao_iniciada_em = {"t": None}
+
+def _idade_sessao() -> float:
+    t = _sessao_iniciada_em["t"]
+    return (time.time() - t) if t else 0.0
+
+METRICAS.calcular("ueci_sessao_idade_segundos", _idade_sessao)
+METRICAS.calcular("ueci_chrome_conectado", lambda: 1.0 if porta_debug_aberta() else 0.0)
+
+class _ManipuladorMetricas(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        corpo = METRICAS.texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+def iniciar_servidor_metricas(porta: int = METRICAS_PORTA):
+    """Sobe o endpoint /metrics em 127.0.0.1 numa thread daemon (se a porta estiver configurada)."""
+    if not porta:
+        return None
+    try:
+        servidor = http.server.ThreadingHTTPServer(("127.0.0.1", porta), _ManipuladorMetricas)
+        servidor.daemon_threads = True
+    except Exception as e:
+        registrar_log(f"[Aviso] Não foi possível abrir o endpoint de métricas na porta {porta}: {e}")
+        return None
+    threading.Thread(target=servidor.serve_forever, name="ueci-metricas", daemon=True).start()
+    registrar_log(f"Métricas disponíveis em http://127.0.0.1:{porta}/metrics")
+    return servidor
+
+# ==============================
+# GRAVAÇÃO E REPRODUÇÃO DE FIXTURES
+# ==============================
+
+_RE_CPF_FORMATADO = re.compile(r"\b\d{3}\.\d{3}\.\d{3}-\d{2}\b")
+_RE_CPF = re.compile(_RE_CPF_FORMATADO.pattern + r"|\b\d{11}\b")
+_RE_INPUT_SENSIVEL = re.compile(
+    r"""(<input\b[^>]*?\b(?:id|name)=["'][^"']*(?:nome|cpf|__viewstate|__eventvalidation)[^"']*["'][^>]*?\bvalue=["'])([^"']*)""",
+    re.IGNORECASE,
+)
+_RE_INPUT_SENSIVEL_INV = re.compile(
+    r"""(<input\b[^>]*?\bvalue=["'])([^"']*)(["'][^>]*?\b(?:id|name)=["'][^"']*(?:nome|cpf|__viewstate|__eventvalidation)[^"']*["'])""",
+    re.IGNORECASE,
+)
+# Nome em maiúsculas como conteúdo inteiro de uma célula/rótulo/bloco de texto
+_RE_NOME_CAIXA_ALTA = re.compile(
+    r"(<(td|span|label|div|p|b|strong|li|font)\b[^>]*>\s*)([A-ZÀ-Ý][A-ZÀ-Ý'’]+(?: (?:D[AEO]S?|E|[A-ZÀ-Ý][A-ZÀ-Ý'’]+))+)(\s*</\2>)"
+)
+# Qualquer caixa: texto de elementos cujo id/name/class indica uma pessoa…
+_RE_ELEMENTO_PESSOA = re.compile(
+    r"""(<(\w+)\b[^>]*?\b(?:id|name|class)=["'][^"']*(?:nome|interessad|segurad|servidor|requerente|beneficiari|responsavel|assinante)[^"']*["'][^>]*>)([^<]*)(</\2>)""",
+    re.IGNORECASE,
+)
+# …e o que vem depois de rótulos como "Nome:"/"Interessado:" no texto
+_RE_ROTULO_PESSOA = re.compile(
+    r"((?:Nome|Interessad[oa]|Segurad[oa]|Servidora?|Requerente|Benefici[aá]ri[oa]|Respons[aá]vel)\s*:\s*)"
+    r"([A-Za-zÀ-ÿ'’]+(?: [A-Za-zÀ-ÿ'’]+){0,6})",
+    re.IGNORECASE,
+)
+_RE_POST_SENSIVEL = re.compile(r"((?:^|&)[^=&]*(?:nome|cpf|__viewstate|__eventvalidation)[^=&]*=)([^&]*)", re.IGNORECASE)
+
+def _mascarar(valor: str) -> str:
+    """Mascara mantendo o comprimento (as respostas parciais do UpdatePanel dependem dele)."""
+    return re.sub(r"[0-9]", "0", re.sub(r"[^\W\d_]", "X", valor))
+
+def anonimizar_texto(texto: str, codigo: bool = False) -> str:
+    """Remove CPFs (com ou sem pontuação), nomes e estado serializado (ViewState) de HTML/respostas
+    de postback. Nomes: em maiúsculas como texto de célula/rótulo, em qualquer caixa dentro de
+    elementos de pessoa (id/name/class) ou após rótulos ("Nome:"), e os nomes conhecidos do app.
+    Com `codigo` (JavaScript/CSS), só CPFs pontuados e os nomes conhecidos: as demais regras
+    reescreveriam literais (`nome: x`, números de 11 dígitos) e quebrariam a página no replay."""
+    if not texto:
+        return texto
+    if codigo:
+        texto = _RE_CPF_FORMATADO.sub(lambda m: _mascarar(m.group(0)), texto)
+        return _mascarar_nomes_conhecidos(texto)
+    texto = _RE_CPF.sub(lambda m: _mascarar(m.group(0)), texto)
+    texto = _RE_INPUT_SENSIVEL.sub(lambda m: m.group(1) + _mascarar(m.group(2)), texto)
+    texto = _RE_INPUT_SENSIVEL_INV.sub(lambda m: m.group(1) + _mascarar(m.group(2)) + m.group(3), texto)
+    texto = _RE_NOME_CAIXA_ALTA.sub(lambda m: m.group(1) + _mascarar(m.group(3)) + m.group(4), texto)
+    texto = _RE_ELEMENTO_PESSOA.sub(lambda m: m.group(1) + _mascarar(m.group(3)) + m.group(4), texto)
+    texto = _RE_ROTULO_PESSOA.sub(lambda m: m.group(1) + _mascarar(m.group(2)), texto)
+    return _mascarar_nomes_conhecidos(texto)
+
+def _mascarar_nomes_conhecidos(texto: str) -> str:
+    nomes = list(RESPONSAVEIS) + list(ASSINANTES_POR_USUARIO.values())
+    for nome in nomes:
+        texto = re.sub(re.escape(nome), lambda m: _mascarar(m.group(0)), texto, flags=re.IGNORECASE)
+    return texto
+
+def anonimizar_post(dados: str) -> str:
+    """Mascara campos de nome/CPF/ViewState no corpo de um POST (application/x-www-form-urlencoded)."""
+    if not dados:
+        return dados
+    dados = _RE_POST_SENSIVEL.sub(lambda m: m.group(1) + _mascarar(m.group(2)), dados)
+    return anonimizar_texto(dados)
+
+class GravadorFixtures:
+    """Grava as respostas vistas pelo navegador (eventos CDP Network do log 'performance')
+    num arquivo .zip anonimizado: manifest.json com tempos/URLs e um arquivo por corpo.
+    Instrumenta `driver.execute` para drenar os eventos logo após cada comando que pode
+    navegar, enquanto os corpos ainda estão disponíveis no Chrome. Cada corpo segue para o
+    .zip pela thread de E/S assim que capturado (a memória não cresce com a gravação); o
+    manifest.json é escrito e o arquivo fechado em finalizar().
+    """
+
+    COMANDOS_NAVEGACAO = {"get", "goBack", "refresh", "clickElement", "executeScript", "w3cExecuteScript",
+                          "acceptAlert", "w3cAcceptAlert", "sendKeysToElement"}
+
+    def __init__(self, destino: str):
+        self.destino = destino
+        self.entradas = []
+        self._zip = None        # aberto e usado só pela thread de E/S
+        self._pendentes = {}
+        self._t0 = None
+        self._execute = None
+
+    def _cdp(self, cmd: str, params: dict | None = None):
+        return self._execute("executeCdpCommand", {"cmd": cmd, "params": params or {}})["value"]
+
+    def instrumentar(self, driver):
+        """Habilita o domínio Network e passa a drenar os eventos após comandos de navegação."""
+        original = driver.execute
+        # getLog/CDP do próprio gravador vão direto ao driver, fora do ContabilizadorComandos
+        self._execute = type(driver).execute.__get__(driver)
+        try:
+            self._cdp("Network.enable", {"maxTotalBufferSize": 200 * 1024 * 1024, "maxResourceBufferSize": 50 * 1024 * 1024})
+            self._execute("getLog", {"type": "performance"})  # descarta eventos anteriores à gravação
+        except Exception as e:
+            registrar_log(f"[Aviso] Gravação de fixtures indisponível (log 'performance'/CDP): {e}")
+            return driver
+
+        def execute(driver_command, params=None):
+            resposta = original(driver_command, params)
+            if driver_command in self.COMANDOS_NAVEGACAO:
+                self.coletar()
+            return resposta
+
+        driver.execute = execute
+        registrar_log(f"[Fixture] Gravando respostas em {self.destino}")
+        return driver
+
+    def coletar(self):
+        try:
+            eventos = self._execute("getLog", {"type": "performance"})["value"] or []
+        except Exception:
+            return
+        for ev in eventos:
+            try:
+                msg = json.loads(ev["message"])["message"]
+            except Exception:
+                continue
+            metodo = msg.get("method")
+            p = msg.get("params") or {}
+            rid = p.get("requestId")
+            if metodo == "Network.requestWillBeSent":
+                req = p.get("request") or {}
+                if self._t0 is None:
+                    self._t0 = p.get("timestamp", 0)
+                self._pendentes[rid] = {
+                    "metodo": req.get("method", "GET"),
+                    "url": req.get("url", ""),
+                    "post": anonimizar_post(req.get("postData") or ""),
+                    "inicio": p.get("timestamp", 0),
+                    "tipo": p.get("type", ""),
+                }
+            elif metodo == "Network.responseReceived" and rid in self._pendentes:
+                resp = p.get("response") or {}
+                cabecalhos = {k.lower(): v for k, v in (resp.get("headers") or {}).items()}
+                self._pendentes[rid].update({
+                    "status": resp.get("status", 200),
+                    "mime": resp.get("mimeType", ""),
+                    "tipo": p.get("type") or self._pendentes[rid]["tipo"],
+                    "location": cabecalhos.get("location", ""),
+                    "resposta": p.get("timestamp", 0),
+                })
+            elif metodo == "Network.loadingFinished" and rid in self._pendentes:
+                item = self._pendentes.pop(rid)
+                if item.get("tipo") not in GRAVACAO_TIPOS or "status" not in item:
+                    continue
+                self._guardar(rid, item, p.get("timestamp", 0))
+            elif metodo == "Network.loadingFailed":
+                self._pendentes.pop(rid, None)
+
+    def _guardar(self, rid, item: dict, fim: float):
+        try:
+            corpo = self._cdp("Network.getResponseBody", {"requestId": rid})
+        except Exception:
+            return
+        dados = corpo.get("body") or ""
+        omitido = None
+        mime = item.get("mime") or ""
+        codigo = item.get("tipo") in ("Script", "Stylesheet") or any(t in mime for t in ("javascript", "css"))
+        if corpo.get("base64Encoded"):
+            bruto = base64.b64decode(dados)
+            conteudo = None
+            if mime.startswith("text/") or any(t in mime for t in ("json", "javascript", "xml")):
+                try:
+                    conteudo = anonimizar_texto(bruto.decode("utf-8"), codigo).encode("utf-8")
+                except UnicodeDecodeError:
+                    pass
+            if conteudo is None:
+                # Binário (PDF/relatório) não pode ser anonimizado: grava só o hash e o tamanho
+                conteudo = b""
+                omitido = {"sha256": hashlib.sha256(bruto).hexdigest(), "tamanho": len(bruto)}
+        else:
+            conteudo = anonimizar_texto(dados, codigo).encode("utf-8")
+        seq = len(self.entradas)
+        arquivo = f"corpos/{seq:06d}"
+        if not enfileirar_io(self._escrever, arquivo, conteudo):
+            omitido = {"motivo": "fila de E/S cheia"}
+        self.entradas.append({
+            "seq": seq,
+            "metodo": item["metodo"],
+            "url": item["url"],
+            "post": item["post"],
+            "status": item["status"],
+            "mime": item["mime"],
+            "tipo": item["tipo"],
+            "location": item.get("location", ""),
+            "inicio": round(item["inicio"] - (self._t0 or item["inicio"]), 4),
+            "espera": round(max(0.0, item.get("resposta", fim) - item["inicio"]), 4),
+            "duracao": round(max(0.0, fim - item["inicio"]), 4),
+            "arquivo": arquivo,
+            **({"omitido": omitido} if omitido else {}),
+        })
+
+    def _escrever(self, nome: str, conteudo: bytes):
+        """Na thread de E/S: acrescenta um arquivo ao .zip (aberto na primeira escrita)."""
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(self.destino, "w", compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr(nome, conteudo)
+
+    def _fechar(self, manifesto: dict):
+        """Na thread de E/S: grava o manifest.json e fecha o .zip."""
+        self._escrever("manifest.json", json.dumps(manifesto, ensure_ascii=False, indent=1))
+        self._zip.close()
+        self._zip = None
+        registrar_log(f"[Fixture] {len(manifesto['entradas'])} resposta(s) gravada(s) em {self.destino}")
+
+    def finalizar(self):
+        """Drena os últimos eventos e agenda a escrita do manifesto e o fechamento do .zip."""
+        if self._execute is None:
+            return
+        self.coletar()
+        manifesto = {"base_url": BASE_URL, "gravado_em": f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S}",
+                     "entradas": list(self.entradas)}
+        if not enfileirar_io(self._fechar, manifesto):
+            # Sem o manifesto o .zip não serve para o replay: fecha mesmo com a fila cheia
+            aguardar_io()
+            self._fechar(manifesto)
+
+class _ManipuladorReplay(http.server.BaseHTTPRequestHandler):
+    """Serve as respostas gravadas na ordem original, respeitando a duração medida de cada uma.
+    Só a duração de cada resposta é reproduzida: os intervalos entre requisições (o campo
+    'inicio' do manifesto) dependem de quem conduz o navegador e não são impostos pelo replay.
+    """
+    arquivo = None
+    fila = {}
+    por_caminho = {}
+    velocidade = 1.0
+    lock = threading.Lock()
+
+    @classmethod
+    def carregar(cls, caminho: str, velocidade: float = 1.0):
+        cls.arquivo = zipfile.ZipFile(caminho)
+        manifesto = json.loads(cls.arquivo.read("manifest.json"))
+        cls.origem = urllib.parse.urlsplit(manifesto.get("base_url") or BASE_URL)
+        cls.velocidade = velocidade or 1.0
+        cls.fila, cls.por_caminho = {}, {}
+        for e in manifesto["entradas"]:
+            u = urllib.parse.urlsplit(e["url"])
+            caminho_q = u.path + (("?" + u.query) if u.query else "")
+            cls.fila.setdefault((e["metodo"], caminho_q), collections.deque()).append(e)
+            cls.por_caminho.setdefault((e["metodo"], u.path), collections.deque()).append(e)
+        return len(manifesto["entradas"])
+
+    def _responder(self):
+        chave = (self.command, self.path)
+        with self.lock:
+            fila = self.fila.get(chave) or self.por_caminho.get((self.command, self.path.split("?")[0]))
+            if not fila:
+                entrada = None
+            elif len(fila) > 1:
+                entrada = fila.popleft()  # próxima resposta na ordem gravada
+            else:
+                entrada = fila[0]         # última resposta conhecida: repete
+        if self.command == "POST":
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if entrada is None:
+            self.send_error(404, "Sem resposta gravada para esta requisição")
+            return
+        time.sleep(entrada.get("duracao", 0) / self.velocidade)
+        try:
+            corpo = self.arquivo.read(entrada["arquivo"])
+        except KeyError:
+            corpo = b""   # corpo descartado na gravação (fila de E/S cheia)
+        self.send_response(int(entrada.get("status") or 200))
+        mime = entrada.get("mime") or "application/octet-stream"
+        if mime.startswith("text/") or mime in ("application/javascript", "application/json"):
+            mime += "; charset=utf-8"
+        self.send_header("Content-Type", mime)
+        if entrada.get("location"):
+            local = entrada["location"]
+            destino = urllib.parse.urlsplit(local)
+            if destino.netloc == self.origem.netloc:
+                # Redireciona para o próprio servidor de replay
+                local = destino.path + (("?" + destino.query) if destino.query else "")
+            self.send_header("Location", local)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    do_GET = _responder
+    do_POST = _responder
+
+    def log_message(self, formato, *args):
+        print(f"[Replay] {self.command} {self.path}")
+
+def servir_replay(caminho: str, porta: int = REPLAY_PORTA, velocidade: float = 1.0):
+    """Sobe o servidor de reprodução (bloqueante). Aponte SISPREV_BASE_URL para ele.
+    Reproduz a duração de cada resposta, não as pausas entre requisições (ver _ManipuladorReplay)."""
+    total = _ManipuladorReplay.carregar(caminho, velocidade)
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", porta), _ManipuladorReplay)
+    caminho_base = _ManipuladorReplay.origem.path
+    print(f"[Replay] {total} resposta(s) de {caminho} em http://127.0.0.1:{porta}{caminho_base} (velocidade {velocidade}x)")
+    print(f"[Replay] Use: SISPREV_BASE_URL=http://127.0.0.1:{porta}{caminho_base}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+# ==============================
+# CONTABILIZAÇÃO DE COMANDOS WEBDRIVER
+# ==============================
+
+class ContabilizadorComandos:
+    """Conta e cronometra cada comando WebDriver (find_elements, execute_script, clicks,
+    leituras de .text/is_displayed…) por função chamadora deste módulo e por processo.
+    Instrumenta `driver.execute`, por onde passam também os comandos dos WebElements.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.por_funcao = {}      # (função, comando) -> [quantidade, segundos]
+        self.por_processo = {}    # processo -> [quantidade, segundos]
+        self.total = [0, 0.0]
+
+    def instrumentar(self, driver):
+        original = driver.execute
+
+        def execute(driver_command, params=None):
+            t0 = time.perf_counter()
+            try:
+                return original(driver_command, params)
+            finally:
+                self.registrar(driver_command, time.perf_counter() - t0)
+
+        driver.execute = execute
+        return driver
+
+    # code object -> nome da função (se for deste módulo e nomeada) ou None; evita refazer as
+    # comparações a cada comando, já que os mesmos quadros se repetem milhares de vezes
+    _codigos = {}
+
+    @classmethod
+    def _funcao_chamadora(cls) -> str:
+        """Primeira função nomeada deste módulo na pilha (ignora lambdas e o próprio contador)."""
+        codigos = cls._codigos
+        f = sys._getframe(3)
+        while f is not None:
+            co = f.f_code
+            try:
+                nome = codigos[co]
+            except KeyError:
+                proprio = f.f_globals.get("__name__") == __name__ and not co.co_name.startswith("<")
+                nome = codigos[co] = co.co_name if proprio else None
+            if nome:
+                return nome
+            f = f.f_back
+        return "?"
+
+    def registrar(self, comando: str, segundos: float):
+        funcao = self._funcao_chamadora()
+        processo = getattr(_contexto_log, "processo", None) or "-"
+        with self._lock:
+            item = self.por_funcao.setdefault((funcao, comando), [0, 0.0])
+            item[0] += 1
+            item[1] += segundos
+            item = self.por_processo.setdefault(processo, [0, 0.0])
+            item[0] += 1
+            item[1] += segundos
+            self.total[0] += 1
+            self.total[1] += segundos
+        METRICAS.incrementar("ueci_webdriver_comandos_total", funcao=funcao)
+        METRICAS.incrementar("ueci_webdriver_segundos_total", segundos, funcao=funcao)
+
+    def resumo(self, top: int = 15) -> str:
+        """Texto do resumo da execução: totais, piores (função, comando) e média por processo."""
+        with self._lock:
+            por_funcao = sorted(self.por_funcao.items(), key=lambda kv: kv[1][1], reverse=True)
+            por_processo = {k: list(v) for k, v in self.por_processo.items() if k != "-"}
+            qtd, seg = self.total
+        linhas = [f"WebDriver: {qtd} comando(s) em {seg:.1f}s"]
+        funcoes = {}
+        for (funcao, _), (n, t) in por_funcao:
+            acc = funcoes.setdefault(funcao, [0, 0.0])
+            acc[0] += n
+            acc[1] += t
+        linhas.append("Por função:")
+        for funcao, (n, t) in sorted(funcoes.items(), key=lambda kv: kv[1][1], reverse=True)[:top]:
+            linhas.append(f"  {funcao:<40} {n:>6}x {t:>8.2f}s")
+        linhas.append("Por função/comando:")
+        for (funcao, comando), (n, t) in por_funcao[:top]:
+            linhas.append(f"  {funcao + ' › ' + comando:<55} {n:>6}x {t:>8.2f}s (média {t / n * 1000:.0f}ms)")
+        if por_processo:
+            n_medio = sum(v[0] for v in por_processo.values()) / len(por_processo)
+            t_medio = sum(v[1] for v in por_processo.values()) / len(por_processo)
+            linhas.append(f"Por processo: {len(por_processo)} processo(s), média de {n_medio:.0f} comando(s) e {t_medio:.2f}s")
+            for proc, (n, t) in sorted(por_processo.items(), key=lambda kv: kv[1][1], reverse=True)[:5]:
+                linhas.append(f"  {proc:<30} {n:>6}x {t:>8.2f}s")
+        return "\n".join(linhas)
+
+METRICAS.descrever("ueci_webdriver_comandos_total", "Comandos WebDriver enviados, por função chamadora.")
+METRICAS.descrever("ueci_webdriver_segundos_total", "Tempo acumulado em comandos WebDriver, por função chamadora.")
+
+def aguardar_login(driver, timeout: float = 60) -> bool:
+    """Na tela de login/aviso: clica em 'Clique aqui para logar novamente' (se houver) e aguarda
+    o usuário entrar. Retorna False se o login não for detectado no tempo limite."""
+    try:
+        # Clica em "Clique aqui para logar novamente." se existir
+        link = driver.find_elements(By.XPATH, "//a[contains(.,'Clique aqui') and contains(.,'logar')]")
+        if link:
+            driver.execute_script("arguments[0].click();", link[0])
+    except Exception:
+        pass
+
+    atualizar_status(f"🔐 Sessão expirada — faça login. Aguardando até {timeout:.0f}s…")
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.5).until(
+            lambda d: ("/Login/" not in d.current_url) and ("AvisoLogin" not in d.current_url)
+        )
+        return True
+    except TimeoutException:
+        registrar_log(f"[Erro] Login não detectado no tempo limite ({timeout:.0f}s).")
+        return False
+
+
+def abrir_concessao(driver, wait):
+    """Abre a tela Benefício > Concessão. Caminhos: URL direta, home + login + URL direta e menu;
+    começa pelo que funcionou por último neste ambiente (MemoriaEstrategias).
+    Retorna True em caso de sucesso, False caso contrário.
+    """
+    url_concessao = f"{BASE_URL}/ProcessoBeneficio/ConProcessoBeneficio.aspx"
+    estado = {"ultimo_erro": None, "login_falhou": False}
+
+    def url_direta():
+        # Tenta por URL direta (mais rápido e estável) com pequenas tentativas
+        for tentativa in range(2):
+            try:
+                driver.get(url_concessao)
+                WebDriverWait(driver, 10, poll_frequency=0.3).until(
+                    EC.presence_of_element_located((By.ID, "ctl00_ContentCampos_ddlSetor"))
+                )
+                registrar_log("Concessão aberta via URL direta")
+                return True
+            except Exception as e:
+                estado["ultimo_erro"] = e
+                classe = classificar_erro(e, driver)
+                registrar_log(f"[Aviso] Falha ao abrir via URL direta (tentativa {tentativa+1}/2, {classe}): {e}")
+                if classe == "sessao_expirada":
+                    # Não adianta insistir na URL direta: segue para o fluxo de login
+                    return False
+                try:
+                    time.sleep(calcular_espera(classe, tentativa))
+                except Exception:
+                    pass
+        return False
+
+    def base_e_login():
+        # Estabelece contexto partindo da home/base
+        try:
+            driver.get(BASE_URL)
+            time.sleep(0.6)
+        except Exception as e:
+            registrar_log(f"[Aviso] Falha ao carregar BASE_URL: {e}")
+        # Verifica se caiu em tela de login/aviso e conduz o fluxo
+        try:
+            atual = driver.current_url
+        except Exception:
+            atual = ""
+
+        if ("/Login/" in atual) or ("AvisoLogin" in atual):
+            if not aguardar_login(driver):
+                estado["login_falhou"] = True
+                return False
+
+        # Após base/login, tenta novamente via URL direta somente mais uma vez
+        try:
+            driver.get(url_concessao)
+            WebDriverWait(driver, 10, poll_frequency=0.3).until(
+                EC.presence_of_element_located((By.ID, "ctl00_ContentCampos_ddlSetor"))
+            )
+            registrar_log("Concessão aberta via URL direta após base/login")
+            return True
+        except Exception as e2:
+            registrar_log(f"[Aviso] Ainda não abriu via URL direta após base/login: {e2}")
+            return False
+
+    def menu():
+        if estado["login_falhou"]:
+            return False
+        try:
+            # Alguns layouts exigem normalizar espaços no texto
+            try:
+                beneficio_menu = WebDriverWait(driver, 5, poll_frequency=0.2).until(
+                    EC.element_to_be_clickable((By.XPATH, "//a[normalize-space(.)='Benefício']"))
+                )
+            except Exception:
+                beneficio_menu = driver.find_element(By.XPATH, "//a[contains(.,'Benef')]" )
+            beneficio_menu.click()
+
+            concessao_link = WebDriverWait(driver, 5, poll_frequency=0.2).until(
+                EC.element_to_be_clickable((By.XPATH, "//a[normalize-space(.)='Concessão']"))
+            )
+            concessao_link.click()
+
+            WebDriverWait(driver, 10, poll_frequency=0.3).until(
+                EC.presence_of_element_located((By.ID, "ctl00_ContentCampos_ddlSetor"))
+            )
+            registrar_log("Concessão aberta via menu")
+            return True
+        except Exception as e:
+            registrar_log(f"[Aviso] Não foi possível abrir Concessão pelo menu: {e}")
+            return False
+
+    if tentar_estrategias("concessao", "abrir", [
+        ("url_direta", url_direta),
+        ("base_login", base_e_login),
+        ("menu", menu),
+    ]):
+        return True
+    registrar_log("[Erro] Não foi possível abrir Concessão por URL nem por menu.")
+    if estado["ultimo_erro"]:
+        registrar_log(f"[Det] Último erro de navegação direta: {estado['ultimo_erro']}")
+    return False
+
+
+PARECER_CONTROLE_INTERNO = "Não foi objeto do exame"
+
+def ler_estado_controle_interno(driver) -> dict | None:
+    """Lê, numa única chamada, o parecer selecionado e o CPF/Nome do responsável na aba TCE.
+    Os painéis do TabContainer já estão no DOM mesmo com a aba fechada.
+    Retorna None se os campos não existirem na página.
+    """
+    try:
+        return driver.execute_script(
+            """
+            var p = document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_parecerControleInternoTCE');
+            var c = document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_txtCPFRespControleInternoTCE');
+            var n = document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_txtNomeRespControleInternoTCE');
+            if(!p || !c || !n) return null;
+            var op = p.selectedIndex >= 0 ? p.options[p.selectedIndex] : null;
+            return {
+                parecer: op ? (op.text || '') : '',
+                cpf: c.value || '',
+                nome: n.value || ''
+            };
+            """
+        )
+    except Exception:
+        return None
+
+def controle_interno_ja_preenchido(estado: dict | None, nome_responsavel: str, cpf_responsavel: str) -> bool:
+    """True se parecer, CPF e Nome gravados já correspondem aos que seriam preenchidos."""
+    if not estado:
+        return False
+    return (
+        _normalize_text(estado.get("parecer")) == _normalize_text(PARECER_CONTROLE_INTERNO)
+        and re.sub(r"\D", "", estado.get("cpf") or "") == re.sub(r"\D", "", cpf_responsavel or "")
+        and _normalize_text(estado.get("nome")) == _normalize_text(nome_responsavel)
+    )
+
+def preencher_informacoes_controle_interno(driver, wait, nome_responsavel, cpf_responsavel, orcamento: Orcamento | None = None,
+                                           teto: float = ESPERA_ELEMENTO):
+    """Preenche o parecer e os dados do responsável do Controle Interno dentro do processo.
+    Se os valores já estiverem gravados (execução anterior/retentativa), não faz o postback de Salvar.
+    Cada espera por elemento vai até `teto` segundos, limitada pelo `orcamento` do processo.
+    """
+    orcamento = orcamento or Orcamento(None)
+    if controle_interno_ja_preenchido(ler_estado_controle_interno(driver), nome_responsavel, cpf_responsavel):
+        registrar_log(f"[Skip] Controle interno já preenchido para {nome_responsavel}; Salvar dispensado")
+        METRICAS.incrementar("ueci_controle_interno_reaproveitado_total")
+        return
+    try:
+        # Abre aba "Mais Informações do Processo" - pelo ID ou pelo texto (começa pelo que funcionou antes)
+        def aba_por(localizador):
+            def clicar():
+                aba_info = orcamento.esperar(driver, EC.element_to_be_clickable(localizador), teto)
+                driver.execute_script("arguments[0].click();", aba_info)
+                print(f"[OK] Aba clicada via {localizador[0]}")
+                return True
+            return clicar
+
+        tentar_estrategias("processo", "aba_tce", [
+            ("id", aba_por((By.ID, "__tab_ctl00_ContentCampos_TabContainer1_tabTCE"))),
+            ("xpath", aba_por((By.XPATH, "//span[contains(text(),'Mais Informações do Processo')]"))),
+        ])
+        orcamento.dormir(1)
+
+        # Seleciona “Não foi objeto do exame”
+        select_parecer = Select(orcamento.esperar(driver,
+            EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_parecerControleInternoTCE")), teto
+        ))
+        select_parecer.select_by_visible_text(PARECER_CONTROLE_INTERNO)
+
+        # Ativa e preenche campos de CPF e Nome
+        driver.execute_script("document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_txtCPFRespControleInternoTCE').removeAttribute('disabled');")
+        driver.execute_script("document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_txtNomeRespControleInternoTCE').removeAttribute('disabled');")
+        time.sleep(0.3)
+
+        campo_cpf = driver.find_element(By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_txtCPFRespControleInternoTCE")
+        campo_nome = driver.find_element(By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_txtNomeRespControleInternoTCE")
+
+        campo_cpf.clear()
+        campo_cpf.send_keys(cpf_responsavel)
+        campo_nome.clear()
+        campo_nome.send_keys(nome_responsavel)
+
+        # Salvar
+        btn_salvar = orcamento.esperar(driver, EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_btnSalvar")), teto)
+        driver.execute_script("arguments[0].click();", btn_salvar)
+        orcamento.dormir(1)
+
+        print(f"[OK] Informações preenchidas para {nome_responsavel}")
+        registrar_log(f"[OK] Informações preenchidas para {nome_responsavel}")
+
+    except Exception as e:
+        print(f"[Erro] Falha ao preencher informações de controle interno: {e}")
+        registrar_log(f"[Erro] Falha ao preencher informações de controle interno: {e}")
+        raise
+
+
+def preencher_editor_observacao(driver, wait, texto_html: str, orcamento: Orcamento | None = None):
+    """Preenche o campo de observação do painel de tramitação (esperas limitadas pelo `orcamento`).
+    Estratégias: contenteditable e iframe — começando pela última que funcionou neste ambiente
+    (MemoriaEstrategias) — e, como último recurso nunca lembrado, textarea/hidden.
+    Sempre tenta sincronizar o hidden (se existir) após preencher o editor visual.
+    Retorna True se conseguiu preencher, senão False.
+    """
+    orcamento = orcamento or Orcamento(None)
+    html = texto_html.replace("\n", "<br>")
+
+    def contenteditable():
+        # Contenteditable direto (mais comum)
+        return driver.execute_script(
+            """
+            var el = document.querySelector('body[contenteditable="true"], [contenteditable="true"]');
+            if(!el) return false;
+            el.scrollIntoView({block:'center'});
+            el.focus();
+            el.innerHTML = arguments[0];
+            ['input','keyup','change','blur'].forEach(function(evt){
+                var e = new Event(evt, {bubbles:true}); el.dispatchEvent(e);
+            });
+            var ta = document.getElementById('ctl00_ContentToolBar_txtObservacao');
+            if(ta){
+                ta.value = el.innerText;
+                ['input','keyup','change','blur'].forEach(function(evt){
+                    var e = new Event(evt, {bubbles:true}); ta.dispatchEvent(e);
+                });
+            }
+            return !!(el.innerText && el.innerText.length);
+            """,
+            html
+        )
+
+    def iframe():
+        # Editor em iframe
+        candidatos = orcamento.procurar(driver, By.XPATH, "//iframe[contains(@id,'txtObservacao') or contains(@name,'txtObservacao') or contains(@id,'ContentToolBar') or contains(@id,'Editor')]")
+        for frame in candidatos:
+            try:
+                driver.switch_to.frame(frame)
+                body = orcamento.esperar(driver,
+                    EC.presence_of_element_located((By.TAG_NAME, "body")), ESPERA_ELEMENTO, poll=0.2
+                )
+                body.click(); time.sleep(0.2)
+                driver.execute_script("arguments[0].innerHTML = arguments[1];", body, html)
+                ok = driver.execute_script("return arguments[0].innerText && arguments[0].innerText.length;", body)
+                driver.switch_to.default_content()
+                if ok and int(ok) > 0:
+                    # sincroniza hidden
+                    try:
+                        driver.execute_script(
+                            """
+                            var ta=document.getElementById('ctl00_ContentToolBar_txtObservacao');
+                            if(ta){
+                                ta.value=arguments[0];
+                                ['input','keyup','change','blur'].forEach(function(evt){
+                                    var e = new Event(evt, {bubbles:true}); ta.dispatchEvent(e);
+                                });
+                            }
+                            """,
+                            texto_html
+                        )
+                    except Exception:
+                        pass
+                    return True
+            except Exception:
+                driver.switch_to.default_content()
+                continue
+        return False
+
+    def textarea():
+        # Tentativa direta no elemento conhecido (textarea/hidden)
+        elem = orcamento.esperar(driver,
+            EC.presence_of_element_located((By.ID, "ctl00_ContentToolBar_txtObservacao")), ESPERA_ELEMENTO
+        )
+        driver.execute_script("arguments[0].scrollIntoView(true);", elem)
+        time.sleep(0.2)
+        try:
+            elem.clear()
+        except Exception:
+            pass
+        try:
+            elem.send_keys(texto_html)
+        except Exception:
+            driver.execute_script("arguments[0].value = arguments[1];", elem, texto_html)
+
+        preenchido = driver.execute_script("return arguments[0].value || arguments[0].textContent || '';", elem)
+        return bool(preenchido and len(preenchido.strip()) >= min(20, len(texto_html)//2))
+
+    try:
+        # textarea/hidden só prova que nós mesmos gravamos o campo: nunca vira a preferida
+        return bool(tentar_estrategias("tramitar", "editor_observacao", [
+            ("contenteditable", contenteditable),
+            ("iframe", iframe),
+            ("textarea", textarea),
+        ], recursos=("textarea",)))
+    except Exception:
+        return False
+
+
+def aguardar_sincronizacao_observacao(driver, texto_html: str, timeout: int = 8) -> bool:
+    """Aguarda o editor/textarea refletir o texto inserido antes de clicar em Tramitar.
+    Considera sincronizado quando o comprimento do conteúdo visível/oculto atinge
+    pelo menos 60% do texto esperado (com mínimo de 30 caracteres).
+    """
+    min_len = max(15, int(len(texto_html) * 0.3))
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.3).until(
+            lambda d: d.execute_script(
+                """
+                var el = document.querySelector('body[contenteditable="true"], [contenteditable="true"]');
+                var len1 = el ? (el.innerText || '').trim().length : 0;
+                var ta = document.getElementById('ctl00_ContentToolBar_txtObservacao');
+                var len2 = ta ? ((ta.value || ta.textContent || '').trim().length) : 0;
+                return Math.max(len1, len2) >= arguments[0];
+                """,
+                min_len
+            )
+        )
+        # pequenas pausas adicionais para estabilidade do DOM
+        time.sleep(0.3)
+        return True
+    except Exception:
+        return False
+
+
+def forcar_sincronizacao_observacao(driver, texto_html: str, texto_plano: str | None = None) -> int:
+    """Força a sincronização do texto do despacho nos campos submetidos pelo formulário.
+    - Garante o HTML no editor contenteditable (se existir)
+    - Preenche todos os inputs/textarea com id ou name contendo 'Observacao'/'txtObservacao'
+    - Remove atributo 'disabled' para garantir que o valor seja submetido no postback
+    - Usa `texto_plano` já renderizado quando informado (evita converter o HTML no navegador)
+    Retorna a quantidade de elementos atualizados.
+    """
+    try:
+        atualizados = driver.execute_script(
+            r"""
+            return (function(html, plainPronto){
+                function syncIn(doc){
+                    var updated = 0;
+                    try{
+                        // Converte HTML para texto simples (se não veio pronto do Python)
+                        var plain = plainPronto;
+                        if(!plain){
+                            var tmp = doc.createElement('div');
+                            tmp.innerHTML = html;
+                            plain = (tmp.innerText || tmp.textContent || '').trim();
+                        }
+
+                        // 1) Todos os contenteditable
+                        var eds = Array.from(doc.querySelectorAll('body[contenteditable="true"], [contenteditable="true"]'));
+                        eds.forEach(function(ed){
+                            try{
                                 ed.innerHTML = html;
                                 ['input','keyup','change','blur'].forEach(function(evt){ ed.dispatchEvent(new Event(evt,{bubbles:true})); });
                                 updated++;
@@ -445,879 +2224,2430 @@ def forcar_sincronizacao_observacao(driver, texto_html: str) -> int:
                             updated++;
                         });
 
-                        // 3) Campo específico por ID
-                        var ta = doc.getElementById('ctl00_ContentToolBar_txtObservacao');
-                        if(ta){
-                            try{ ta.removeAttribute('disabled'); }catch(e){}
-                            try{ ta.disabled = false; }catch(e){}
-                            try{ ta.value = plain; }catch(e){}
-                            try{ ta.textContent = plain; }catch(e){}
-                            try{ ta.setAttribute('value', plain); }catch(e){}
-                            ['input','keyup','change','blur'].forEach(function(evt){ ta.dispatchEvent(new Event(evt,{bubbles:true})); });
-                            updated++;
-                        }
+                        // 3) Campo específico por ID
+                        var ta = doc.getElementById('ctl00_ContentToolBar_txtObservacao');
+                        if(ta){
+                            try{ ta.removeAttribute('disabled'); }catch(e){}
+                            try{ ta.disabled = false; }catch(e){}
+                            try{ ta.value = plain; }catch(e){}
+                            try{ ta.textContent = plain; }catch(e){}
+                            try{ ta.setAttribute('value', plain); }catch(e){}
+                            ['input','keyup','change','blur'].forEach(function(evt){ ta.dispatchEvent(new Event(evt,{bubbles:true})); });
+                            updated++;
+                        }
+
+                        // 3.1) Campos por name com caminho qualificado
+                        var byName = [];
+                        try{ byName = Array.from(doc.getElementsByName('ctl00$ContentToolBar$txtObservacao')); }catch(e){}
+                        if(byName && byName.length){
+                            byName.forEach(function(n){
+                                try{ n.removeAttribute('disabled'); }catch(e){}
+                                try{ n.disabled = false; }catch(e){}
+                                try{ n.value = plain; }catch(e){}
+                                try{ n.textContent = plain; }catch(e){}
+                                try{ n.setAttribute('value', plain); }catch(e){}
+                                ['input','keyup','change','blur'].forEach(function(evt){ n.dispatchEvent(new Event(evt,{bubbles:true})); });
+                                updated++;
+                            });
+                        }
+
+                        return updated;
+                    }catch(e){ return updated||0; }
+                }
+
+                var total = 0;
+                // Documento principal
+                total += syncIn(document);
+                // Iframes mesma origem
+                try{
+                    for(var i=0;i<window.frames.length;i++){
+                        try{
+                            var fdoc = window.frames[i].document; // mesma origem
+                            total += syncIn(fdoc);
+                        }catch(e){}
+                    }
+                }catch(e){}
+
+                // 4) Validadores WebForms (grupo vgTramitar)
+                try{ if(window.Page_ClientValidate) Page_ClientValidate('vgTramitar'); }catch(e){}
+                return total;
+            })(arguments[0], arguments[1]);
+            """,
+            texto_html, texto_plano or ""
+        )
+        return int(atualizados or 0)
+    except Exception:
+        return 0
+
+
+def diagnosticar_observacao_campos(driver) -> str:
+    """Coleta diagnóstico dos campos relacionados à observação para log.
+    Retorna uma string resumida por campo: id|name|type|disabled|len(value).
+    """
+    try:
+        info = driver.execute_script(
+            r"""
+            (function(){
+                function len(v){ return (v||'').toString().trim().length; }
+                function collect(doc, label){
+                    var out=[];
+                    var sel = 'textarea, input[type="hidden"], input[type="text"]';
+                    var all = Array.from(doc.querySelectorAll(sel)).filter(function(n){
+                        var id=(n.id||'').toLowerCase(); var nm=(n.name||'').toLowerCase();
+                        return id.includes('observa') || nm.includes('observa');
+                    });
+                    all.forEach(function(n){
+                        out.push([
+                            label,
+                            n.id||'', n.name||'', n.type||n.tagName, !!n.disabled,
+                            len(n.value||n.textContent||'')
+                        ].join('|'));
+                    });
+                    return out;
+                }
+                var res = collect(document, 'root');
+                try{
+                    for(var i=0;i<window.frames.length;i++){
+                        try{ res = res.concat(collect(window.frames[i].document, 'frame'+i)); }catch(e){}
+                    }
+                }catch(e){}
+                return res.join(';');
+            })();
+            """
+        )
+        return info or ''
+    except Exception:
+        return ''
+
+
+def _e_pagina_resultado(driver) -> bool:
+    """Heurística para detectar a página/aba de resultado (visualização de relatório/PDF)."""
+    return estado_pagina(driver)[0] == "relatorio"
+
+
+def fechar_pagina_resultado(driver, wait, handles_antes: set | None = None, delay_seconds: float = 0.0, wait_new_tab_seconds: float = 8.0,
+                            numero_processo: str | None = None, orcamento: Orcamento | None = None):
+    """Fecha a aba/janela de resultado (se aberta) e retorna ao contexto original.
+    - Se abriu nova aba/janela após a tramitação, fecha-a (aguardando opcionalmente alguns segundos antes).
+    - Se navegou na mesma janela para o relatório, tenta clicar em 'Fechar' ou voltar (também com espera opcional).
+    - Com UECI_RELATORIOS_DIR e `numero_processo`, arquiva o relatório antes de fechá-lo.
+    - Com `orcamento`, as esperas são encurtadas ao que resta do processo (sem abandonar o fechamento).
+    """
+    orcamento = orcamento or Orcamento(None)
+    wait_new_tab_seconds = orcamento.limitar(wait_new_tab_seconds or 0, minimo=1.0)
+    arquivado = False
+    try:
+        try:
+            main_handle = driver.current_window_handle
+        except Exception:
+            main_handle = None
+
+        # 1) Espera por nova aba por até wait_new_tab_seconds
+        try:
+            base_set = set(handles_antes) if handles_antes else set()
+        except Exception:
+            base_set = set()
+        if not base_set and main_handle:
+            base_set = {main_handle}
+        novas = []
+        t0 = time.time()
+        while time.time() - t0 < (wait_new_tab_seconds or 0):
+            try:
+                atuais = set(driver.window_handles)
+            except Exception:
+                atuais = set()
+            novas = [h for h in atuais if h not in base_set]
+            if novas:
+                break
+            time.sleep(0.25)
+
+        # 2) Fecha diretamente as novas abas detectadas
+        for h in novas:
+            try:
+                trocar_aba(driver, h)
+                if delay_seconds and delay_seconds > 0:
+                    time.sleep(delay_seconds)
+                try:
+                    url_now = (driver.current_url or '')
+                except Exception:
+                    url_now = ''
+                if numero_processo and not arquivado:
+                    arquivado = arquivar_relatorio(driver, numero_processo, orcamento)
+                try:
+                    registrar_log(f"[Close] Fechando nova aba detectada (url='{url_now[:120]}') via driver.close()")
+                except Exception:
+                    pass
+                try:
+                    driver.close()
+                except Exception:
+                    pass
+            finally:
+                if main_handle:
+                    try:
+                        trocar_aba(driver, main_handle)
+                    except Exception:
+                        pass
+
+        # 3) Varrida de segurança: fecha qualquer aba de relatório/PDF residual
+        try:
+            atuais_all = list(set(driver.window_handles))
+        except Exception:
+            atuais_all = []
+        for h in atuais_all:
+            if main_handle and h == main_handle:
+                continue
+            try:
+                trocar_aba(driver, h)
+                url_l = (driver.current_url or '').lower()
+                if ('visualizarelatorio.aspx' in url_l) or url_l.endswith('.pdf') or ('/relatorios/' in url_l):
+                    try:
+                        registrar_log(f"[Close] Fechando aba residual de relatório (url='{url_l[:120]}')")
+                    except Exception:
+                        pass
+                    try:
+                        driver.close()
+                    except Exception:
+                        pass
+            except Exception:
+                pass
+        try:
+            if main_handle:
+                trocar_aba(driver, main_handle)
+        except Exception:
+            pass
+
+        # 4) Caso a navegação para o relatório tenha sido na mesma guia, tenta fechar/voltar
+        try:
+            if _e_pagina_resultado(driver):
+                if numero_processo and not arquivado:
+                    arquivado = arquivar_relatorio(driver, numero_processo, orcamento)
+                # Fechar por link/botão
+                try:
+                    btn = orcamento.esperar(driver,
+                        EC.element_to_be_clickable((By.XPATH, "//a[@id='btnFechar' or normalize-space(.)='Fechar' or contains(.,'Fechar')]")),
+                        2, poll=0.2, minimo=0.5
+                    )
+                    driver.execute_script("arguments[0].click();", btn)
+                    time.sleep(0.2)
+                except Exception:
+                    try:
+                        driver.execute_script("try{ if(window.__doPostBack){__doPostBack('btnFechar','');} }catch(e){}")
+                        time.sleep(0.2)
+                    except Exception:
+                        pass
+                # Últimos recursos
+                try:
+                    driver.back()
+                except Exception:
+                    try:
+                        driver.get(f"{BASE_URL}/ProcessoBeneficio/ConProcessoBeneficio.aspx")
+                    except Exception:
+                        pass
+        except Exception:
+            pass
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao fechar página de resultado: {e}")
+
 
-                        // 3.1) Campos por name com caminho qualificado
-                        var byName = [];
-                        try{ byName = Array.from(doc.getElementsByName('ctl00$ContentToolBar$txtObservacao')); }catch(e){}
-                        if(byName && byName.length){
-                            byName.forEach(function(n){
-                                try{ n.removeAttribute('disabled'); }catch(e){}
-                                try{ n.disabled = false; }catch(e){}
-                                try{ n.value = plain; }catch(e){}
-                                try{ n.textContent = plain; }catch(e){}
-                                try{ n.setAttribute('value', plain); }catch(e){}
-                                ['input','keyup','change','blur'].forEach(function(evt){ n.dispatchEvent(new Event(evt,{bubbles:true})); });
-                                updated++;
-                            });
-                        }
+# Sondagem em lote: vários seletores verificados numa única chamada de script, sem espera
+# implícita (find_elements espera o implicitly_wait inteiro quando o elemento não existe).
+JS_SONDAR = r"""
+var specs = arguments[0], out = {_url: location.href};
+function visivel(el){
+    var st = window.getComputedStyle(el);
+    if(st.visibility === 'hidden' || st.display === 'none') return false;
+    return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+}
+Object.keys(specs).forEach(function(nome){
+    var tipo = specs[nome][0], valor = specs[nome][1], els = [];
+    try {
+        if(tipo === 'id'){
+            var e = document.getElementById(valor);
+            if(e) els = [e];
+        } else if(tipo === 'xpath'){
+            var r = document.evaluate(valor, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            for(var i = 0; i < r.snapshotLength; i++) els.push(r.snapshotItem(i));
+        } else {
+            els = Array.prototype.slice.call(document.querySelectorAll(valor));
+        }
+    } catch(err) { els = []; }
+    out[nome] = {existe: els.length > 0, visivel: els.some(visivel), quantidade: els.length};
+});
+return out;
+"""
+
+# Seletores da impressão digital da página: tudo o que decide "onde estamos" numa única sondagem
+SONDA_PAGINA = {
+    "ddl_setor": (By.ID, "ctl00_ContentCampos_ddlSetor"),
+    "caixa_receber": (By.ID, "ctl00_ContentCampos_AccordionPane1_header_lblProcessoReceber"),
+    "caixa_setor": (By.ID, "ctl00_ContentCampos_AccordionPane2_header_lblProcessoSetor"),
+    "btn_tramitar": (By.ID, "ctl00_ContentToolBar_btnTramitar"),
+    "aba_tce": (By.ID, "__tab_ctl00_ContentCampos_TabContainer1_tabTCE"),
+    "ddl_despacho": (By.ID, "ctl00_ContentToolBar_ddlDespacho"),
+    "btn_fechar": (By.ID, "btnFechar"),
+    "link_fechar": (By.XPATH, "//a[normalize-space(.)='Fechar' or contains(.,'Fechar')]"),
+}
 
-                        return updated;
-                    }catch(e){ return updated||0; }
-                }
+# Estados possíveis da página (ver estado_pagina)
+ESTADOS_PAGINA = ("login", "selecionar_setor", "dentro_setor", "edicao_processo",
+                  "modal_tramitar", "relatorio", "desconhecido")
 
-                var total = 0;
-                // Documento principal
-                total += syncIn(document);
-                // Iframes mesma origem
-                try{
-                    for(var i=0;i<window.frames.length;i++){
-                        try{
-                            var fdoc = window.frames[i].document; // mesma origem
-                            total += syncIn(fdoc);
-                        }catch(e){}
-                    }
-                }catch(e){}
 
-                // 4) Validadores WebForms (grupo vgTramitar)
-                try{ if(window.Page_ClientValidate) Page_ClientValidate('vgTramitar'); }catch(e){}
-                return total;
-            })(arguments[0]);
-            """,
-            texto_html
-        )
-        return int(atualizados or 0)
+def sondar(driver, seletores: dict) -> dict:
+    """Verifica {nome: (By.ID | By.XPATH | By.CSS_SELECTOR, valor)} numa única chamada, sem espera.
+    Retorna {nome: {'existe', 'visivel', 'quantidade'}} e '_url' (URL atual). Se o script
+    falhar (alerta aberto, aba fechada), todos os seletores voltam como ausentes.
+    """
+    try:
+        resultado = driver.execute_script(JS_SONDAR, {nome: list(loc) for nome, loc in seletores.items()})
+        if isinstance(resultado, dict):
+            return resultado
     except Exception:
-        return 0
+        pass
+    ausente = {"existe": False, "visivel": False, "quantidade": 0}
+    return {"_url": "", **{nome: dict(ausente) for nome in seletores}}
+
+
+def classificar_pagina(s: dict) -> str:
+    """Reduz uma sondagem de SONDA_PAGINA a um dos ESTADOS_PAGINA (a ordem das regras importa)."""
+    url_l = (s.get("_url") or "").lower()
+    if "/login/" in url_l or "avisologin" in url_l:
+        return "login"
+    if "/relatorios/visualizarelatorio.aspx" in url_l or url_l.endswith(".pdf"):
+        return "relatorio"
+    if s["ddl_despacho"]["visivel"]:
+        return "modal_tramitar"
+    if s["btn_tramitar"]["existe"] or s["aba_tce"]["existe"]:
+        return "edicao_processo"
+    # Seletor de setor visível indica etapa de seleção pendente
+    if s["ddl_setor"]["visivel"]:
+        return "selecionar_setor"
+    if s["caixa_receber"]["existe"] or s["caixa_setor"]["existe"]:
+        return "dentro_setor"
+    # "Fechar" é genérico demais (modais e menus também o têm): só decide quando nada acima casou
+    if s["btn_fechar"]["visivel"] or s["link_fechar"]["visivel"]:
+        return "relatorio"
+    return "desconhecido"
 
 
-def diagnosticar_observacao_campos(driver) -> str:
-    """Coleta diagnóstico dos campos relacionados à observação para log.
-    Retorna uma string resumida por campo: id|name|type|disabled|len(value).
+def estado_pagina(driver) -> tuple:
+    """Impressão digital da página atual numa única chamada: retorna (estado, sondagem).
+    `estado` é um dos ESTADOS_PAGINA; a sondagem traz '_url' e os seletores de SONDA_PAGINA.
+    """
+    s = sondar(driver, SONDA_PAGINA)
+    if not s.get("_url"):
+        # Visualizador de PDF pode recusar scripts: a URL vem do driver
+        try:
+            s["_url"] = driver.current_url or ""
+        except Exception:
+            s["_url"] = ""
+    return classificar_pagina(s), s
+
+
+def ja_dentro_do_setor(driver) -> bool:
+    """Retorna True se a tela atual já é a lista com 'Processos a Receber'/'Dentro do Setor'."""
+    return estado_pagina(driver)[0] == "dentro_setor"
+
+
+def obter_estado_concessao(driver) -> str:
+    """Retorna o estado atual da tela de Concessão.
+    Valores possíveis:
+      - 'selecionar_setor': dropdown de setor visível (precisa selecionar e clicar OK)
+      - 'dentro_setor'    : listas 'Processos a Receber'/'Dentro do Setor' presentes
+      - 'desconhecido'    : não conseguiu identificar (inclusive fora da tela de Concessão)
     """
+    estado = estado_pagina(driver)[0]
+    return estado if estado in ("selecionar_setor", "dentro_setor") else "desconhecido"
+
+
+DespachoRenderizado = collections.namedtuple("DespachoRenderizado", "html plano despacho setor")
+
+_modelos_despacho = {"modelos": None}
+_cache_despachos = {}
+
+def html_para_texto(html: str) -> str:
+    """Converte o HTML do despacho em texto simples (quebras em <br>, </p> e </div>)."""
+    texto = re.sub(r"(?i)<br\s*/?>", "\n", html or "")
+    texto = re.sub(r"(?i)</(p|div)>", "\n\n", texto)
+    texto = re.sub(r"<[^>]+>", "", texto)
+    texto = html_lib.unescape(texto)
+    texto = re.sub(r"[ \t]+\n", "\n", texto)
+    texto = re.sub(r"\n{3,}", "\n\n", texto)
+    return texto.strip()
+
+def carregar_despachos(caminho: str = DESPACHOS_ARQUIVO) -> dict:
+    """Carrega os modelos (embutidos + arquivo JSON opcional) e limpa o cache de renderização."""
+    modelos = {destino: {tipo: dict(m) for tipo, m in tipos.items()} for destino, tipos in DESPACHOS_PADRAO.items()}
+    if caminho and os.path.exists(caminho):
+        try:
+            with open(caminho, encoding="utf-8") as f:
+                extras = json.load(f)
+            for destino, tipos in (extras or {}).items():
+                for tipo, modelo in (tipos or {}).items():
+                    modelos.setdefault(destino, {}).setdefault(tipo, {}).update(modelo)
+            registrar_log(f"Modelos de despacho carregados de {caminho}")
+        except Exception as e:
+            registrar_log(f"[Aviso] Falha ao ler modelos de despacho em {caminho}; usando os embutidos: {e}")
+    _modelos_despacho["modelos"] = modelos
+    _cache_despachos.clear()
+    return modelos
+
+def obter_despacho(destino: str, tipo: str, assinante: str) -> DespachoRenderizado:
+    """Retorna o despacho (HTML e texto simples) do modelo para o assinante, renderizando uma única vez."""
+    chave = (destino, tipo, assinante)
+    pronto = _cache_despachos.get(chave)
+    if pronto is not None:
+        return pronto
+    modelos = _modelos_despacho["modelos"] or carregar_despachos()
     try:
-        info = driver.execute_script(
+        modelo = modelos[destino][tipo]
+    except KeyError:
+        raise RuntimeError(f"Modelo de despacho não configurado: destino='{destino}', tipo='{tipo}'.")
+    html = modelo["html"].replace("{assinante}", assinante or "")
+    pronto = DespachoRenderizado(html, html_para_texto(html), str(modelo["despacho"]), str(modelo["setor"]))
+    _cache_despachos[chave] = pronto
+    return pronto
+
+
+def preencher_despacho_unico(driver, texto_html: str, min_len: int, texto_plano: str | None = None) -> dict | None:
+    """Preenche o despacho em uma única ida ao navegador: editor(es) visuais, campos
+    textarea/hidden de observação (criando o hidden esperado se não existir), executa
+    Page_ClientValidate('vgTramitar') e confere os comprimentos. 'ok' vem do corpo do editor
+    ou de um campo que já existia na página, nunca do hidden criado pela própria rotina.
+    Retorna o registro de diagnóstico (dict com 'ok') ou None se o script falhar.
+    """
+    try:
+        return driver.execute_script(
             r"""
-            (function(){
+            return (function(html, plain, minLen){
+                var EVTS = ['input','keyup','change','blur'];
+                var ID = 'ctl00_ContentToolBar_txtObservacao', NAME = 'ctl00$ContentToolBar$txtObservacao';
+                function fire(n){ EVTS.forEach(function(evt){ try{ n.dispatchEvent(new Event(evt,{bubbles:true})); }catch(e){} }); }
                 function len(v){ return (v||'').toString().trim().length; }
-                function collect(doc, label){
-                    var out=[];
-                    var sel = 'textarea, input[type="hidden"], input[type="text"]';
-                    var all = Array.from(doc.querySelectorAll(sel)).filter(function(n){
-                        var id=(n.id||'').toLowerCase(); var nm=(n.name||'').toLowerCase();
-                        return id.includes('observa') || nm.includes('observa');
+                if(!plain){
+                    var tmp = document.createElement('div'); tmp.innerHTML = html;
+                    plain = (tmp.innerText || tmp.textContent || '').trim();
+                }
+                var r = {editores:0, campos:0, criado:false, validacao:null, len_editor:0, len_campo:0, len_campo_existente:0, diag:''};
+                var diag = [];
+                function setCampo(n, criado){
+                    try{ n.removeAttribute('disabled'); }catch(e){}
+                    try{ n.disabled = false; }catch(e){}
+                    try{ n.value = plain; }catch(e){}
+                    try{ if(n.tagName && n.tagName.toLowerCase()==='textarea'){ n.textContent = plain; } }catch(e){}
+                    try{ n.setAttribute('value', plain); }catch(e){}
+                    fire(n);
+                    r.campos++;
+                    var l = len(n.value||n.textContent);
+                    r.len_campo = Math.max(r.len_campo, l);
+                    if(!criado){ r.len_campo_existente = Math.max(r.len_campo_existente, l); }
+                }
+                function syncIn(doc, label){
+                    var eds = Array.from(doc.querySelectorAll('body[contenteditable="true"], [contenteditable="true"]'));
+                    if(!eds.length && doc.designMode === 'on' && doc.body){ eds = [doc.body]; }
+                    eds.forEach(function(ed){
+                        try{
+                            ed.innerHTML = html; fire(ed); r.editores++;
+                            r.len_editor = Math.max(r.len_editor, len(ed.innerText||ed.textContent));
+                        }catch(e){}
                     });
-                    all.forEach(function(n){
-                        out.push([
-                            label,
-                            n.id||'', n.name||'', n.type||n.tagName, !!n.disabled,
-                            len(n.value||n.textContent||'')
-                        ].join('|'));
+                    Array.from(doc.querySelectorAll('textarea, input[type="hidden"], input[type="text"]')).filter(function(n){
+                        var id=(n.id||'').toLowerCase(), nm=(n.name||'').toLowerCase();
+                        return id.includes('observa') || nm.includes('observa');
+                    }).forEach(function(n){
+                        setCampo(n);
+                        diag.push([label, n.id||'', n.name||'', n.type||n.tagName, !!n.disabled, len(n.value||n.textContent)].join('|'));
                     });
-                    return out;
                 }
-                var res = collect(document, 'root');
-                try{
-                    for(var i=0;i<window.frames.length;i++){
-                        try{ res = res.concat(collect(window.frames[i].document, 'frame'+i)); }catch(e){}
+                syncIn(document, 'root');
+                for(var i=0;i<window.frames.length;i++){
+                    try{ syncIn(window.frames[i].document, 'frame'+i); }catch(e){}
+                }
+                // Garante o campo submetido no postback no formulário principal
+                var ta = document.getElementById(ID) || (document.getElementsByName(NAME)||[])[0];
+                if(!ta){
+                    var form = document.querySelector('form');
+                    if(form){
+                        ta = document.createElement('input');
+                        ta.type = 'hidden'; ta.name = NAME; ta.id = ID;
+                        form.appendChild(ta);
+                        r.criado = true;
+                        setCampo(ta, true);
                     }
-                }catch(e){}
-                return res.join(';');
-            })();
-            """
+                }
+                try{ if(window.Page_ClientValidate){ r.validacao = !!Page_ClientValidate('vgTramitar'); } }catch(e){}
+                r.diag = diag.join(';');
+                // O hidden criado acima sempre "confere": não serve de prova de preenchimento
+                r.ok = Math.max(r.len_editor, r.len_campo_existente) >= minLen;
+                return r;
+            })(arguments[0], arguments[1], arguments[2]);
+            """,
+            texto_html, texto_plano or "", min_len
         )
-        return info or ''
+    except Exception as e:
+        registrar_log(f"[Aviso] Rotina única de preenchimento do despacho falhou: {e}")
+        return None
+
+
+def _preencher_despacho_sequencial(driver, wait, texto_tramitacao: str, texto_plano: str | None = None,
+                                  orcamento: Orcamento | None = None):
+    """Sequência completa (várias idas e voltas ao navegador) para preencher e sincronizar o despacho.
+    Usada como fallback quando a rotina única `preencher_despacho_unico` não confirma o texto.
+    """
+    orcamento = orcamento or Orcamento(None)
+    # Preenche o corpo (textarea/iframe/editor)
+    if not preencher_editor_observacao(driver, wait, texto_tramitacao, orcamento):
+        registrar_log("[Aviso] Não foi possível preencher o corpo via editor; tentando fallback direto no campo por ID…")
+        try:
+            corpo = orcamento.esperar(driver,
+                EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_txtObservacao")), 10
+            )
+            driver.execute_script("arguments[0].scrollIntoView(true);", corpo)
+            time.sleep(0.2)
+            corpo.clear(); time.sleep(0.2)
+            corpo.send_keys(texto_tramitacao)
+        except Exception as e:
+            registrar_log(f"[Erro] Falha ao preencher corpo da tramitação: {e}")
+            raise
+
+    # Aguarda sincronização do conteúdo com o editor/campo oculto antes de prosseguir
+    if not aguardar_sincronizacao_observacao(driver, texto_tramitacao, timeout=orcamento.limitar(SYNC_TIMEOUT_PRIMARY)):
+        registrar_log("[Aviso] Conteúdo do despacho pode não ter sincronizado totalmente; prosseguindo mesmo assim.")
+
+    # Confirmar tramitação (somente se o texto estiver realmente presente)
+    # Aguarda um curto período para sincronização e clica imediatamente em "Tramitar"
+    len_ok = aguardar_sincronizacao_observacao(driver, texto_tramitacao, timeout=orcamento.limitar(SYNC_TIMEOUT_PRECLICK))
+    if not len_ok:
+        registrar_log("[Aviso] Texto do despacho possivelmente ainda sincronizando; prosseguindo com clique em 'Tramitar'.")
+
+    # Diagnóstico antes da sincronização forçada
+    try:
+        diag_antes = diagnosticar_observacao_campos(driver)
+        if diag_antes:
+            registrar_log(f"[Diag] Antes sync: {diag_antes}")
     except Exception:
-        return ''
+        pass
 
+    # Força sincronização final dos campos que serão enviados no postback
+    try:
+        qtd = forcar_sincronizacao_observacao(driver, texto_tramitacao, texto_plano)
+        registrar_log(f"[Info] Campos de observação sincronizados (qtd={qtd}).")
+        # Pequena pausa para JS de página reagir
+        time.sleep(0.5)
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao forçar sincronização final: {e}")
 
-def _e_pagina_resultado(driver) -> bool:
-    """Heurística para detectar a página/aba de resultado (visualização de relatório/PDF)."""
+    # Diagnóstico depois da sincronização forçada
     try:
-        url = (driver.current_url or "")
-        url_l = url.lower()
-        if "/relatorios/visualizarelatorio.aspx" in url_l:
-            return True
-        if url_l.endswith(".pdf"):
-            return True
-        # Botão específico do relatório
-        try:
-            if driver.find_elements(By.ID, "btnFechar"):
-                return True
-        except Exception:
-            pass
-        # Link "Fechar" comum na barra do visualizador
-        try:
-            links = driver.find_elements(By.XPATH, "//a[normalize-space(.)='Fechar' or contains(.,'Fechar')]")
-            if links:
-                return True
-        except Exception:
-            pass
+        diag_depois = diagnosticar_observacao_campos(driver)
+        if diag_depois:
+            registrar_log(f"[Diag] Depois sync: {diag_depois}")
     except Exception:
         pass
-    return False
+
+    # Verificação final: garante que o texto do despacho está presente antes do clique
+    try:
+        need_len = max(15, int(len(texto_tramitacao) * 0.3))
+        js_len_script = """
+            var ta=document.getElementById('ctl00_ContentToolBar_txtObservacao');
+            var v=ta?(ta.value||ta.textContent||''):'';
+            var ed=document.querySelector('body[contenteditable="true"], [contenteditable="true"]');
+            var e=(ed?(ed.innerText||''):'');
+            return Math.max(v.trim().length, e.trim().length);
+        """
+        plain_len = driver.execute_script(js_len_script)
+        if (plain_len or 0) < need_len:
+            registrar_log(f"[Aviso] Texto do despacho ainda curto (len={plain_len}); forçando sincronização extra...")
+            try:
+                qtd2 = forcar_sincronizacao_observacao(driver, texto_tramitacao, texto_plano)
+                registrar_log(f"[Info] Sincronização extra aplicou em {qtd2} elemento(s).")
+                time.sleep(0.3)
+            except Exception as e:
+                registrar_log(f"[Aviso] Falha ao aplicar sincronização extra: {e}")
+
+            plain_len2 = driver.execute_script(js_len_script)
+            if (plain_len2 or 0) < need_len:
+                # Fallback definitivo: cria/preenche um campo hidden com o nome esperado no formulário principal
+                try:
+                    plain_text = texto_plano or html_para_texto(texto_tramitacao)
+                    created = driver.execute_script(
+                        r"""
+                        (function(plain){
+                            function ensureIn(doc){
+                                try{
+                                    var name='ctl00$ContentToolBar$txtObservacao';
+                                    var id='ctl00_ContentToolBar_txtObservacao';
+                                    var ta = doc.getElementById(id);
+                                    if(!ta){
+                                        var byName = [];
+                                        try{ byName = doc.getElementsByName(name); }catch(e){}
+                                        if(byName && byName.length){ ta = byName[0]; }
+                                    }
+                                    if(!ta){
+                                        var form = doc.querySelector('form');
+                                        if(form){
+                                            ta = doc.createElement('input');
+                                            ta.type = 'hidden';
+                                            ta.name = name;
+                                            ta.id = id;
+                                            form.appendChild(ta);
+                                        }
+                                    }
+                                    if(ta){
+                                        try{ ta.removeAttribute('disabled'); }catch(e){}
+                                        try{ ta.disabled = false; }catch(e){}
+                                        try{ ta.value = plain; }catch(e){}
+                                        try{ ta.textContent = plain; }catch(e){}
+                                        try{ ta.setAttribute('value', plain); }catch(e){}
+                                        try{ ['input','keyup','change','blur'].forEach(function(evt){ ta.dispatchEvent(new Event(evt,{bubbles:true})); }); }catch(e){}
+                                        return true;
+                                    }
+                                }catch(e){}
+                                return false;
+                            }
+                            var ok = ensureIn(document);
+                            try{
+                                for(var i=0;i<window.frames.length && !ok;i++){
+                                    try{ ok = ensureIn(window.frames[i].document); }catch(e){}
+                                }
+                            }catch(e){}
+                            return !!ok;
+                        })(plain);
+                        """,
+                        plain_text
+                    )
+                    if created:
+                        registrar_log("[Info] Campo 'txtObservacao' criado/preenchido como hidden (fallback).")
+                    else:
+                        registrar_log("[Aviso] Não foi possível localizar/criar campo 'txtObservacao' nem em iframes.")
+                    time.sleep(0.2)
+                except Exception as e:
+                    registrar_log(f"[Aviso] Fallback (hidden) no 'txtObservacao' falhou: {e}")
+    except Exception:
+        pass
+
+
+def tramitar_para_presidente(driver, wait, nome_responsavel, destino: str = DESPACHO_DESTINO, tipo: str = DESPACHO_TIPO,
+                             orcamento: Orcamento | None = None, andamento: dict | None = None,
+                             teto: float = ESPERA_ELEMENTO):
+    """Tramita o processo para o Gabinete do Presidente (ou outro destino/tipo configurado em despachos).
+    Até o clique final as esperas (até `teto` segundos cada) consomem o `orcamento` do processo;
+    depois dele (tramitação já enviada) só são encurtadas, nunca abandonadas.
+    Em `andamento`, marca 'enviado' no clique final (o postback não é idempotente) e 'tramitado'
+    quando o alerta do servidor confirma a tramitação; 'abas_antes' guarda as abas anteriores ao
+    clique para a etapa seguinte (fechar_pagina_resultado) achar a do relatório.
+    """
+    orcamento = orcamento or Orcamento(None)
+    andamento = andamento if andamento is not None else {}
+    try:
+        # Despacho renderizado uma única vez por (modelo, assinante) e reutilizado na execução
+        assinante = obter_assinante_nome() or nome_responsavel.upper()
+        despacho = obter_despacho(destino, tipo, assinante)
+
+        # Clicar no botão Tramitar
+        btn_tramitar = orcamento.esperar(driver, EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_btnTramitar")), teto)
+        driver.execute_script("arguments[0].scrollIntoView(true);", btn_tramitar)
+        orcamento.dormir(0.3)
+        driver.execute_script("arguments[0].click();", btn_tramitar)
+        # dá tempo do painel/modal de tramitação abrir por completo
+        orcamento.dormir(MODAL_OPEN_DELAY)
+
+        # Selecionar Despacho
+        select_despacho = Select(orcamento.esperar(driver,
+            EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_ddlDespacho")), 10
+        ))
+        select_despacho.select_by_value(despacho.despacho)
+        orcamento.dormir(AFTER_SELECT_DELAY)
+
+        # Selecionar Setor de destino (padrão: Gabinete do Presidente)
+        select_setor = Select(orcamento.esperar(driver,
+            EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_ddlSetor")), 10
+        ))
+        select_setor.select_by_value(despacho.setor)
+        orcamento.dormir(AFTER_SELECT_DELAY)
+
+        # Corpo da tramitação (com assinatura do usuário logado, centralizada e em negrito)
+        texto_tramitacao = despacho.html
+
+        # Preenche editor + campos submetidos, valida e confere, numa única chamada
+        need_len = max(15, int(len(texto_tramitacao) * 0.3))
+        diag = preencher_despacho_unico(driver, texto_tramitacao, need_len, despacho.plano)
+        if diag and diag.get("ok"):
+            registrar_log(
+                f"[Diag] Despacho: editores={diag.get('editores')} campos={diag.get('campos')} "
+                f"criado={diag.get('criado')} validacao={diag.get('validacao')} "
+                f"len={max(diag.get('len_editor') or 0, diag.get('len_campo') or 0)}/{need_len} | {diag.get('diag')}"
+            )
+        else:
+            registrar_log(f"[Aviso] Rotina única do despacho não confirmou o texto ({diag}); usando a sequência completa…")
+            _preencher_despacho_sequencial(driver, wait, texto_tramitacao, despacho.plano, orcamento)
+
+        # Encontra o botão por ID ou alternativas por texto/valor (começa pelo que funcionou antes)
+        def botao_por_id():
+            return orcamento.esperar(driver,
+                EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_Button1")), 6, poll=0.2
+            )
+
+        def botao_por_texto():
+            # Nunca o "Tramitar" da barra de ferramentas: ele reabre o modal em vez de confirmar.
+            fora_da_barra = "[not(@id='ctl00_ContentToolBar_btnTramitar')]"
+            candidatos = orcamento.procurar(driver, By.XPATH,
+                "//input[@type='submit' and (translate(@value,'TRAMITAR','tramitan')='tramitan' or contains(@value,'Tramitar'))]"
+                + fora_da_barra
+            ) or orcamento.procurar(driver, By.XPATH,
+                f"//button[normalize-space(.)='Tramitar']{fora_da_barra}|//input[@value='Tramitar']{fora_da_barra}"
+            )
+            candidatos = [c for c in candidatos if c.is_displayed()]
+            return candidatos[0] if candidatos else None
+
+        # Ordem fixa: o botão por ID é o correto; o texto só entra quando ele não aparece.
+        btn_tramitar_final = tentar_estrategias("tramitar", "botao_final", [
+            ("id", botao_por_id),
+            ("texto", botao_por_texto),
+        ], ordem_fixa=True)
+        if not btn_tramitar_final:
+            raise RuntimeError("Botão 'Tramitar' não encontrado.")
+
+        # Guarda as janelas/abas atuais para detectar novas após a tramitação
+        try:
+            andamento["abas_antes"] = set(driver.window_handles)
+        except Exception:
+            andamento["abas_antes"] = None
+
+        # Alertas do postback são capturados na página e lidos de volta (sem esperar o diálogo)
+        with captura_dialogos(driver):
+            driver.execute_script("arguments[0].scrollIntoView(true);", btn_tramitar_final)
+            orcamento.dormir(0.3)
+            andamento["enviado"] = True
+            driver.execute_script("arguments[0].click();", btn_tramitar_final)
+
+            # Se o alerta não aparecer rapidamente, força o postback da página ASP.NET
+            mensagens = aguardar_dialogo(driver, 3, orcamento, minimo=1.0)
+            if not mensagens:
+                registrar_log("[Aviso] Alerta não apareceu após o clique; tentando __doPostBack...")
+                driver.execute_script(
+                    "if(window.WebForm_DoPostBackWithOptions){WebForm_DoPostBackWithOptions(new WebForm_PostBackOptions('ctl00$ContentToolBar$Button1','',true,'vgTramitar','',false,false));}"
+                )
+                mensagens = aguardar_dialogo(driver, 4, orcamento, minimo=1.0)
+                if not mensagens:
+                    registrar_log("[Aviso] __doPostBack não abriu alerta; tentando __doPostBack simples...")
+                    driver.execute_script("if(window.__doPostBack){__doPostBack('ctl00$ContentToolBar$Button1','');}")
+                    # Alerta após tramitar
+                    mensagens = aguardar_dialogo(driver, 10, orcamento, minimo=2.0)
+        if mensagens:
+            andamento["tramitado"] = True
+
+        registrar_log(f"[OK] Processo tramitado com sucesso")
+        print(f"[OK] Processo tramitado com sucesso")
+
+    except Exception as e:
+        registrar_log(f"[Erro] Falha ao tramitar processo: {e}")
+        print(f"[Erro] Falha ao tramitar processo: {e}")
+        raise
+
+
+def conectar_chrome(contador=None):
+    """Conecta um WebDriver ao Chrome aberto com depuração na porta 9222."""
+    import logging
+    logging.getLogger('selenium').setLevel(logging.WARNING)
+
+    chrome_options = Options()
+    chrome_options.debugger_address = "localhost:9222"
+    if GRAVACAO_ARQUIVO:
+        # Eventos CDP Network ficam disponíveis no log 'performance' do chromedriver
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    # Garante que o Chrome está rodando com depuração em 9222
+    if not porta_debug_aberta():
+        msg = (
+            "Chrome não encontrado na porta 9222. Abra o Chrome com depuração ativa:\n"
+                r'"C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe" --remote-debugging-port=9222 --user-data-dir=\\ChromeDevSession'
+        )
+        registrar_log(f"[Erro] {msg}")
+        raise RuntimeError(msg)
+
+    t0 = time.time()
+    versao = versao_chrome()
+    driver = None
+    try:
+        servico = obter_servico_chromedriver(versao)
+        if servico is not None:
+            driver = anexar_ao_servico(servico, chrome_options)
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao usar o chromedriver em cache; resolvendo novamente: {e}")
+        encerrar_servico_chromedriver()
+    if driver is None:
+        registrar_log("Conectando ao Chrome via Selenium Manager...")
+        driver = webdriver.Chrome(options=chrome_options)
+        salvar_cache_driver(versao, getattr(driver.service, "path", None))
+    if contador:
+        contador.instrumentar(driver)
+    registrar_log(f"Chrome conectado em {time.time()-t0:.2f}s")
+    METRICAS.observar("ueci_etapa_segundos", time.time() - t0, etapa="conectar_chrome")
+
+    driver.implicitly_wait(ESPERA_IMPLICITA)
+    return driver
+
+
+# ==============================
+# MÁQUINA DE ESTADOS DA NAVEGAÇÃO
+# ==============================
+
+def _transicao_login(driver, wait):
+    if not aguardar_login(driver):
+        raise TimeoutException("Login não detectado no tempo limite.")
+
+
+def _transicao_abrir_concessao(driver, wait):
+    with METRICAS.medir("abrir_concessao"):
+        if not abrir_concessao(driver, wait):
+            raise RuntimeError("Não foi possível abrir a tela de Concessão.")
+
+
+def _transicao_selecionar_setor(driver, wait):
+    atualizar_status("🏢 Selecionando setor UECI…")
+    sel = Select(driver.find_element(By.ID, "ctl00_ContentCampos_ddlSetor"))
+    try:
+        registrar_log("Seletor encontrado, selecionando UECI (valor 59)…")
+        sel.select_by_value("59")
+    except NoSuchElementException:
+        opts = [o for o in sel.options if 'UECI' in (o.text or '').upper()]
+        if opts:
+            registrar_log("Opção 59 não encontrada; selecionando opção que contém 'UECI'.")
+            sel.select_by_visible_text(opts[0].text)
+        else:
+            registrar_log("[Aviso] Opção de setor UECI não encontrada no seletor.")
+
+    # Clica OK para confirmar a entrada no setor e aguarda a tela sair da seleção
+    btn_ok = driver.find_element(By.ID, "ctl00_ContentCampos_Button1")
+    driver.execute_script("arguments[0].click();", btn_ok)
+    WebDriverWait(driver, 10, poll_frequency=0.3).until(
+        lambda d: estado_pagina(d)[0] != "selecionar_setor"
+    )
+
+
+# Estado atual -> ação que aproxima a página da lista do setor ('dentro_setor' é o destino).
+# Relatório, edição de processo, modal de tramitação e telas desconhecidas voltam pela Concessão.
+TRANSICOES_PAGINA = {
+    "login": _transicao_login,
+    "selecionar_setor": _transicao_selecionar_setor,
+    "edicao_processo": _transicao_abrir_concessao,
+    "modal_tramitar": _transicao_abrir_concessao,
+    "relatorio": _transicao_abrir_concessao,
+    "desconhecido": _transicao_abrir_concessao,
+}
+
+
+def conduzir_ao_setor(driver, wait, max_passos: int = 6) -> str:
+    """Leva a página até 'dentro_setor' guiada pela impressão digital (estado_pagina): uma
+    sondagem por passo decide a próxima transição, sem verificações avulsas.
+    Retorna o estado final; falhas de transição só propagam se a página não chegou ao destino.
+    """
+    estado, _ = estado_pagina(driver)
+    for _passo in range(max_passos):
+        if estado == "dentro_setor":
+            return estado
+        registrar_log(f"[Info] Página em '{estado}'; conduzindo até a lista do setor…")
+        erro = None
+        try:
+            TRANSICOES_PAGINA[estado](driver, wait)
+        except Exception as e:
+            erro = e
+        novo, _ = estado_pagina(driver)
+        if erro is not None:
+            if novo != "dentro_setor":
+                raise erro
+            registrar_log(f"[Aviso] Transição a partir de '{estado}' falhou, porém já estamos dentro do setor: {erro}")
+        if novo == estado:
+            # A transição não mudou nada: repeti-la só repetiria a espera
+            break
+        estado = novo
+    return estado
+
+
+def entrar_no_setor(driver, wait):
+    """Abre Benefício > Concessão (recarregando a lista) e segue a máquina de estados até
+    'dentro_setor' (login e seleção do setor UECI quando necessários)."""
+    registrar_log("Tentando abrir Concessão por URL direta (com fallback no menu)...")
+    _transicao_abrir_concessao(driver, wait)
+
+    estado = conduzir_ao_setor(driver, wait)
+    if estado == "dentro_setor":
+        registrar_log("Dentro do setor UECI.")
+        atualizar_status("🏢 Setor selecionado. Continuando…")
+    else:
+        registrar_log(f"[Aviso] Estado da tela de Concessão não identificado claramente ({estado}). Prosseguindo com melhor esforço…")
 
 
-def fechar_pagina_resultado(driver, wait, handles_antes: set | None = None, delay_seconds: float = 0.0, wait_new_tab_seconds: float = 8.0):
-    """Fecha a aba/janela de resultado (se aberta) e retorna ao contexto original.
-    - Se abriu nova aba/janela após a tramitação, fecha-a (aguardando opcionalmente alguns segundos antes).
-    - Se navegou na mesma janela para o relatório, tenta clicar em 'Fechar' ou voltar (também com espera opcional).
+def receber_processos(driver, wait, limite: int | None = None) -> int:
+    """Marca e recebe os processos de 'Processos a Receber' (respeitando a regra de setor de origem).
+    Com `limite`, recebe no máximo esse número de processos (lotes do modo pipeline).
+    Retorna a quantidade de processos marcados e recebidos.
     """
+    recebidos = 0
     try:
-        try:
-            main_handle = driver.current_window_handle
-        except Exception:
-            main_handle = None
+        # Expande a seção "30 Últimos Processos a Receber"
+        btn_receber_box = wait.until(EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_AccordionPane1_header_lblProcessoReceber")))
+        driver.execute_script("arguments[0].click();", btn_receber_box)
+        time.sleep(0.8)
 
-        # 1) Espera por nova aba por até wait_new_tab_seconds
-        try:
-            base_set = set(handles_antes) if handles_antes else set()
-        except Exception:
-            base_set = set()
-        if not base_set and main_handle:
-            base_set = {main_handle}
-        novas = []
-        t0 = time.time()
-        while time.time() - t0 < (wait_new_tab_seconds or 0):
+        # Busca novamente os checkboxes após abrir
+        caixas = driver.find_elements(By.XPATH, "//input[contains(@id,'chk_receber')]")
+        METRICAS.definir("ueci_fila_profundidade", len(caixas), caixa="receber")
+        marcadas = 0
+
+        if caixas:
+            # Descobre o índice da coluna "Setor Enviou" pelo cabeçalho da tabela (quando possível)
+            col_setor = -1
             try:
-                atuais = set(driver.window_handles)
+                tabela = driver.find_element(By.XPATH, "//table[.//input[contains(@id,'chk_receber')]]")
+                cabec = tabela.find_elements(By.XPATH, ".//tr[1]/*[self::th or self::td]")
+                for idx, th in enumerate(cabec):
+                    txt = (th.text or "").strip().lower()
+                    if "setor" in txt and "enviou" in txt:
+                        col_setor = idx
+                        break
             except Exception:
-                atuais = set()
-            novas = [h for h in atuais if h not in base_set]
-            if novas:
-                break
-            time.sleep(0.25)
+                col_setor = -1
 
-        # 2) Fecha diretamente as novas abas detectadas
-        for h in novas:
-            try:
-                driver.switch_to.window(h)
-                if delay_seconds and delay_seconds > 0:
-                    time.sleep(delay_seconds)
-                try:
-                    url_now = (driver.current_url or '')
-                except Exception:
-                    url_now = ''
-                try:
-                    registrar_log(f"[Close] Fechando nova aba detectada (url='{url_now[:120]}') via driver.close()")
-                except Exception:
-                    pass
+            atualizar_status(f"Encontrados {len(caixas)} processo(s) a receber. Marcando conforme regra...")
+            for i in range(len(caixas)):
+                if limite is not None and marcadas >= limite:
+                    break
                 try:
-                    driver.close()
-                except Exception:
-                    pass
-            finally:
-                if main_handle:
-                    try:
-                        driver.switch_to.window(main_handle)
-                    except Exception:
-                        pass
+                    # Rebusca o elemento a cada iteração para evitar stale reference
+                    caixa = driver.find_elements(By.XPATH, "//input[contains(@id,'chk_receber')]")[i]
 
-        # 3) Varrida de segurança: fecha qualquer aba de relatório/PDF residual
-        try:
-            atuais_all = list(set(driver.window_handles))
-        except Exception:
-            atuais_all = []
-        for h in atuais_all:
-            if main_handle and h == main_handle:
-                continue
-            try:
-                driver.switch_to.window(h)
-                url_l = (driver.current_url or '').lower()
-                if ('visualizarelatorio.aspx' in url_l) or url_l.endswith('.pdf') or ('/relatorios/' in url_l):
-                    try:
-                        registrar_log(f"[Close] Fechando aba residual de relatório (url='{url_l[:120]}')")
-                    except Exception:
-                        pass
+                    # Obtém o texto da coluna "Setor Enviou" correspondente à linha deste checkbox
+                    setor_txt = ""
                     try:
-                        driver.close()
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-        try:
-            if main_handle:
-                driver.switch_to.window(main_handle)
-        except Exception:
-            pass
+                        linha = caixa.find_element(By.XPATH, "./ancestor::tr[1]")
+                        if col_setor >= 0:
+                            tds = linha.find_elements(By.XPATH, "./td")
+                            if col_setor < len(tds):
+                                setor_txt = (tds[col_setor].text or "").strip()
+                        if not setor_txt:
+                            setor_txt = (linha.text or "").strip()
+                    except Exception as e:
+                        registrar_log(f"[Aviso] Falha ao obter 'Setor Enviou' da linha: {e}")
 
-        # 4) Caso a navegação para o relatório tenha sido na mesma guia, tenta fechar/voltar
-        try:
-            if _e_pagina_resultado(driver):
-                # Fechar por link/botão
-                try:
-                    btn = WebDriverWait(driver, 2, poll_frequency=0.2).until(
-                        EC.element_to_be_clickable((By.XPATH, "//a[@id='btnFechar' or normalize-space(.)='Fechar' or contains(.,'Fechar')]"))
+                    # Normaliza e aplica regra de bloqueio (considera variações como C.P.A.D, C P A D, etc.)
+                    s = (setor_txt or "").upper()
+                    s_norm = _normalize_text(setor_txt)
+
+                    bloquear_cpad = ("CPAD" in s) or ("CPAD" in s_norm)
+                    bloquear_coord = (
+                        ("COORDENA" in s and "PROTOCOLO" in s and "ARQUIVO" in s and "DOCUMENTAL" in s)
+                        or ("COORDENACAO" in s_norm and "PROTOCOLO" in s_norm and "ARQUIVO" in s_norm and "DOCUMENTAL" in s_norm)
                     )
-                    driver.execute_script("arguments[0].click();", btn)
-                    time.sleep(0.2)
-                except Exception:
-                    try:
-                        driver.execute_script("try{ if(window.__doPostBack){__doPostBack('btnFechar','');} }catch(e){}")
-                        time.sleep(0.2)
-                    except Exception:
-                        pass
-                # Últimos recursos
-                try:
-                    driver.back()
-                except Exception:
+                    bloquear = bloquear_cpad or bloquear_coord
+
+                    if bloquear:
+                        registrar_log(f"[Skip] Processo NÃO recebido (Setor Enviou='{setor_txt}')")
+                        METRICAS.incrementar("ueci_processos_ignorados_total")
+                        continue
+
+                    # Marca a caixa para receber
+                    driver.execute_script("arguments[0].scrollIntoView(true);", caixa)
+                    driver.execute_script("arguments[0].click();", caixa)
+                    marcadas += 1
+                    time.sleep(0.1)
+                except Exception as e:
+                    registrar_log(f"[Aviso] Erro ao analisar/marcar caixa {i+1}: {e}")
+
+            if not marcadas:
+                atualizar_status("Nenhum processo a receber pela regra de setor.")
+                return 0
+            evento_painel("total", "receber", marcadas)
+
+            # Clicar no botão "Receber Processos Selecionados"
+            try:
+                btn_receber_lote = wait.until(
+                    EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_AccordionPane1_content_imgBtnRecebeLote"))
+                )
+                with captura_dialogos(driver):
+                    driver.execute_script("arguments[0].click();", btn_receber_lote)
+                    atualizar_status("Aguardando confirmação do recebimento...")
+                    # Lê o alerta "Processo recebido com sucesso!" capturado na página
+                    mensagens = aguardar_dialogo(driver, 5)
+                if mensagens:
+                    METRICAS.incrementar("ueci_processos_recebidos_total", marcadas)
+                    recebidos = marcadas
+                    evento_painel("feito", "receber", marcadas)
+                    atualizar_status("Processos recebidos com sucesso.")
+                    # Aguarda o postback recarregar a lista antes de seguir
                     try:
-                        driver.get(f"{BASE_URL}/ProcessoBeneficio/ConProcessoBeneficio.aspx")
+                        WebDriverWait(driver, 5, poll_frequency=0.2).until(
+                            lambda d: d.execute_script("return document.readyState") == "complete"
+                        )
                     except Exception:
                         pass
-        except Exception:
-            pass
+                else:
+                    atualizar_status("Nenhum alerta exibido após o recebimento.")
+            except Exception as e:
+                atualizar_status(f"Falha ao clicar em 'Receber Processos Selecionados': {e}")
+
+        else:
+            atualizar_status("Nenhum processo encontrado para receber.")
+
     except Exception as e:
-        registrar_log(f"[Aviso] Falha ao fechar página de resultado: {e}")
+        atualizar_status(f"Erro ao acessar a caixa de 'Processos a Receber': {e}")
+    return recebidos
+
+
+def abrir_lista_setor(driver, wait):
+    """Expande a caixa 'Dentro do Setor' (recarrega a lista e evita stale elements)."""
+    btn_dentro_setor = wait.until(
+        EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_AccordionPane2_header_lblProcessoSetor"))
+    )
+    driver.execute_script("arguments[0].click();", btn_dentro_setor)
+    time.sleep(0.8)
+
+
+# Número do processo de uma linha do grid: célula da coluna do número (achada pelo título no
+# cabeçalho) com texto exato; sem cabeçalho reconhecível, a célula inteira no formato de número.
+# Nunca a linha inteira: datas (15/03/2024) também casam com RE_NUMERO_PROCESSO.
+JS_NUMERO_LINHA = r"""
+function numeroDaLinha(tr, padrao){
+    var rx = new RegExp('^(?:' + padrao + ')$'), data = /^\d{2}\/\d{2}\/\d{4}/;
+    var tabela = tr.closest('table'), h = tabela ? tabela.rows[0] : null, col = -1;
+    if(h && h !== tr){
+        for(var i = 0; i < h.cells.length; i++){
+            var t = (h.cells[i].innerText || '').trim().toLowerCase();
+            if(/processo|n[uú]mero|^n[º°o]/.test(t) && !/data|tipo|setor/.test(t)){ col = i; break; }
+        }
+    }
+    if(col >= 0){
+        var v = tr.cells[col] ? (tr.cells[col].innerText || '').trim() : '';
+        return (v && !data.test(v)) ? v : '';
+    }
+    for(var j = 0; j < tr.cells.length; j++){
+        var c = (tr.cells[j].innerText || '').trim();
+        if(c && !data.test(c) && rx.test(c)) return c;
+    }
+    return '';
+}
+"""
 
 
-def ja_dentro_do_setor(driver) -> bool:
-    """Retorna True se a tela atual já é a lista com 'Processos a Receber'/'Dentro do Setor'."""
+def listar_processos_setor(driver) -> list:
+    """Lê o grid 'Dentro do Setor' em uma única chamada.
+    Retorna [{'numero', 'botao', 'texto', 'colunas', 'chegada', 'prazo', 'tipo'}] na ordem do grid,
+    uma entrada por linha; sem número reconhecível na coluna do número (JS_NUMERO_LINHA), o id
+    do botão Editar/Abrir é usado como identificador. Os metadados de prioridade vêm das
+    colunas (ver metadados_grid).
+    """
     try:
-        if driver.find_elements(By.ID, "ctl00_ContentCampos_AccordionPane1_header_lblProcessoReceber"):
-            return True
-        if driver.find_elements(By.ID, "ctl00_ContentCampos_AccordionPane2_header_lblProcessoSetor"):
-            return True
+        itens = driver.execute_script(
+            JS_NUMERO_LINHA + r"""
+            var padrao = arguments[0], out = [], linhas = [], cab = null;
+            function txt(c){ return (c.innerText || '').trim(); }
+            document.querySelectorAll("input[id*='AccordionPane2_content_grdProcessoSetor']").forEach(function(b){
+                if(!/imgbtnEdit|imgbtnAbrir/.test(b.id)) return;
+                var tr = b.closest('tr'); if(!tr) return;
+                // Uma entrada por linha (Editar e Abrir ficam na mesma linha)
+                if(linhas.indexOf(tr) >= 0) return;
+                linhas.push(tr);
+                var texto = (tr.innerText || '').trim();
+                var numero = numeroDaLinha(tr, padrao) || b.id;
+                if(cab === null){
+                    // Cabeçalho do grid (primeira linha da tabela), lido uma vez
+                    var tabela = tr.closest('table'), h = tabela ? tabela.rows[0] : null;
+                    cab = (h && h !== tr) ? Array.prototype.map.call(h.cells, txt) : [];
+                }
+                var colunas = {};
+                Array.prototype.forEach.call(tr.cells, function(c, i){ if(cab[i]) colunas[cab[i]] = txt(c); });
+                out.push({numero: numero, botao: b.id, texto: texto, colunas: colunas});
+            });
+            return out;
+            """,
+            RE_NUMERO_PROCESSO
+        ) or []
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao ler a lista 'Dentro do Setor': {e}")
+        itens = []
+    for indice, item in enumerate(itens):
+        item.update(metadados_grid(item), indice=indice)
+    METRICAS.definir("ueci_fila_profundidade", len(itens), caixa="dentro_setor")
+    return itens
+
+
+# ==============================
+# PRIORIDADE DA FILA DE TRAMITAÇÃO
+# ==============================
+
+RE_DATA_GRID = re.compile(r"\b(\d{2})/(\d{2})/(\d{4})(?:\s+(\d{2}):(\d{2}))?")
+
+
+def _data_grid(texto: str) -> datetime.datetime | None:
+    """Primeira data dd/mm/aaaa [hh:mm] do texto, ou None."""
+    m = RE_DATA_GRID.search(texto or "")
+    if not m:
+        return None
+    dia, mes, ano, hora, minuto = m.groups()
+    try:
+        return datetime.datetime(int(ano), int(mes), int(dia), int(hora or 0), int(minuto or 0))
+    except ValueError:
+        return None
+
+
+def _titulo_grid(colunas: dict, termos: tuple, exceto: tuple = ()) -> str | None:
+    """Título da primeira coluna cujo título (normalizado) contém um dos termos, ou None."""
+    for titulo in colunas or {}:
+        t = _normalize_text(titulo)
+        if any(termo in t for termo in termos) and not any(e in t for e in exceto):
+            return titulo
+    return None
+
+
+def _coluna_grid(colunas: dict, termos: tuple, exceto: tuple = ()) -> str:
+    """Valor da primeira coluna cujo título (normalizado) contém um dos termos."""
+    titulo = _titulo_grid(colunas, termos, exceto)
+    return colunas[titulo] if titulo is not None else ""
+
+
+TERMOS_RECEBIMENTO = ("ENTRADA", "RECEB", "CHEGADA", "ENVIO")
+TERMOS_PRAZO = ("PRAZO", "VENC", "LIMITE")
+_avisos_grid = set()   # avisos do grid já registrados (uma vez por execução do programa)
+
+
+def metadados_grid(item: dict) -> dict:
+    """Extrai chegada, prazo e tipo de uma linha do grid, só pelas colunas de título reconhecido.
+    Datas soltas no texto da linha (nascimento, óbito, publicação...) nunca viram chegada: sem
+    coluna de chegada, ela fica None (ordem do grid) e o log avisa uma única vez."""
+    colunas = item.get("colunas") or {}
+    # Coluna de recebimento; na falta de data nela, uma coluna "Data" que não seja de prazo
+    titulos = [t for t in (_titulo_grid(colunas, TERMOS_RECEBIMENTO), _titulo_grid(colunas, ("DATA",), exceto=TERMOS_PRAZO + TERMOS_RECEBIMENTO))
+               if t is not None]
+    chegada = next(filter(None, (_data_grid(colunas[t]) for t in titulos)), None)
+    if not titulos and "sem_chegada" not in _avisos_grid:
+        _avisos_grid.add("sem_chegada")
+        registrar_log(f"[Aviso] Grid sem coluna de chegada reconhecível (colunas: {', '.join(colunas) or 'nenhuma'}); "
+                      f"prioridade por chegada indisponível, empates seguem a ordem do grid.")
+    return {
+        "chegada": chegada,
+        "prazo": _data_grid(_coluna_grid(colunas, TERMOS_PRAZO)),
+        "tipo": _coluna_grid(colunas, ("TIPO", "BENEFICIO", "ASSUNTO", "ESPECIE", "NATUREZA")),
+    }
+
+
+def peso_prioridade(item: dict, pesos: dict | None = None) -> float:
+    """Maior peso entre os termos de UECI_PRIORIDADE_PESOS encontrados no tipo ou na linha."""
+    pesos = PRIORIDADE_PESOS if pesos is None else pesos
+    alvo = _normalize_text(f"{item.get('tipo', '')} {item.get('texto', '')}")
+    return max((p for termo, p in pesos.items() if _normalize_text(termo) and _normalize_text(termo) in alvo), default=0.0)
+
+
+def chave_prioridade(item: dict, politica: str = PRIORIDADE_POLITICA) -> tuple:
+    """Chave de ordenação (menor = mais urgente) de um item de listar_processos_setor.
+    Na política 'grid' a chave é vazia: a ordem fica com a chegada na fila (sequência), porque
+    o índice recomeça a cada leitura do grid e não pode ser comparado entre leituras."""
+    indice = item.get("indice", 0)
+    chegada = item.get("chegada") or datetime.datetime.max
+    if politica == "antigos":
+        return (chegada, indice)
+    if politica == "prazo":
+        prazo = item.get("prazo")
+        if prazo is None and item.get("chegada"):
+            prazo = item["chegada"] + datetime.timedelta(days=PRIORIDADE_PRAZO_DIAS)
+        return (prazo or datetime.datetime.max, -peso_prioridade(item), indice)
+    if politica == "pesos":
+        return (-peso_prioridade(item), chegada, indice)
+    return ()
+
+
+def ordenar_por_prioridade(itens: list, politica: str = PRIORIDADE_POLITICA) -> list:
+    """Itens do grid na ordem da política de prioridade (estável: empates seguem o grid)."""
+    return sorted(itens, key=lambda item: chave_prioridade(item, politica))
+
+
+_sequencia_fila = itertools.count()
+
+
+def entrada_fila(item: dict | None, politica: str = PRIORIDADE_POLITICA) -> tuple:
+    """Entrada para uma fila de prioridade compartilhada: (chave, sequência, número).
+    Com item None gera o marcador de fim, ordenado depois de qualquer processo."""
+    if item is None:
+        return ((1,), next(_sequencia_fila), None)
+    return ((0,) + chave_prioridade(item, politica), next(_sequencia_fila), item["numero"])
+
+
+def abrir_processo_por_numero(driver, numero: str) -> bool:
+    """Clica em Editar/Abrir na linha do grid 'Dentro do Setor' cujo número do processo é exatamente
+    `numero` (ou no botão com esse id, quando a linha não tinha número reconhecível)."""
+    try:
+        return bool(driver.execute_script(
+            JS_NUMERO_LINHA + r"""
+            var alvo = arguments[0], padrao = arguments[1];
+            var botoes = Array.from(document.querySelectorAll("input[id*='AccordionPane2_content_grdProcessoSetor']"))
+                .filter(function(b){ return /imgbtnEdit|imgbtnAbrir/.test(b.id); });
+            for(var i=0;i<botoes.length;i++){
+                var b = botoes[i], tr = b.closest('tr');
+                if(b.id === alvo || (tr && numeroDaLinha(tr, padrao) === alvo)){
+                    b.scrollIntoView(true);
+                    b.click();
+                    return true;
+                }
+            }
+            return false;
+            """,
+            numero, RE_NUMERO_PROCESSO
+        ))
     except Exception:
-        pass
+        return False
+
+
+# Número do processo exibido na tela de edição: campos/rótulos cujo id cita "processo" (fora do
+# grid do setor) ou, sem eles, o número exato no texto da página. Datas não contam como número.
+JS_PROCESSO_ABERTO = r"""
+var alvo = arguments[0], rx = new RegExp(arguments[1], 'g'), data = /^\d{2}\/\d{2}\/\d{4}$/;
+var campos = [];
+Array.prototype.forEach.call(document.querySelectorAll('[id]'), function(el){
+    if(!/processo/i.test(el.id) || /accordion|grdProcesso/i.test(el.id)) return;
+    var v = (typeof el.value === 'string' && el.tagName !== 'BUTTON') ? el.value : (el.innerText || '');
+    if(!v || v.length > 80) return;
+    (v.match(rx) || []).forEach(function(m){
+        if(!data.test(m) && campos.indexOf(m) < 0) campos.push(m);
+    });
+});
+var escapado = alvo.replace(/[.*+?^${}()|[\]\\\/]/g, '\\$&');
+var exato = new RegExp('(^|[^\\d./-])' + escapado + '($|[^\\d./-])');
+return {campos: campos, no_texto: exato.test(document.body ? document.body.innerText : '')};
+"""
+
+
+def conferir_processo_aberto(driver, numero: str):
+    """Confere que a tela aberta é mesmo a do processo `numero` antes de salvar ou tramitar.
+    As abas do pipeline/orquestrador dividem a mesma sessão ASP.NET, e telas WebForms costumam
+    guardar o processo selecionado na sessão: uma abertura em outra aba pode trocar o processo
+    desta. Levanta RuntimeError (a tentativa é abortada e segue a política de retentativa).
+    """
+    r = driver.execute_script(JS_PROCESSO_ABERTO, numero, RE_NUMERO_PROCESSO) or {}
+    campos = r.get("campos") or []
+    if campos:
+        if numero not in campos:
+            raise RuntimeError(f"A tela aberta mostra o processo {', '.join(campos)}, não {numero}; "
+                               "abortando antes de salvar/tramitar.")
+    elif not r.get("no_texto"):
+        raise RuntimeError(f"O processo {numero} não aparece na tela aberta; abortando antes de salvar/tramitar.")
+
+
+def _avisar_pausa_disjuntor(segundos):
+    atualizar_status(f"⛔ SISPREV instável — pausando a fila por {segundos:.0f}s…")
+
+
+def _reservar_processo(reservas, numero: str) -> bool:
+    """Tenta reservar o processo (sem reservas configuradas, sempre True)."""
+    if not reservas:
+        return True
+    try:
+        if reservas.reservar(numero):
+            return True
+        registrar_log("[Skip] Processo reservado por outro operador.")
+        METRICAS.incrementar("ueci_processos_reservados_outro_total")
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao reservar o processo; pulando para evitar trabalho duplicado: {e}")
     return False
 
 
-def obter_estado_concessao(driver) -> str:
-    """Retorna o estado atual da tela de Concessão.
-    Valores possíveis:
-      - 'selecionar_setor': dropdown de setor visível (precisa selecionar e clicar OK)
-      - 'dentro_setor'    : listas 'Processos a Receber'/'Dentro do Setor' presentes
-      - 'desconhecido'    : não conseguiu identificar
+def _manter_reserva(reservas, numero: str) -> bool:
+    """Mantém a reserva viva durante o trabalho. False se ela expirou e outro operador a assumiu."""
+    if not reservas:
+        return True
+    try:
+        if reservas.manter(numero):
+            return True
+        registrar_log("[Skip] Reserva do processo perdida para outro operador; abandonando o processo.")
+        METRICAS.incrementar("ueci_processos_reservados_outro_total")
+        return False
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao renovar a reserva do processo: {e}")
+        return True
+
+
+def _trecho_pausa(reservas, restante: float) -> float:
+    """Duração de cada trecho de uma pausa longa: menor que o TTL para renovar a reserva no meio."""
+    return min(restante, reservas.ttl / 3) if reservas else restante
+
+
+def _aguardar_disjuntor(disjuntor, reservas, numero: str) -> bool:
+    """Aguarda o disjuntor liberar (a pausa pode chegar a CIRCUITO_PAUSA_MAXIMA, maior que o TTL),
+    renovando a reserva a cada trecho. False se a reserva foi perdida."""
+    avisado = False
+    while True:
+        restante = disjuntor.pausa_restante()
+        if restante <= 0:
+            return _manter_reserva(reservas, numero)
+        if not avisado:
+            _avisar_pausa_disjuntor(restante)
+            avisado = True
+        time.sleep(_trecho_pausa(reservas, restante))
+        if not _manter_reserva(reservas, numero):
+            return False
+
+
+def _encerrar_reserva(reservas, numero: str, concluido: bool):
+    if not reservas:
+        return
+    try:
+        if concluido:
+            reservas.concluir(numero)
+        else:
+            reservas.liberar(numero)
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao atualizar a reserva do processo: {e}")
+
+
+def etapas_processo(driver, wait, numero: str, responsavel, cpf, orcamento: Orcamento, andamento: dict):
+    """Etapas do fluxo de um processo, na ordem, como (nome, função sem argumentos).
+    Uma etapa que retorna False encerra o fluxo com o processo pulado (fora da lista).
+    Compartilhadas pelo fluxo síncrono (processar_processo) e pelo orquestrador assíncrono.
+    `andamento` ({'enviado', 'tramitado'}, novo a cada tentativa) registra o clique final.
+    """
+    def abrir():
+        if not abrir_processo_por_numero(driver, numero):
+            # Lista pode estar recolhida/desatualizada: recarrega e tenta de novo
+            abrir_lista_setor(driver, wait)
+            if not abrir_processo_por_numero(driver, numero):
+                registrar_log("[Skip] Processo não está mais na caixa 'Dentro do Setor'.")
+                return False
+        time.sleep(1)
+        conferir_processo_aberto(driver, numero)
+
+    def controle_interno():
+        preencher_informacoes_controle_interno(driver, wait, responsavel, cpf, orcamento, teto=ESPERA_ELEMENTO)
+
+    def tramitar():
+        # O Salvar do Controle Interno recarregou a tela: confere de novo antes do clique final
+        conferir_processo_aberto(driver, numero)
+        tramitar_para_presidente(driver, wait, responsavel, orcamento=orcamento, andamento=andamento, teto=ESPERA_ELEMENTO)
+
+    def relatorio():
+        # Etapa própria (prazo próprio), já com a tramitação enviada: travar aqui não a desfaz
+        try:
+            # Fecha o relatório imediatamente (sem aguardar), usando o XPath fornecido para ser mais rápido
+            fechar_pagina_resultado(driver, wait, andamento.get("abas_antes"), delay_seconds=0,
+                                    numero_processo=numero, orcamento=orcamento)
+        except Exception as e:
+            registrar_log(f"[Aviso] Não foi possível fechar a página de resultado automaticamente: {e}")
+
+    def voltar_lista():
+        # Aguarda retorno para a lista principal
+        driver.back()
+        time.sleep(1)
+        abrir_lista_setor(driver, wait)
+
+    return (
+        ("abrir_processo", abrir),
+        ("controle_interno", controle_interno),
+        ("tramitar", tramitar),
+        ("relatorio", relatorio),
+        ("voltar_lista", voltar_lista),
+    )
+
+
+def novo_andamento() -> dict:
+    return {"enviado": False, "tramitado": False, "abas_antes": None}
+
+
+def confirmar_apos_envio(driver, wait, numero: str, erro, andamento: dict) -> bool:
+    """Falha depois do clique final de Tramitar: repetir o fluxo tramitaria de novo (ou, com o
+    processo já fora da caixa, o contaria como pulado). Só recupera a navegação e decide se
+    houve tramitação: confirmada pelo alerta ou, sem confirmação, pela ausência do processo na
+    caixa 'Dentro do Setor'. Retorna True se tramitado; False deixa a falha seguir a retentativa.
     """
+    confirmado = andamento["tramitado"]
+    registrar_log(f"[Aviso] Falha após o envio da tramitação ({'confirmada' if confirmado else 'sem confirmação'}); "
+                  f"recuperando só a navegação: {erro}")
     try:
-        # Seletor de setor visível indica etapa de seleção pendente
-        seletores = driver.find_elements(By.ID, "ctl00_ContentCampos_ddlSetor")
-        for s in seletores:
-            try:
-                if s.is_displayed():
-                    return "selecionar_setor"
-            except Exception:
-                continue
-    except Exception:
-        pass
+        with VIGIA.etapa("recuperar", driver):
+            recuperar_contexto_navegador(driver, wait)
+    except Exception as e:
+        registrar_log(f"[Aviso] Falha ao recuperar a tela de Concessão: {e}")
+        if not confirmado:
+            # Sem a lista não há como saber: na dúvida, não tramitar de novo
+            registrar_log("[Aviso] Tramitação não confirmada e lista indisponível; tratando como tramitado para não repetir o envio.")
+            return True
+    if confirmado:
+        return True
+    try:
+        ainda_no_setor = any(item["numero"] == numero for item in listar_processos_setor(driver))
+    except Exception as e:
+        registrar_log(f"[Aviso] Não foi possível conferir a caixa do setor ({e}); tratando como tramitado para não repetir o envio.")
+        return True
+    if ainda_no_setor:
+        registrar_log("[Aviso] Processo continua 'Dentro do Setor': a tramitação não ocorreu.")
+        return False
+    return True
+
 
-    # Caso contrário, verifica se as caixas de processos existem (estado 'dentro do setor')
+def executar_etapa(nome: str, driver, etapa):
+    """Executa uma etapa medida (métricas) e vigiada (prazo do VIGIA) na thread atual."""
+    with METRICAS.medir(nome), VIGIA.etapa(nome, driver):
+        return etapa()
+
+
+def tratar_falha_processo(driver, wait, numero: str, erro, disjuntor, tentativa: int) -> str:
+    """Classifica a falha, registra, captura o pacote de diagnóstico e recupera o contexto
+    do navegador. Retorna a classe do erro (para a política de retentativa)."""
+    classe = classificar_erro(erro, driver)
+    disjuntor.registrar_falha(classe)
+    METRICAS.incrementar("ueci_processos_falhas_total", classe=classe)
+    print(f"[Erro] Falha ao tramitar processo {numero} ({classe}): {erro}")
+    registrar_log(f"[Erro] Falha ao tramitar processo (tentativa {tentativa+1}, {classe}): {erro}")
     try:
-        if driver.find_elements(By.ID, "ctl00_ContentCampos_AccordionPane1_header_lblProcessoReceber"):
-            return "dentro_setor"
-        if driver.find_elements(By.ID, "ctl00_ContentCampos_AccordionPane2_header_lblProcessoSetor"):
-            return "dentro_setor"
-    except Exception:
+        with VIGIA.etapa("capturar", driver):
+            capturar_falha(driver, numero, erro, classe)
+    except EtapaExcedida:
         pass
 
-    return "desconhecido"
+    # Recupera o contexto: sessão expirada passa pelo fluxo de login
+    try:
+        if classe == "sessao_expirada":
+            entrar_no_setor(driver, wait)
+        elif classe == "travamento":
+            with VIGIA.etapa("recuperar"):
+                recuperar_contexto_navegador(driver, wait)
+        elif classe != "stale":
+            driver.get(f"{BASE_URL}/ProcessoBeneficio/ConProcessoBeneficio.aspx")
+            abrir_lista_setor(driver, wait)
+    except Exception as e2:
+        registrar_log(f"[Aviso] Falha ao recuperar a tela de Concessão: {e2}")
+    return classe
 
 
-def tramitar_para_presidente(driver, wait, nome_responsavel):
-    """Tramita o processo para o Gabinete do Presidente."""
+def processar_processo(driver, wait, numero: str, responsavel, cpf, disjuntor, reservas=None) -> bool | None:
+    """Abre o processo pelo número, preenche o Controle Interno, tramita e volta à lista.
+    Aplica a política de retentativa por classe de erro. Com `reservas`, só trabalha no
+    processo se conseguir reservá-lo, e renova a reserva durante pausas e entre etapas.
+    Retorna True se tramitou, False em falha e None se o processo foi pulado (reservado por
+    outro operador, reserva perdida ou fora da lista).
+    """
+    tentativa = 0
+    definir_processo_log(numero)
+    if not _reservar_processo(reservas, numero):
+        definir_processo_log(None)
+        return None
+    concluido = False
     try:
-        # Clicar no botão Tramitar
-        btn_tramitar = wait.until(EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_btnTramitar")))
-        driver.execute_script("arguments[0].scrollIntoView(true);", btn_tramitar)
-        time.sleep(0.3)
-        driver.execute_script("arguments[0].click();", btn_tramitar)
-        # dá tempo do painel/modal de tramitação abrir por completo
-        time.sleep(MODAL_OPEN_DELAY)
+        while True:
+            # Com o disjuntor aberto, toda a fila aguarda o backend se recuperar
+            if not _aguardar_disjuntor(disjuntor, reservas, numero):
+                return None
+            # Orçamento por tentativa, depois da pausa: nem o disjuntor nem o backoff o consomem
+            orcamento = Orcamento(ORCAMENTO_PROCESSO)
+            andamento = novo_andamento()
+            try:
+                t_proc = time.perf_counter()
+                for nome, etapa in etapas_processo(driver, wait, numero, responsavel, cpf, orcamento, andamento):
+                    # Depois do envio a reserva só é renovada: perdê-la não desfaz a tramitação
+                    if not _manter_reserva(reservas, numero) and not andamento["enviado"]:
+                        return None
+                    if executar_etapa(nome, driver, etapa) is False:
+                        return None
+                METRICAS.observar("ueci_etapa_segundos", time.perf_counter() - t_proc, etapa="processo_total")
+                METRICAS.incrementar("ueci_processos_tramitados_total")
+                disjuntor.registrar_sucesso()
+                concluido = True
+                return True
 
-        # Selecionar Despacho
-        select_despacho = Select(WebDriverWait(driver, 10, poll_frequency=0.3).until(
-            EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_ddlDespacho"))
-        ))
-        select_despacho.select_by_value("4")
-        time.sleep(AFTER_SELECT_DELAY)
+            except Exception as e:
+                if andamento["enviado"] and confirmar_apos_envio(driver, wait, numero, e, andamento):
+                    METRICAS.incrementar("ueci_processos_tramitados_total")
+                    disjuntor.registrar_sucesso()
+                    concluido = True
+                    return True
+                classe = tratar_falha_processo(driver, wait, numero, e, disjuntor, tentativa)
+                tentativa += 1
+                if tentativa >= max_tentativas(classe):
+                    return False
+                time.sleep(calcular_espera(classe, tentativa - 1))
+    finally:
+        _encerrar_reserva(reservas, numero, concluido)
+        definir_processo_log(None)
 
-        # Selecionar Setor (Gabinete do Presidente)
-        select_setor = Select(WebDriverWait(driver, 10, poll_frequency=0.3).until(
-            EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_ddlSetor"))
-        ))
-        select_setor.select_by_value("15")
-        time.sleep(AFTER_SELECT_DELAY)
 
-        # Corpo da tramitação (com assinatura do usuário logado, centralizada e em negrito)
-        assinante = obter_assinante_nome() or nome_responsavel.upper()
-        texto_tramitacao = (
-            "<p>Ao Gabinete do Presidente Executivo,</p>"
-            "<p>Encaminha-se, para assinatura, o ato constante da minuta anexa ao processo.</p>"
-            "<p>Registre-se que a análise desta Unidade de Controle Interno quanto às concessões de aposentadoria, reserva remunerada, reforma e pensão, nos termos do Anexo VII da Instrução Normativa TCE nº 68, de 8 de dezembro de 2020, ainda depende de regulamentação específica, razão pela qual não houve emissão de parecer técnico sobre o presente ato.</p>"
-            "<p>Respeitosamente,</p>"
-            f"<div style='text-align:center; margin-top:12px;'><b>{assinante}</b></div>"
+def tramitar_processos_do_setor(driver, wait, responsavel, cpf, disjuntor=None, reservas=None) -> dict:
+    """Tramita todos os processos da caixa 'Dentro do Setor' (lista lida uma vez, aberta por número).
+    Retorna {'total', 'tramitados', 'falhas', 'pulados'}.
+    """
+    resultado = {"total": 0, "tramitados": 0, "falhas": 0, "pulados": 0}
+    abrir_lista_setor(driver, wait)
+    itens = listar_processos_setor(driver)
+    resultado["total"] = len(itens)
+    if not itens:
+        return resultado
+    evento_painel("total", "tramitar", len(itens))
+
+    print(f"Encontrados {len(itens)} processo(s) dentro do setor. Iniciando tramitação...")
+    itens = ordenar_por_prioridade(itens)
+    disjuntor = disjuntor or DisjuntorServidor()
+    governador = GovernadorMemoria(driver, wait)
+    for item in itens:
+        t0 = time.monotonic()
+        ok = processar_processo(driver, wait, item["numero"], responsavel, cpf, disjuntor, reservas)
+        evento_painel("feito", "tramitar", ok=ok, segundos=time.monotonic() - t0)
+        if ok is None:
+            resultado["pulados"] += 1
+            continue
+        resultado["tramitados" if ok else "falhas"] += 1
+        governador.apos_processo()
+    return resultado
+
+
+def abrir_reservas() -> ReservasProcessos | None:
+    """Abre o armazenamento de reservas configurado (ou None se desativado/inacessível)."""
+    if not RESERVAS_ARQUIVO:
+        return None
+    try:
+        reservas = ReservasProcessos(
+            RESERVAS_ARQUIVO, dono=f"{USUARIO_PC}@{socket.gethostname()}:{os.getpid()}", ttl=RESERVA_TTL,
+            ttl_concluido=RESERVA_TTL_CONCLUIDO, tolerancia=RESERVA_TOLERANCIA_RELOGIO,
         )
+        removidas = reservas.limpar_expiradas()
+        reservas.observar()
+        registrar_log(f"Reservas compartilhadas em {RESERVAS_ARQUIVO} (operador {reservas.dono}; {removidas} expirada(s) removida(s))")
+        return reservas
+    except Exception as e:
+        registrar_log(f"[Aviso] Reservas compartilhadas indisponíveis ({RESERVAS_ARQUIVO}); seguindo sem reservas: {e}")
+        atualizar_status("⚠️ Reservas compartilhadas indisponíveis — evite rodar em duas máquinas.")
+        return None
+
+
+class GovernadorMemoria:
+    """Acompanha JSHeapUsedSize, Nodes e Documents da aba de trabalho (CDP Performance.getMetrics)
+    e, ao passar de um limite ou de N processos, troca a aba por uma nova já posicionada na
+    lista do setor. A fila fica no Python (números), então nenhuma posição é perdida.
+    """
+
+    def __init__(self, driver, wait):
+        self.driver = driver
+        self.wait = wait
+        self.processos = 0
+        self.reciclagens = 0
+        self._habilitar()
+
+    def _habilitar(self):
+        try:
+            self.driver.execute_cdp_cmd("Performance.enable", {})
+            self.ativo = True
+        except Exception as e:
+            self.ativo = False
+            registrar_log(f"[Aviso] Governador de memória sem acesso ao CDP Performance: {e}")
+
+    def amostrar(self) -> dict:
+        try:
+            metricas = self.driver.execute_cdp_cmd("Performance.getMetrics", {}).get("metrics", [])
+        except Exception:
+            return {}
+        valores = {m.get("name"): m.get("value", 0) for m in metricas}
+        amostra = {
+            "heap_mb": valores.get("JSHeapUsedSize", 0) / (1024 * 1024),
+            "nos": int(valores.get("Nodes", 0)),
+            "documentos": int(valores.get("Documents", 0)),
+        }
+        METRICAS.definir("ueci_navegador_heap_bytes", valores.get("JSHeapUsedSize", 0))
+        METRICAS.definir("ueci_navegador_nos", amostra["nos"])
+        METRICAS.definir("ueci_navegador_documentos", amostra["documentos"])
+        return amostra
+
+    def motivo_reciclagem(self, amostra: dict) -> str | None:
+        if MEMORIA_RECICLAR_A_CADA and self.processos >= MEMORIA_RECICLAR_A_CADA:
+            return f"{self.processos} processos desde a última reciclagem"
+        if amostra.get("heap_mb", 0) >= MEMORIA_HEAP_MB:
+            return f"heap JS {amostra['heap_mb']:.0f}MB"
+        if amostra.get("nos", 0) >= MEMORIA_NOS:
+            return f"{amostra['nos']} nós DOM"
+        if amostra.get("documentos", 0) >= MEMORIA_DOCUMENTOS:
+            return f"{amostra['documentos']} documentos"
+        return None
+
+    def apos_processo(self):
+        """Chamado entre processos: amostra e recicla a aba se necessário."""
+        self.processos += 1
+        amostra = self.amostrar() if self.ativo else {}
+        motivo = self.motivo_reciclagem(amostra)
+        if motivo:
+            self.reciclar(motivo)
+
+    def reciclar(self, motivo: str):
+        driver = self.driver
+        t0 = time.perf_counter()
+        antiga = nova = None
+        trocada = False
+        try:
+            antiga = driver.current_window_handle
+            driver.switch_to.new_window("tab")
+            nova = driver.current_window_handle
+            entrar_no_setor(driver, self.wait)
+            abrir_lista_setor(driver, self.wait)
+            driver.switch_to.window(antiga)
+            driver.close()
+            trocada = True
+            driver.switch_to.window(nova)
+        except Exception as e:
+            # Desfaz a troca pela metade: descarta a aba nova e volta a trabalhar na antiga
+            # (se a antiga já foi fechada, a nova é a única que resta)
+            if trocada:
+                try:
+                    driver.switch_to.window(nova)
+                except Exception:
+                    pass
+            elif nova is not None and nova != antiga:
+                try:
+                    driver.switch_to.window(nova)
+                    driver.close()
+                except Exception:
+                    pass
+                try:
+                    driver.switch_to.window(antiga)
+                except Exception:
+                    pass
+            registrar_log(f"[Aviso] Falha ao reciclar a aba de trabalho ({motivo}): {e}")
+            return
+        self.processos = 0
+        self.reciclagens += 1
+        self._habilitar()
+        METRICAS.incrementar("ueci_navegador_reciclagens_total")
+        registrar_log(f"[Memória] Aba reciclada ({motivo}) em {time.perf_counter() - t0:.1f}s")
 
-        # Preenche o corpo (textarea/iframe/editor)
-        if not preencher_editor_observacao(driver, wait, texto_tramitacao):
-            registrar_log("[Aviso] Não foi possível preencher o corpo via editor; tentando fallback direto no campo por ID…")
-            try:
-                corpo = WebDriverWait(driver, 10, poll_frequency=0.3).until(
-                    EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_txtObservacao"))
-                )
-                driver.execute_script("arguments[0].scrollIntoView(true);", corpo)
-                time.sleep(0.2)
-                corpo.clear(); time.sleep(0.2)
-                corpo.send_keys(texto_tramitacao)
-            except Exception as e:
-                registrar_log(f"[Erro] Falha ao preencher corpo da tramitação: {e}")
-                raise
 
-        # Aguarda sincronização do conteúdo com o editor/campo oculto antes de prosseguir
-        if not aguardar_sincronizacao_observacao(driver, texto_tramitacao, timeout=SYNC_TIMEOUT_PRIMARY):
-            registrar_log("[Aviso] Conteúdo do despacho pode não ter sincronizado totalmente; prosseguindo mesmo assim.")
+# ==============================
+# SESSÃO AQUECIDA ENTRE EXECUÇÕES
+# ==============================
 
-        # Confirmar tramitação (somente se o texto estiver realmente presente)
-        # Aguarda um curto período para sincronização e clica imediatamente em "Tramitar"
-        len_ok = aguardar_sincronizacao_observacao(driver, texto_tramitacao, timeout=SYNC_TIMEOUT_PRECLICK)
-        if not len_ok:
-            registrar_log("[Aviso] Texto do despacho possivelmente ainda sincronizando; prosseguindo com clique em 'Tramitar'.")
+_driver_quente = {"driver": None}
 
-        # Diagnóstico antes da sincronização forçada
-        try:
-            diag_antes = diagnosticar_observacao_campos(driver)
-            if diag_antes:
-                registrar_log(f"[Diag] Antes sync: {diag_antes}")
-        except Exception:
-            pass
 
-        # Força sincronização final dos campos que serão enviados no postback
-        try:
-            qtd = forcar_sincronizacao_observacao(driver, texto_tramitacao)
-            registrar_log(f"[Info] Campos de observação sincronizados (qtd={qtd}).")
-            # Pequena pausa para JS de página reagir
-            time.sleep(0.5)
-        except Exception as e:
-            registrar_log(f"[Aviso] Falha ao forçar sincronização final: {e}")
+def driver_saudavel(driver) -> bool:
+    """Checagem rápida de que a sessão WebDriver e a aba atual ainda respondem."""
+    try:
+        driver.execute_script("return document.readyState")
+        return True
+    except Exception:
+        return False
 
-        # Diagnóstico depois da sincronização forçada
+
+def obter_driver(contador=None):
+    """Reaproveita a sessão da execução anterior se ainda estiver saudável; senão (navegador
+    fechado, aba perdida) conecta de novo. Retorna (driver, reaproveitado).
+    """
+    driver = _driver_quente["driver"]
+    if driver is not None:
+        # Remove a instrumentação da execução anterior (contador/gravador) antes de reinstrumentar
+        driver.__dict__.pop("execute", None)
+        if driver_saudavel(driver):
+            if contador:
+                contador.instrumentar(driver)
+            registrar_log("Reutilizando a sessão do Chrome da execução anterior.")
+            return driver, True
+        registrar_log("[Aviso] Sessão anterior do Chrome não responde; reconectando…")
+        descartar_driver()
+    driver = conectar_chrome(contador)
+    _driver_quente["driver"] = driver
+    return driver, False
+
+
+def descartar_driver():
+    """Encerra a sessão aquecida (saída do app ou sessão quebrada)."""
+    driver, _driver_quente["driver"] = _driver_quente["driver"], None
+    if driver is not None:
         try:
-            diag_depois = diagnosticar_observacao_campos(driver)
-            if diag_depois:
-                registrar_log(f"[Diag] Depois sync: {diag_depois}")
+            driver.quit()
         except Exception:
             pass
 
-        # Verificação final: garante que o texto do despacho está presente antes do clique
-        try:
-            need_len = max(15, int(len(texto_tramitacao) * 0.3))
-            js_len_script = """
-                var ta=document.getElementById('ctl00_ContentToolBar_txtObservacao');
-                var v=ta?(ta.value||ta.textContent||''):'';
-                var ed=document.querySelector('body[contenteditable="true"], [contenteditable="true"]');
-                var e=(ed?(ed.innerText||''):'');
-                return Math.max(v.trim().length, e.trim().length);
-            """
-            plain_len = driver.execute_script(js_len_script)
-            if (plain_len or 0) < need_len:
-                registrar_log(f"[Aviso] Texto do despacho ainda curto (len={plain_len}); forçando sincronização extra...")
-                try:
-                    qtd2 = forcar_sincronizacao_observacao(driver, texto_tramitacao)
-                    registrar_log(f"[Info] Sincronização extra aplicou em {qtd2} elemento(s).")
-                    time.sleep(0.3)
-                except Exception as e:
-                    registrar_log(f"[Aviso] Falha ao aplicar sincronização extra: {e}")
 
-                plain_len2 = driver.execute_script(js_len_script)
-                if (plain_len2 or 0) < need_len:
-                    # Fallback definitivo: cria/preenche um campo hidden com o nome esperado no formulário principal
-                    try:
-                        plain_text = re.sub(r'<[^>]+>', '', texto_tramitacao)
-                        created = driver.execute_script(
-                            r"""
-                            (function(plain){
-                                function ensureIn(doc){
-                                    try{
-                                        var name='ctl00$ContentToolBar$txtObservacao';
-                                        var id='ctl00_ContentToolBar_txtObservacao';
-                                        var ta = doc.getElementById(id);
-                                        if(!ta){
-                                            var byName = [];
-                                            try{ byName = doc.getElementsByName(name); }catch(e){}
-                                            if(byName && byName.length){ ta = byName[0]; }
-                                        }
-                                        if(!ta){
-                                            var form = doc.querySelector('form');
-                                            if(form){
-                                                ta = doc.createElement('input');
-                                                ta.type = 'hidden';
-                                                ta.name = name;
-                                                ta.id = id;
-                                                form.appendChild(ta);
-                                            }
-                                        }
-                                        if(ta){
-                                            try{ ta.removeAttribute('disabled'); }catch(e){}
-                                            try{ ta.disabled = false; }catch(e){}
-                                            try{ ta.value = plain; }catch(e){}
-                                            try{ ta.textContent = plain; }catch(e){}
-                                            try{ ta.setAttribute('value', plain); }catch(e){}
-                                            try{ ['input','keyup','change','blur'].forEach(function(evt){ ta.dispatchEvent(new Event(evt,{bubbles:true})); }); }catch(e){}
-                                            return true;
-                                        }
-                                    }catch(e){}
-                                    return false;
-                                }
-                                var ok = ensureIn(document);
-                                try{
-                                    for(var i=0;i<window.frames.length && !ok;i++){
-                                        try{ ok = ensureIn(window.frames[i].document); }catch(e){}
-                                    }
-                                }catch(e){}
-                                return !!ok;
-                            })(plain);
-                            """,
-                            plain_text
-                        )
-                        if created:
-                            registrar_log("[Info] Campo 'txtObservacao' criado/preenchido como hidden (fallback).")
-                        else:
-                            registrar_log("[Aviso] Não foi possível localizar/criar campo 'txtObservacao' nem em iframes.")
-                        time.sleep(0.2)
-                    except Exception as e:
-                        registrar_log(f"[Aviso] Fallback (hidden) no 'txtObservacao' falhou: {e}")
-        except Exception:
-            pass
+def abrir_aba_trabalho(contador=None):
+    """Nova sessão WebDriver ligada a uma aba própria (estágios do pipeline trabalham em paralelo)."""
+    driver = conectar_chrome(contador)
+    driver.switch_to.new_window("tab")
+    return driver
 
-        # Encontra o botão por ID ou alternativas e clica
-        try:
-            btn_tramitar_final = WebDriverWait(driver, 6, poll_frequency=0.2).until(
-                EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_Button1"))
-            )
-        except Exception:
-            # Fallbacks por texto/valor
-            candidatos = driver.find_elements(By.XPATH,
-                "//input[@type='submit' and (translate(@value,'TRAMITAR','tramitan')='tramitan' or contains(@value,'Tramitar'))]"
-            ) or driver.find_elements(By.XPATH, "//button[normalize-space(.)='Tramitar']|//input[@value='Tramitar']")
-            if not candidatos:
-                raise RuntimeError("Botão 'Tramitar' não encontrado.")
-            btn_tramitar_final = candidatos[0]
 
-        # Guarda as janelas/abas atuais para detectar novas após a tramitação
-        try:
-            handles_antes = set(driver.window_handles)
-        except Exception:
-            handles_antes = None
+def fechar_aba_trabalho(driver):
+    try:
+        driver.close()
+    except Exception:
+        pass
+    try:
+        driver.quit()
+    except Exception:
+        pass
 
-        driver.execute_script("arguments[0].scrollIntoView(true);", btn_tramitar_final)
-        time.sleep(0.3)
-        driver.execute_script("arguments[0].click();", btn_tramitar_final)
-        time.sleep(0.8)
 
-        # Se o alerta não aparecer rapidamente, força o postback da página ASP.NET
-        try:
-            WebDriverWait(driver, 3).until(EC.alert_is_present())
-        except Exception:
-            registrar_log("[Aviso] Alerta não apareceu após o clique; tentando __doPostBack...")
-            driver.execute_script(
-                "if(window.WebForm_DoPostBackWithOptions){WebForm_DoPostBackWithOptions(new WebForm_PostBackOptions('ctl00$ContentToolBar$Button1','',true,'vgTramitar','',false,false));}"
-            )
+def automatizar_pipeline(responsavel, cpf, contador=None) -> dict:
+    """Modo pipeline: uma aba recebe processos em lotes enquanto outras abas tramitam o que
+    já está no setor. Os números passam de um estágio a outro por uma fila de prioridade
+    limitada (UECI_PRIORIDADE); com a fila cheia, o recebimento espera (backpressure).
+    """
+    fila = queue.PriorityQueue(maxsize=max(1, PIPELINE_FILA))
+    enfileirados = set()
+    resultado = {"total": 0, "tramitados": 0, "falhas": 0, "pulados": 0, "recebidos": 0}
+    lock = threading.Lock()
+    disjuntor = DisjuntorServidor()
+    reservas = abrir_reservas()
+    trabalhadores = []
+
+    def algum_trabalhador_vivo():
+        return any(t.is_alive() for t in trabalhadores)
+
+    def entregar(item):
+        # Bloqueia enquanto a fila estiver cheia, mas não para sempre se os trabalhadores morrerem
+        while True:
             try:
-                WebDriverWait(driver, 4).until(EC.alert_is_present())
-            except Exception:
-                registrar_log("[Aviso] __doPostBack não abriu alerta; tentando __doPostBack simples...")
-                driver.execute_script("if(window.__doPostBack){__doPostBack('ctl00$ContentToolBar$Button1','');}")
-                time.sleep(0.8)
-        
-        # Trata o alerta após tramitar
+                fila.put(item, timeout=1)
+                return True
+            except queue.Full:
+                if not algum_trabalhador_vivo():
+                    return False
+
+    def enfileirar_novos(driver):
+        for item in ordenar_por_prioridade(listar_processos_setor(driver)):
+            with lock:
+                if item["numero"] in enfileirados:
+                    continue
+                enfileirados.add(item["numero"])
+                resultado["total"] += 1
+            evento_painel("total", "tramitar")
+            if not entregar(entrada_fila(item)):
+                return
+
+    def estagio_receber():
+        driver = None
         try:
-            WebDriverWait(driver, 10).until(EC.alert_is_present())
-            alerta = driver.switch_to.alert
-            msg_alerta = alerta.text
-            registrar_log(f"[Alerta] {msg_alerta}")
-            alerta.accept()
-            time.sleep(0.8)
-        except Exception:
-            pass
+            driver = abrir_aba_trabalho(contador)
+            wait = WebDriverWait(driver, ESPERA_ELEMENTO, poll_frequency=0.3)
+            entrar_no_setor(driver, wait)
+            abrir_lista_setor(driver, wait)
+            enfileirar_novos(driver)
+            while algum_trabalhador_vivo():
+                with METRICAS.medir("receber_lote"), VIGIA.etapa("receber", driver):
+                    n = receber_processos(driver, wait, limite=PIPELINE_LOTE)
+                with lock:
+                    resultado["recebidos"] += n
+                if n:
+                    registrar_log(f"[Pipeline] Lote de {n} processo(s) recebido(s).")
+                abrir_lista_setor(driver, wait)
+                enfileirar_novos(driver)
+                if not n:
+                    break
+        except Exception as e:
+            registrar_log(f"[Erro] Estágio de recebimento interrompido: {e}")
+        finally:
+            for _ in trabalhadores:
+                entregar(entrada_fila(None))
+            if driver:
+                fechar_aba_trabalho(driver)
 
-        # Fecha a página/aba de resultado (se aberta) e retorna para prosseguir
+    def estagio_tramitar(n_aba):
+        driver = None
         try:
-            # Fecha o relatório imediatamente (sem aguardar), usando o XPath fornecido para ser mais rápido
-            fechar_pagina_resultado(driver, wait, handles_antes, delay_seconds=0)
+            driver = abrir_aba_trabalho(contador)
+            wait = WebDriverWait(driver, ESPERA_ELEMENTO, poll_frequency=0.3)
+            entrar_no_setor(driver, wait)
+            abrir_lista_setor(driver, wait)
+            governador = GovernadorMemoria(driver, wait)
+            while True:
+                _, _, numero = fila.get()
+                if numero is None:
+                    break
+                t0 = time.monotonic()
+                ok = processar_processo(driver, wait, numero, responsavel, cpf, disjuntor, reservas)
+                evento_painel("feito", "tramitar", ok=ok, segundos=time.monotonic() - t0)
+                if ok is not None:
+                    governador.apos_processo()
+                with lock:
+                    resultado["pulados" if ok is None else "tramitados" if ok else "falhas"] += 1
+                    feitos = resultado["tramitados"] + resultado["falhas"] + resultado["pulados"]
+                    total = resultado["total"]
+                atualizar_status(f"⚙️ Pipeline: {feitos}/{total} processo(s) tratados (aba {n_aba})…")
         except Exception as e:
-            registrar_log(f"[Aviso] Não foi possível fechar a página de resultado automaticamente: {e}")
+            registrar_log(f"[Erro] Aba de tramitação {n_aba} interrompida: {e}")
+        finally:
+            if driver:
+                fechar_aba_trabalho(driver)
 
-        registrar_log(f"[OK] Processo tramitado com sucesso")
-        print(f"[OK] Processo tramitado com sucesso")
+    for n_aba in range(1, max(1, PIPELINE_ABAS) + 1):
+        t = threading.Thread(target=estagio_tramitar, args=(n_aba,), name=f"ueci-tramitar-{n_aba}", daemon=True)
+        trabalhadores.append(t)
+        t.start()
+    receptor = threading.Thread(target=estagio_receber, name="ueci-receber", daemon=True)
+    receptor.start()
+    receptor.join()
+    for t in trabalhadores:
+        t.join()
+    registrar_log(f"[Pipeline] Recebidos={resultado['recebidos']} Tramitados={resultado['tramitados']} Falhas={resultado['falhas']} Pulados={resultado['pulados']}")
+    return resultado
 
-    except Exception as e:
-        registrar_log(f"[Erro] Falha ao tramitar processo: {e}")
-        print(f"[Erro] Falha ao tramitar processo: {e}")
-        raise
 
+# ==============================
+# PAINEL DE ACOMPANHAMENTO
+# ==============================
 
-def automatizar(responsavel, cpf):
-    driver = None
-    try:
-        atualizar_status("🚀 Iniciando automação...")
-        progress.set(0.05)
-        registrar_log(f"Iniciado por {USUARIO_PC}")
-        registrar_log(f"Responsável Controle Interno: {responsavel} - {cpf}")
+class PainelExecucao:
+    """Números do painel da interface: feitos/total por etapa, ritmo (processos/min numa janela
+    móvel), mediana de segundos por processo, falhas e previsão de término.
+    Alimentado por eventos (evento_painel) aplicados na thread do Tk, então não precisa de trava.
+    """
 
-        atualizar_status("🔗 Conectando ao Chrome...")
-        progress.set(0.1)
-        
-        import logging
-        logging.getLogger('selenium').setLevel(logging.WARNING)
-        
-        chrome_options = Options()
-        chrome_options.debugger_address = "localhost:9222"
-
-        # Garante que o Chrome está rodando com depuração em 9222
-        if not porta_debug_aberta():
-            msg = (
-                "Chrome não encontrado na porta 9222. Abra o Chrome com depuração ativa:\n"
-                    r'"C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe" --remote-debugging-port=9222 --user-data-dir=\\ChromeDevSession'
-            )
-            registrar_log(f"[Erro] {msg}")
-            raise RuntimeError(msg)
-            
-        registrar_log("Conectando ao Chrome via Selenium Manager...")
-        atualizar_status("⏳ Conectando via Selenium Manager…")
-        t0 = time.time()
-        driver = webdriver.Chrome(options=chrome_options)
-        registrar_log(f"Chrome conectado em {time.time()-t0:.2f}s")
-        
+    ETAPAS = ("receber", "tramitar")
+
+    def __init__(self, janela: float = PAINEL_JANELA):
+        self.janela = max(30.0, janela)
+        self.reiniciar()
+
+    def reiniciar(self, instante: float | None = None):
+        self.inicio = instante or time.monotonic()
+        self.etapas = {e: {"feitos": 0, "total": 0} for e in self.ETAPAS}
+        self.falhas = 0
+        self.pulados = 0
+        self.conclusoes = collections.deque()          # instantes dos processos tratados
+        self.duracoes = collections.deque(maxlen=200)  # segundos dos processos tramitados
+        self.progresso_pendente = False                # houve tramitação desde o último redesenho
+
+    def aplicar(self, tipo: str, etapa: str | None, quantidade: int, ok, segundos, instante: float):
+        if tipo == "inicio":
+            self.reiniciar(instante)
+        elif tipo == "total":
+            self.etapas[etapa]["total"] += quantidade
+        elif tipo == "feito":
+            self.etapas[etapa]["feitos"] += quantidade
+            if etapa != "tramitar":
+                return
+            self.progresso_pendente = True
+            self.conclusoes.append(instante)
+            if ok is False:
+                self.falhas += 1
+            elif ok is None:
+                self.pulados += 1
+            elif segundos is not None:
+                self.duracoes.append(segundos)
+
+    def ritmo(self, agora: float | None = None) -> float | None:
+        """Processos tratados por minuto na janela móvel (None antes do primeiro)."""
+        agora = agora or time.monotonic()
+        while self.conclusoes and agora - self.conclusoes[0] > self.janela:
+            self.conclusoes.popleft()
+        decorrido = min(self.janela, agora - self.inicio)
+        if not self.conclusoes or decorrido <= 0:
+            return None
+        return len(self.conclusoes) * 60.0 / decorrido
+
+    def mediana(self) -> float | None:
+        return statistics.median(self.duracoes) if self.duracoes else None
+
+    def previsao(self, agora: float | None = None) -> float | None:
+        """Segundos até tramitar o que falta, pelo ritmo atual (None sem ritmo ou sem fila)."""
+        etapa = self.etapas["tramitar"]
+        restantes = etapa["total"] - etapa["feitos"]
+        if restantes <= 0:
+            return 0.0 if etapa["total"] else None
+        taxa = self.ritmo(agora)
+        return restantes * 60.0 / taxa if taxa else None
+
+
+PAINEL = PainelExecucao()
+
+
+def evento_painel(tipo: str, etapa: str | None = None, quantidade: int = 1, ok=True, segundos: float | None = None):
+    """Publica um evento do painel ('inicio', 'total' ou 'feito') de qualquer thread: só enfileira
+    uma tupla; a contagem e o redesenho acontecem no laço do Tk (_drenar_fila_gui)."""
+    publicar_gui(PAINEL.aplicar, tipo, etapa, quantidade, ok, segundos, time.monotonic())
+
+
+def _formatar_duracao(segundos: float | None) -> str:
+    if segundos is None:
+        return "—"
+    segundos = int(round(segundos))
+    if segundos >= 3600:
+        return f"{segundos // 3600}h{(segundos % 3600) // 60:02d}"
+    if segundos >= 60:
+        return f"{segundos // 60}min{segundos % 60:02d}"
+    return f"{segundos}s"
+
+
+def textos_painel(painel: PainelExecucao) -> dict:
+    """Valores formatados de cada cartão do painel."""
+    receber, tramitar = painel.etapas["receber"], painel.etapas["tramitar"]
+    taxa = painel.ritmo()
+    eta = painel.previsao()
+    if eta is None:
+        termino = "—"
+    elif eta == 0:
+        termino = "concluído"
+    else:
+        hora = (datetime.datetime.now() + datetime.timedelta(seconds=eta)).strftime("%H:%M")
+        termino = f"{_formatar_duracao(eta)} (~{hora})"
+    return {
+        "receber": f"{receber['feitos']}/{receber['total']}",
+        "tramitar": f"{tramitar['feitos']}/{tramitar['total']}",
+        "ritmo": f"{taxa:.1f}/min" if taxa else "—",
+        "mediana": _formatar_duracao(painel.mediana()),
+        "falhas": f"{painel.falhas}" + (f" (+{painel.pulados} pul.)" if painel.pulados else ""),
+        "eta": termino,
+    }
 
-        driver.implicitly_wait(2)
-        wait = WebDriverWait(driver, 5, poll_frequency=0.3)
-        
-        registrar_log("Chrome conectado com sucesso")
-        atualizar_status("✅ Chrome conectado!")
-        progress.set(0.15)
 
-        # ========== 1️⃣ Abrir Benefício > Concessão ==========
-        atualizar_status("📂 Acessando módulo Benefício → Concessão...")
-        progress.set(0.2)
-        registrar_log("Tentando abrir Concessão por URL direta (com fallback no menu)...")
+# ==============================
+# ORQUESTRADOR ASSÍNCRONO (ASYNCIO)
+# ==============================
 
-        if not abrir_concessao(driver, wait):
-            raise RuntimeError("Não foi possível abrir a tela de Concessão.")
-        
-        # ========== 2️⃣ Selecionar setor (ou pular se já estiver dentro) ==========
-        estado = obter_estado_concessao(driver)
-        if estado == "dentro_setor":
-            registrar_log("Detectado que já estamos dentro do setor; pulando seleção de setor.")
-            atualizar_status("🏢 Setor já selecionado. Continuando…")
-        elif estado == "selecionar_setor":
-            atualizar_status("🏢 Selecionando setor UECI…")
-            progress.set(0.3)
-            registrar_log("Aguardando seletor de setor carregar…")
+_fila_gui = queue.Queue()
+_orquestracao = {"loop": None, "tarefa": None}
 
-            try:
-                seletor_setor = WebDriverWait(driver, 8, poll_frequency=0.2).until(
-                    EC.presence_of_element_located((By.ID, "ctl00_ContentCampos_ddlSetor"))
-                )
-            except Exception:
-                # Se o seletor sumiu, reavalia o estado; talvez já entrou no setor
-                if obter_estado_concessao(driver) == "dentro_setor":
-                    registrar_log("Seletor não está mais presente; já entramos no setor. Prosseguindo…")
-                else:
-                    raise
 
-            if obter_estado_concessao(driver) == "selecionar_setor":
-                try:
-                    sel = Select(seletor_setor)
-                    try:
-                        registrar_log("Seletor encontrado, selecionando UECI (valor 59)…")
-                        sel.select_by_value("59")
-                    except NoSuchElementException:
-                        opts = [o for o in sel.options if 'UECI' in (o.text or '').upper()]
-                        if opts:
-                            registrar_log("Opção 59 não encontrada; selecionando opção que contém 'UECI'.")
-                            sel.select_by_visible_text(opts[0].text)
-                        else:
-                            registrar_log("[Aviso] Opção de setor UECI não encontrada no seletor.")
+def publicar_gui(funcao, *args):
+    """Agenda `funcao(*args)` no laço do Tk (drenado por _drenar_fila_gui); seguro de qualquer thread."""
+    _fila_gui.put((funcao, args))
 
-                    # Clica OK para confirmar a entrada no setor
-                    try:
-                        registrar_log("Procurando botão OK…")
-                        btn_ok = driver.find_element(By.ID, "ctl00_ContentCampos_Button1")
-                        registrar_log("Botão OK encontrado, clicando…")
-                        driver.execute_script("arguments[0].click();", btn_ok)
-                        # Aguarda as caixas de processos aparecerem
-                        WebDriverWait(driver, 10, poll_frequency=0.3).until(
-                            lambda d: d.find_elements(By.ID, "ctl00_ContentCampos_AccordionPane2_header_lblProcessoSetor")
-                                     or d.find_elements(By.ID, "ctl00_ContentCampos_AccordionPane1_header_lblProcessoReceber")
-                        )
-                        registrar_log("Setor UECI selecionado com sucesso!")
-                    except Exception as e:
-                        # Reavalia o estado: se já estiver dentro, segue; caso contrário, propaga o erro
-                        if obter_estado_concessao(driver) == "dentro_setor":
-                            registrar_log(f"[Aviso] Não foi possível acionar OK, porém já estamos dentro do setor: {e}")
-                        else:
-                            raise
-                except Exception as e:
-                    # Se falhou selecionar, mas já estiver dentro, segue
-                    if obter_estado_concessao(driver) == "dentro_setor":
-                        registrar_log(f"[Aviso] Falha ao selecionar setor, mas já estamos dentro: {e}")
-                    else:
-                        raise
-        else:
-            registrar_log("[Aviso] Estado da tela de Concessão não identificado claramente. Prosseguindo com melhor esforço…")
 
-        # ========== 3️⃣ Processos a Receber ==========
-        atualizar_status("📦 Verificando processos a receber...")
-        progress.set(0.4)
-        try:
-            # Expande a seção "30 Últimos Processos a Receber"
-            btn_receber_box = wait.until(EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_AccordionPane1_header_lblProcessoReceber")))
-            driver.execute_script("arguments[0].click();", btn_receber_box)
-            time.sleep(0.8)
+def cancelar_orquestracao(espera: float = 0.0):
+    """Cancela a orquestração assíncrona em andamento (ex.: ao fechar o app). Com `espera`,
+    aguarda no máximo esse tempo (s) pelo fechamento das abas antes de retornar.
+    """
+    loop, tarefa = _orquestracao["loop"], _orquestracao["tarefa"]
+    if loop is None or tarefa is None or loop.is_closed():
+        return
+    try:
+        loop.call_soon_threadsafe(tarefa.cancel)
+    except RuntimeError:
+        return  # laço encerrado entre a checagem e o agendamento
+    limite = time.monotonic() + espera
+    while _orquestracao["tarefa"] is not None and time.monotonic() < limite:
+        time.sleep(0.1)
 
-            # Busca novamente os checkboxes após abrir
-            caixas = driver.find_elements(By.XPATH, "//input[contains(@id,'chk_receber')]")
 
-            if caixas:
-                # Descobre o índice da coluna "Setor Enviou" pelo cabeçalho da tabela (quando possível)
-                col_setor = -1
-                try:
-                    tabela = driver.find_element(By.XPATH, "//table[.//input[contains(@id,'chk_receber')]]")
-                    cabec = tabela.find_elements(By.XPATH, ".//tr[1]/*[self::th or self::td]")
-                    for idx, th in enumerate(cabec):
-                        txt = (th.text or "").strip().lower()
-                        if "setor" in txt and "enviou" in txt:
-                            col_setor = idx
-                            break
-                except Exception:
-                    col_setor = -1
+def _executar_no_canal(funcao, args, processo):
+    definir_processo_log(processo)
+    try:
+        return funcao(*args)
+    finally:
+        definir_processo_log(None)
 
-                atualizar_status(f"Encontrados {len(caixas)} processo(s) a receber. Marcando conforme regra...")
-                for i in range(len(caixas)):
-                    try:
-                        # Rebusca o elemento a cada iteração para evitar stale reference
-                        caixa = driver.find_elements(By.XPATH, "//input[contains(@id,'chk_receber')]")[i]
-
-                        # Obtém o texto da coluna "Setor Enviou" correspondente à linha deste checkbox
-                        setor_txt = ""
-                        try:
-                            linha = caixa.find_element(By.XPATH, "./ancestor::tr[1]")
-                            if col_setor >= 0:
-                                tds = linha.find_elements(By.XPATH, "./td")
-                                if col_setor < len(tds):
-                                    setor_txt = (tds[col_setor].text or "").strip()
-                            if not setor_txt:
-                                setor_txt = (linha.text or "").strip()
-                        except Exception as e:
-                            registrar_log(f"[Aviso] Falha ao obter 'Setor Enviou' da linha: {e}")
-
-                        # Normaliza e aplica regra de bloqueio (considera variações como C.P.A.D, C P A D, etc.)
-                        s = (setor_txt or "").upper()
-                        s_norm = _normalize_text(setor_txt)
-
-                        bloquear_cpad = ("CPAD" in s) or ("CPAD" in s_norm)
-                        bloquear_coord = (
-                            ("COORDENA" in s and "PROTOCOLO" in s and "ARQUIVO" in s and "DOCUMENTAL" in s)
-                            or ("COORDENACAO" in s_norm and "PROTOCOLO" in s_norm and "ARQUIVO" in s_norm and "DOCUMENTAL" in s_norm)
-                        )
-                        bloquear = bloquear_cpad or bloquear_coord
 
-                        if bloquear:
-                            registrar_log(f"[Skip] Processo NÃO recebido (Setor Enviou='{setor_txt}')")
-                            continue
+class CanalNavegador:
+    """Canal assíncrono para uma aba. Os comandos bloqueantes do Selenium rodam na thread
+    própria da aba (uma thread daemon com fila, que também serializa o acesso à sessão); o
+    laço de eventos apenas aguarda o resultado. A thread é daemon de propósito: um comando
+    preso no navegador não pode impedir o app de encerrar.
+    """
 
-                        # Marca a caixa para receber
-                        driver.execute_script("arguments[0].scrollIntoView(true);", caixa)
-                        driver.execute_script("arguments[0].click();", caixa)
-                        time.sleep(0.1)
-                    except Exception as e:
-                        registrar_log(f"[Aviso] Erro ao analisar/marcar caixa {i+1}: {e}")
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.driver = None
+        self.wait = None
+        self.governador = None
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._trabalhar, name=f"ueci-{nome}", daemon=True)
+        self._thread.start()
+
+    def _trabalhar(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                return
+            futuro, funcao, args, processo = item
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            try:
+                futuro.set_result(_executar_no_canal(funcao, args, processo))
+            except BaseException as e:
+                futuro.set_exception(e)
+
+    async def chamar(self, funcao, *args, processo: str | None = None):
+        futuro = concurrent.futures.Future()
+        self._fila.put((futuro, funcao, args, processo))
+        return await asyncio.wrap_future(futuro)
+
+    def _cancelar_pendentes(self):
+        """Cancela os comandos que ainda não começaram a rodar."""
+        while True:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[0].cancel()
+
+    def _abrir(self, contador):
+        self.driver = abrir_aba_trabalho(contador)
+        self.wait = WebDriverWait(self.driver, 5, poll_frequency=0.3)
+        with VIGIA.etapa("entrar_no_setor", self.driver):
+            entrar_no_setor(self.driver, self.wait)
+        abrir_lista_setor(self.driver, self.wait)
+        self.governador = GovernadorMemoria(self.driver, self.wait)
+
+    async def abrir(self, contador=None):
+        await self.chamar(self._abrir, contador)
+        return self
+
+    async def fechar(self):
+        # Comandos ainda na fila não chegam a tocar a aba que vai ser fechada
+        self._cancelar_pendentes()
+        if self.driver is not None:
+            try:
+                await asyncio.wait_for(self.chamar(fechar_aba_trabalho, self.driver), ASYNC_FECHAR_TIMEOUT)
+            except asyncio.TimeoutError:
+                registrar_log(f"[Aviso] Aba {self.nome} não fechou em {ASYNC_FECHAR_TIMEOUT:.0f}s; abandonando a thread da aba.")
+            except BaseException:
+                pass
+        self._cancelar_pendentes()
+        self._fila.put(None)  # a thread sai assim que o comando atual (se houver) terminar
+
+
+async def fluxo_processo(canal: CanalNavegador, numero: str, responsavel, cpf, disjuntor, reservas=None) -> bool | None:
+    """Fluxo de um processo como corrotina (abrir → TCE → despacho/tramitar → relatório → lista).
+    Cada etapa roda no canal da aba; as pausas do disjuntor e o backoff das retentativas são
+    assíncronos e não prendem a thread da aba. Retorno igual ao de processar_processo.
+    """
+    driver, wait = canal.driver, canal.wait
+    if not await canal.chamar(_reservar_processo, reservas, numero, processo=numero):
+        return None
+    concluido = False
+    tentativa = 0
+    try:
+        while True:
+            pausa = disjuntor.pausa_restante()
+            if pausa > 0:
+                # Pausa em trechos menores que o TTL, renovando a reserva no meio
+                publicar_gui(_avisar_pausa_disjuntor, pausa)
+                await asyncio.sleep(_trecho_pausa(reservas, pausa))
+                if not await canal.chamar(_manter_reserva, reservas, numero, processo=numero):
+                    return None
+                continue
+            # Orçamento por tentativa, depois da pausa: nem o disjuntor nem o backoff o consomem
+            orcamento = Orcamento(ORCAMENTO_PROCESSO)
+            andamento = novo_andamento()
+            try:
+                t_proc = time.perf_counter()
+                for nome, etapa in etapas_processo(driver, wait, numero, responsavel, cpf, orcamento, andamento):
+                    if not await canal.chamar(_manter_reserva, reservas, numero, processo=numero) and not andamento["enviado"]:
+                        return None
+                    if await canal.chamar(executar_etapa, nome, driver, etapa, processo=numero) is False:
+                        return None
+                METRICAS.observar("ueci_etapa_segundos", time.perf_counter() - t_proc, etapa="processo_total")
+                METRICAS.incrementar("ueci_processos_tramitados_total")
+                disjuntor.registrar_sucesso()
+                concluido = True
+                return True
+            except Exception as e:
+                if andamento["enviado"] and await canal.chamar(confirmar_apos_envio, driver, wait, numero, e,
+                                                               andamento, processo=numero):
+                    METRICAS.incrementar("ueci_processos_tramitados_total")
+                    disjuntor.registrar_sucesso()
+                    concluido = True
+                    return True
+                classe = await canal.chamar(tratar_falha_processo, driver, wait, numero, e, disjuntor, tentativa, processo=numero)
+                tentativa += 1
+                if tentativa >= max_tentativas(classe):
+                    return False
+                await asyncio.sleep(calcular_espera(classe, tentativa - 1))
+    finally:
+        await canal.chamar(_encerrar_reserva, reservas, numero, concluido, processo=numero)
+
+
+def _receber_lote(driver, wait) -> int:
+    with METRICAS.medir("receber_lote"), VIGIA.etapa("receber", driver):
+        return receber_processos(driver, wait, limite=PIPELINE_LOTE)
 
-                # Clicar no botão "Receber Processos Selecionados"
+
+async def orquestrar_async(responsavel, cpf, contador=None) -> dict:
+    """Orquestrador assíncrono: uma aba recebe em lotes e alimenta uma fila de prioridade
+    limitada (backpressure, ordem por UECI_PRIORIDADE); ASYNC_ABAS corrotinas consumidoras tramitam cada uma em sua aba.
+    Cancelável via cancelar_orquestracao(); o status chega à interface por publicar_gui.
+    """
+    _orquestracao.update(loop=asyncio.get_running_loop(), tarefa=asyncio.current_task())
+    fila = asyncio.PriorityQueue(maxsize=max(1, ASYNC_FILA))
+    enfileirados = set()
+    resultado = {"total": 0, "tramitados": 0, "falhas": 0, "pulados": 0, "recebidos": 0}
+    disjuntor = DisjuntorServidor()
+    reservas = await asyncio.get_running_loop().run_in_executor(None, abrir_reservas)
+
+    canais = [CanalNavegador("receber")] + [CanalNavegador(f"aba{i}") for i in range(1, max(1, ASYNC_ABAS) + 1)]
+    try:
+        abertos = await asyncio.gather(*(c.abrir(contador) for c in canais), return_exceptions=True)
+        for canal, r in zip(canais, abertos):
+            if isinstance(r, Exception):
+                registrar_log(f"[Erro] Não foi possível preparar a aba '{canal.nome}': {r}")
+        if isinstance(abertos[0], Exception):
+            raise abertos[0]
+        receptor = canais[0]
+        trabalhadores = [c for c, r in zip(canais[1:], abertos[1:]) if not isinstance(r, Exception)]
+        if not trabalhadores:
+            raise RuntimeError("Nenhuma aba de tramitação disponível.")
+
+        async def enfileirar_novos():
+            for item in ordenar_por_prioridade(await receptor.chamar(listar_processos_setor, receptor.driver)):
+                if item["numero"] in enfileirados:
+                    continue
+                enfileirados.add(item["numero"])
+                resultado["total"] += 1
+                evento_painel("total", "tramitar")
+                await fila.put(entrada_fila(item))   # espera enquanto a fila estiver cheia
+
+        async def produtor():
+            cancelado = False
+            try:
+                await enfileirar_novos()
+                while True:
+                    n = await receptor.chamar(_receber_lote, receptor.driver, receptor.wait)
+                    resultado["recebidos"] += n
+                    if n:
+                        registrar_log(f"[Pipeline] Lote de {n} processo(s) recebido(s).")
+                    await receptor.chamar(abrir_lista_setor, receptor.driver, receptor.wait)
+                    await enfileirar_novos()
+                    if not n:
+                        break
+            except asyncio.CancelledError:
+                cancelado = True
+                raise
+            except Exception as e:
+                registrar_log(f"[Erro] Recebimento interrompido: {e}")
+            finally:
+                if not cancelado:
+                    for _ in trabalhadores:
+                        await fila.put(entrada_fila(None))
+
+        async def consumidor(canal):
+            while True:
+                _, _, numero = await fila.get()
+                if numero is None:
+                    return
+                t0 = time.monotonic()
                 try:
-                    btn_receber_lote = wait.until(
-                        EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_AccordionPane1_content_imgBtnRecebeLote"))
-                    )
-                    driver.execute_script("arguments[0].click();", btn_receber_lote)
-                    atualizar_status("Aguardando confirmação do recebimento...")
-                    
-                    # Espera e trata o alerta "Processo recebido com sucesso!"
-                    try:
-                        WebDriverWait(driver, 5).until(EC.alert_is_present())
-                        alerta = driver.switch_to.alert
-                        msg = alerta.text
-                        registrar_log(f"[Alerta] {msg}")
-                        alerta.accept()
-                        atualizar_status("Processos recebidos com sucesso.")
-                        time.sleep(0.5)
-                    except Exception:
-                        atualizar_status("Nenhum alerta exibido após o recebimento.")
-                        time.sleep(0.3)
+                    ok = await fluxo_processo(canal, numero, responsavel, cpf, disjuntor, reservas)
+                    if ok is not None:
+                        await canal.chamar(canal.governador.apos_processo)
                 except Exception as e:
-                    atualizar_status(f"Falha ao clicar em 'Receber Processos Selecionados': {e}")
+                    registrar_log(f"[Erro] Falha inesperada no fluxo do processo {numero} ({canal.nome}): {e}")
+                    ok = False
+                resultado["pulados" if ok is None else "tramitados" if ok else "falhas"] += 1
+                evento_painel("feito", "tramitar", ok=ok, segundos=time.monotonic() - t0)
+                feitos = resultado["tramitados"] + resultado["falhas"] + resultado["pulados"]
+                publicar_gui(atualizar_status, f"⚙️ Orquestrador: {feitos}/{resultado['total']} processo(s) tratados…")
+
+        await asyncio.gather(produtor(), *(consumidor(c) for c in trabalhadores), return_exceptions=True)
+    except asyncio.CancelledError:
+        registrar_log("[Aviso] Orquestração cancelada.")
+        raise
+    finally:
+        await asyncio.gather(*(c.fechar() for c in canais), return_exceptions=True)
+        _orquestracao.update(loop=None, tarefa=None)
+    registrar_log(f"[Pipeline] Recebidos={resultado['recebidos']} Tramitados={resultado['tramitados']} Falhas={resultado['falhas']} Pulados={resultado['pulados']}")
+    return resultado
 
-            else:
-                atualizar_status("Nenhum processo encontrado para receber.")
 
-        except Exception as e:
-            atualizar_status(f"Erro ao acessar a caixa de 'Processos a Receber': {e}")
+def resumo_conclusao(resultado: dict) -> str:
+    """Linha de log do fim da execução (pipeline/assíncrono): sucesso só sem falhas."""
+    if resultado.get("falhas"):
+        return (f"[Aviso] Execução concluída com {resultado['falhas']} falha(s): "
+                f"{resultado.get('tramitados', 0)} tramitado(s), {resultado.get('pulados', 0)} pulado(s).")
+    return "Todos os processos concluídos com sucesso."
 
-        # -------------- ETAPA 4: PROCESSOS DENTRO DO SETOR ----------------
-        atualizar_status("⚙️ Processando processos dentro do setor...")
-        print("Verificando processos dentro do setor...")
-        try:
-            btn_dentro_setor = wait.until(
-                EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_AccordionPane2_header_lblProcessoSetor"))
-            )
-            driver.execute_script("arguments[0].click();", btn_dentro_setor)
-            time.sleep(0.8)
 
-            # Captura todos os botões "Editar" e "Abrir"
-            botoes = driver.find_elements(By.XPATH,
-                "//input[contains(@id,'AccordionPane2_content_grdProcessoSetor') and (contains(@id,'imgbtnEdit') or contains(@id,'imgbtnAbrir'))]"
-            )
+def automatizar(responsavel, cpf):
+    contador = ContabilizadorComandos()
+    gravador = None
+    try:
+        atualizar_status("🚀 Iniciando automação...")
+        definir_progresso(0.05)
+        evento_painel("inicio")
+        registrar_log(f"Iniciado por {USUARIO_PC}")
+        registrar_log(f"Responsável Controle Interno: {responsavel} - {cpf}")
+        if PRIORIDADE_POLITICA not in POLITICAS_PRIORIDADE:
+            registrar_log(f"[Aviso] UECI_PRIORIDADE='{PRIORIDADE_POLITICA}' desconhecida; usando a ordem do grid "
+                          f"(válidas: {', '.join(POLITICAS_PRIORIDADE)}).")
 
-            if botoes:
-                print(f"Encontrados {len(botoes)} processo(s) dentro do setor. Iniciando tramitação...")
+        # Modelos de despacho relidos a cada execução (renderização fica em cache durante a execução)
+        carregar_despachos()
 
-                for index, botao in enumerate(botoes, start=1):
-                    try:
-                        try:
-                            driver.execute_script("arguments[0].scrollIntoView(true);", botao)
-                            driver.execute_script("arguments[0].click();", botao)
-                        except:
-                            # Recarrega e tenta clicar de novo caso o elemento tenha sumido
-                            botoes = driver.find_elements(By.XPATH,
-                                "//input[contains(@id,'AccordionPane2_content_grdProcessoSetor') and (contains(@id,'imgbtnEdit') or contains(@id,'imgbtnAbrir'))]"
-                            )
-                            if len(botoes) >= index:
-                                botao = botoes[index - 1]
-                                driver.execute_script("arguments[0].scrollIntoView(true);", botao)
-                                driver.execute_script("arguments[0].click();", botao)
-
-                        time.sleep(1)
-
-                        # Preenche campos e tramita
-                        preencher_informacoes_controle_interno(driver, wait, responsavel, cpf)
-                        tramitar_para_presidente(driver, wait, responsavel)
-
-                        # Aguarda retorno para a lista principal
-                        driver.back()
-                        time.sleep(1)
-
-                        # Recarrega lista para evitar stale elements
-                        btn_dentro_setor = wait.until(
-                            EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_AccordionPane2_header_lblProcessoSetor"))
-                        )
-                        driver.execute_script("arguments[0].click();", btn_dentro_setor)
-                        time.sleep(0.8)
+        atualizar_status("🔗 Conectando ao Chrome...")
+        definir_progresso(0.1)
 
-                        botoes = driver.find_elements(By.XPATH,
-                            "//input[contains(@id,'AccordionPane2_content_grdProcessoSetor') and (contains(@id,'imgbtnEdit') or contains(@id,'imgbtnAbrir'))]"
-                        )
+        if ASYNC_ATIVO:
+            atualizar_status(f"⚙️ Orquestrador assíncrono: recebimento + {ASYNC_ABAS} aba(s) de tramitação…")
+            _sessao_iniciada_em["t"] = time.time()
+            try:
+                resultado = asyncio.run(orquestrar_async(responsavel, cpf, contador))
+            except asyncio.CancelledError:
+                return
+            definir_progresso(1.0)
+            publicar_gui(atualizar_status, f"✅ Orquestração concluída: {resultado['tramitados']} tramitado(s), {resultado['falhas']} falha(s).")
+            registrar_log(resumo_conclusao(resultado))
+            return
+
+        if PIPELINE_ATIVO:
+            atualizar_status(f"⚙️ Modo pipeline: recebimento + {PIPELINE_ABAS} aba(s) de tramitação…")
+            _sessao_iniciada_em["t"] = time.time()
+            resultado = automatizar_pipeline(responsavel, cpf, contador)
+            definir_progresso(1.0)
+            atualizar_status(f"✅ Pipeline concluído: {resultado['tramitados']} tramitado(s), {resultado['falhas']} falha(s).")
+            registrar_log(resumo_conclusao(resultado))
+            return
+
+        driver, reaproveitado = obter_driver(contador)
+        if GRAVACAO_ARQUIVO:
+            gravador = GravadorFixtures(GRAVACAO_ARQUIVO)
+            gravador.instrumentar(driver)
+        _sessao_iniciada_em["t"] = time.time()
+        wait = WebDriverWait(driver, ESPERA_ELEMENTO, poll_frequency=0.3)
 
-                    except Exception as e:
-                        print(f"[Erro] Falha ao tramitar processo {index}: {e}")
-                        driver.get(f"{BASE_URL}/ProcessoBeneficio/ConProcessoBeneficio.aspx")
-                        time.sleep(3)
-                        continue
+        registrar_log("Chrome conectado com sucesso")
+        atualizar_status("✅ Chrome conectado!")
+        definir_progresso(0.15)
+
+        # ========== 1️⃣/2️⃣ Benefício > Concessão e setor ==========
+        atualizar_status("📂 Acessando módulo Benefício → Concessão...")
+        definir_progresso(0.2)
+        if reaproveitado and ja_dentro_do_setor(driver):
+            registrar_log("Página de Concessão da execução anterior já está dentro do setor; pulando abertura.")
+        else:
+            with VIGIA.etapa("entrar_no_setor", driver):
+                entrar_no_setor(driver, wait)
 
-                print("Todos os processos foram tramitados com sucesso!")
+        # ========== 3️⃣ Processos a Receber ==========
+        atualizar_status("📦 Verificando processos a receber...")
+        definir_progresso(0.4)
+        with VIGIA.etapa("receber", driver):
+            receber_processos(driver, wait)
 
-            else:
+        # -------------- ETAPA 4: PROCESSOS DENTRO DO SETOR ----------------
+        atualizar_status("⚙️ Processando processos dentro do setor...")
+        print("Verificando processos dentro do setor...")
+        try:
+            resultado = tramitar_processos_do_setor(driver, wait, responsavel, cpf, reservas=abrir_reservas())
+            if not resultado["total"]:
                 # Nenhum processo na caixa do setor → avisa e encerra após 5s
                 registrar_log("Nenhum processo encontrado na caixa 'Dentro do Setor'. Encerrando em 5s...")
                 atualizar_status("Nenhum processo na caixa do setor.")
                 mostrar_aviso_e_encerrar("não há mais processos para tramitação na caixa do setor", segundos=5)
                 return
-
+            print("Todos os processos foram tramitados com sucesso!")
         except Exception as e:
             print(f"Erro ao acessar a caixa de 'Processos dentro do Setor': {e}")
+            registrar_log(f"[Erro] Erro ao acessar a caixa de 'Processos dentro do Setor': {e}")
 
-            # ========== 5️⃣ Mais informações ==========
-            aba_info = wait.until(EC.element_to_be_clickable((By.XPATH, "//*[@id='__tab_ctl00_ContentCampos_TabContainer1_tabTCE']")))
-            aba_info.click()
-            time.sleep(6)
-
-            # Parecer Controle Interno
-            select_parecer = wait.until(EC.element_to_be_clickable((By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_parecerControleInternoTCE")))
-            Select(select_parecer).select_by_visible_text("Não foi objeto do exame")
-
-            # CPF e Nome
-            driver.execute_script("document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_txtCPFRespControleInternoTCE').removeAttribute('disabled');")
-            driver.execute_script("document.getElementById('ctl00_ContentCampos_TabContainer1_tabTCE_txtNomeRespControleInternoTCE').removeAttribute('disabled');")
-            campo_cpf = driver.find_element(By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_txtCPFRespControleInternoTCE")
-            campo_nome = driver.find_element(By.ID, "ctl00_ContentCampos_TabContainer1_tabTCE_txtNomeRespControleInternoTCE")
-            campo_cpf.clear()
-            campo_cpf.send_keys(cpf)
-            campo_nome.clear()
-            campo_nome.send_keys(responsavel)
-
-            btn_salvar = driver.find_element(By.ID, "ctl00_ContentToolBar_btnSalvar")
-            btn_salvar.click()
-            time.sleep(2)
-
-            # ========== 6️⃣ Tramitar ==========
-            btn_tramitar = driver.find_element(By.ID, "ctl00_ContentToolBar_btnTramitar")
-            btn_tramitar.click()
-            time.sleep(3)
-
-            # Despacho e Setor
-            select_despacho = Select(wait.until(EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_ddlDespacho"))))
-            select_despacho.select_by_value("4")
-
-            select_setor = Select(wait.until(EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_ddlSetor"))))
-            select_setor.select_by_value("15")
+        definir_progresso(1.0)
+        atualizar_status("✅ Todos os processos foram tramitados com sucesso!")
+        registrar_log("Todos os processos concluídos com sucesso.")
 
-            # Corpo da tramitação
-            texto_tramitacao = f"""Ao Gabinete do Presidente Executivo,
+    except Exception as e:
+        atualizar_status(f"❌ Erro: {str(e)}")
+        registrar_log(f"Erro: {str(e)}")
+        definir_progresso(0)
+    finally:
+        definir_processo_log(None)
+        _sessao_iniciada_em["t"] = None
+        if contador.total[0]:
+            registrar_log("[Resumo] " + contador.resumo())
+        if gravador:
+            try:
+                gravador.finalizar()
+            except Exception as e:
+                registrar_log(f"[Aviso] Falha ao finalizar a gravação de fixtures: {e}")
+        # Conclui as gravações pendentes (pacotes de falha); a sessão do Chrome fica aquecida
+        # para a próxima execução e só é encerrada na saída do app (descartar_driver)
+        aguardar_io(timeout=5)
 
-Encaminha-se, para assinatura, o ato constante da minuta anexa ao processo.
+# ==============================
+# PERFIL DE EXECUÇÃO (AMOSTRAGEM)
+# ==============================
 
-Registre-se que a análise desta Unidade de Controle Interno quanto às concessões de aposentadoria, reserva remunerada, reforma e pensão, nos termos do Anexo VII da Instrução Normativa TCE nº 68, de 8 de dezembro de 2020, ainda depende de regulamentação específica, razão pela qual não houve emissão de parecer técnico sobre o presente ato.
+def _rotulo_quadro(codigo) -> str:
+    nome = getattr(codigo, "co_qualname", codigo.co_name).replace(";", ",")
+    return f"{os.path.basename(codigo.co_filename)}:{nome}"
 
-Respeitosamente,
 
-    {responsavel.upper()}"""
+class PerfilAmostral:
+    """Profiler por amostragem das threads de automação (pilhas via sys._current_frames).
+    Durante a coleta, time.sleep passa por um wrapper para que o tempo ocioso apareça como
+    categoria própria. Ao final grava, em PERFIL_DIR/<data_hora>/, as pilhas dobradas
+    (pilhas.folded), o flame graph (flamegraph.svg) e a tabela das funções mais caras (top.txt).
+    """
 
-            corpo = wait.until(EC.element_to_be_clickable((By.ID, "ctl00_ContentToolBar_txtObservacao")))
-            corpo.clear()
-            corpo.send_keys(texto_tramitacao)
+    RAIZES = {"automatizar", "estagio_receber", "estagio_tramitar", "_executar_no_canal"}
+    # Avaliadas da folha para a raiz: o primeiro quadro que casar define a categoria da amostra
+    CATEGORIAS = (
+        ("sleep", lambda arq, nome: nome == "_dormir_perfilado"),
+        ("log", lambda arq, nome: nome in ("registrar_log", "_rotacionar_log_se_preciso")),
+        ("tk", lambda arq, nome: nome == "atualizar_status" or "tkinter" in arq),
+        ("json", lambda arq, nome: os.path.join("json", "") in arq),
+        ("rede", lambda arq, nome: any(m in arq for m in ("urllib3", "socket.py", "ssl.py", os.path.join("http", "client.py")))),
+        ("normalizacao", lambda arq, nome: nome == "_normalize_text"),
+    )
+
+    def __init__(self, intervalo: float = PERFIL_INTERVALO):
+        self.intervalo = intervalo
+        self.pilhas = collections.Counter()   # tupla de code objects (raiz → folha) -> amostras
+        self.rodadas = 0
+        self._parar = threading.Event()
+        self._thread = None
+        self._sleep_original = None
+        self._inicio = 0.0
+        self.duracao = 0.0
+
+    def __enter__(self):
+        original = self._sleep_original = time.sleep
+
+        def _dormir_perfilado(segundos):
+            original(segundos)
+
+        time.sleep = _dormir_perfilado
+        self._inicio = time.perf_counter()
+        self._thread = threading.Thread(target=self._amostrar, name="ueci-perfil", daemon=True)
+        self._thread.start()
+        registrar_log(f"[Perfil] Amostragem iniciada ({1 / self.intervalo:.0f} Hz)")
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join(timeout=2)
+        time.sleep = self._sleep_original
+        self.duracao = time.perf_counter() - self._inicio
+        try:
+            pasta = self.exportar()
+            if pasta:
+                registrar_log(f"[Perfil] {sum(self.pilhas.values())} amostra(s) em {self.duracao:.1f}s; relatório em {pasta}")
+        except Exception as e:
+            registrar_log(f"[Aviso] Falha ao exportar o perfil: {e}")
+        return False
 
-            btn_tramitar_final = driver.find_element(By.ID, "ctl00_ContentToolBar_Button1")
-            btn_tramitar_final.click()
-            time.sleep(2)
-            
-            # Trata o alerta após tramitar
-            try:
-                WebDriverWait(driver, 5).until(EC.alert_is_present())
-                alerta = driver.switch_to.alert
-                print(f"[Alerta] {alerta.text}")
-                alerta.accept()
-                time.sleep(1)
-            except:
-                pass
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            self.rodadas += 1
+            for ident, quadro in sys._current_frames().items():
+                if ident == proprio:
+                    continue
+                codigos = []
+                while quadro is not None:
+                    codigos.append(quadro.f_code)
+                    quadro = quadro.f_back
+                # Corta o bootstrap da thread/Tk: a pilha começa na raiz de automação mais externa
+                raiz = next((i for i in range(len(codigos) - 1, -1, -1) if codigos[i].co_name in self.RAIZES), None)
+                if raiz is None:
+                    continue
+                self.pilhas[tuple(reversed(codigos[:raiz + 1]))] += 1
+
+    def _categoria(self, codigos) -> str:
+        for codigo in reversed(codigos):
+            arq, nome = codigo.co_filename, codigo.co_name
+            for categoria, casa in self.CATEGORIAS:
+                if casa(arq, nome):
+                    return categoria
+        return "python"
+
+    def exportar(self) -> str | None:
+        if not self.pilhas:
+            return None
+        pasta = os.path.join(PERFIL_DIR, f"{datetime.datetime.now():%Y%m%d_%H%M%S}")
+        os.makedirs(pasta, exist_ok=True)
+        por_amostra = self.duracao / max(self.rodadas, 1)
+
+        dobradas = collections.Counter()
+        categorias = collections.Counter()
+        proprio = collections.Counter()
+        inclusivo = collections.Counter()
+        for codigos, n in self.pilhas.items():
+            rotulos = [_rotulo_quadro(c) for c in codigos]
+            categoria = self._categoria(codigos)
+            categorias[categoria] += n
+            proprio[rotulos[-1]] += n
+            for rotulo in set(rotulos):
+                inclusivo[rotulo] += n
+            dobradas[";".join(rotulos + [f"[{categoria}]"])] += n
+
+        with open(os.path.join(pasta, "pilhas.folded"), "w", encoding="utf-8") as f:
+            for pilha, n in sorted(dobradas.items()):
+                f.write(f"{pilha} {n}\n")
+        with open(os.path.join(pasta, "flamegraph.svg"), "w", encoding="utf-8") as f:
+            f.write(_flamegraph_svg(dobradas, f"UECI — {self.duracao:.1f}s, {sum(dobradas.values())} amostras"))
+
+        total = sum(self.pilhas.values())
+        linhas = [
+            f"Duração: {self.duracao:.1f}s | amostras: {total} | intervalo efetivo: {por_amostra * 1000:.1f} ms",
+            "",
+            "Categoria                 amostras       s       %",
+        ]
+        for categoria, n in categorias.most_common():
+            linhas.append(f"{categoria:<24} {n:>9} {n * por_amostra:>7.1f} {100 * n / total:>6.1f}")
+        for titulo, contagem in (("Tempo próprio (folha)", proprio), ("Tempo inclusivo", inclusivo)):
+            linhas += ["", f"{titulo} — top {PERFIL_TOP}", "amostras       s       %  função"]
+            for rotulo, n in contagem.most_common(PERFIL_TOP):
+                linhas.append(f"{n:>8} {n * por_amostra:>7.1f} {100 * n / total:>6.1f}  {rotulo}")
+        with open(os.path.join(pasta, "top.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(linhas) + "\n")
+        return pasta
+
+
+def _flamegraph_svg(dobradas: dict, titulo: str, largura: int = 1200, altura_quadro: int = 16) -> str:
+    """Flame graph SVG simples (raiz embaixo) a partir de pilhas dobradas {'a;b;c': amostras}."""
+    arvore = {"n": 0, "filhos": {}}
+    for pilha, n in dobradas.items():
+        no = arvore
+        no["n"] += n
+        for nome in pilha.split(";"):
+            no = no["filhos"].setdefault(nome, {"n": 0, "filhos": {}})
+            no["n"] += n
+
+    def profundidade(no):
+        return 1 + max((profundidade(f) for f in no["filhos"].values()), default=0)
+
+    cores = {"[sleep]": "#9e9e9e", "[rede]": "#64b5f6", "[log]": "#81c784", "[tk]": "#ba68c8", "[json]": "#ffb74d"}
+    niveis = profundidade(arvore)
+    altura = (niveis + 2) * altura_quadro
+    escala = largura / max(arvore["n"], 1)
+    partes = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{largura}" height="{altura}" font-family="Verdana" font-size="11">',
+        f'<text x="4" y="{altura_quadro - 3}">{html_lib.escape(titulo)}</text>',
+    ]
+
+    def desenhar(no, nome, x, nivel):
+        w = no["n"] * escala
+        if w < 0.5:
+            return
+        y = altura - (nivel + 1) * altura_quadro
+        h = sum(map(ord, nome))
+        cor = cores.get(nome) or "#%02x%02x%02x" % (220 + h % 36, 90 + (h * 7) % 120, 40)
+        rotulo = html_lib.escape(nome)
+        partes.append(
+            f'<g><title>{rotulo} ({no["n"]} amostras)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{altura_quadro - 1}" fill="{cor}"/>'
+        )
+        if w > 40:
+            caber = int(w / 7)
+            texto = nome if len(nome) <= caber else nome[:max(caber - 2, 1)] + ".."
+            partes.append(f'<text x="{x + 3:.1f}" y="{y + altura_quadro - 4}">{html_lib.escape(texto)}</text>')
+        partes.append("</g>")
+        for filho_nome, filho in sorted(no["filhos"].items()):
+            desenhar(filho, filho_nome, x, nivel + 1)
+            x += filho["n"] * escala
+
+    x = 0.0
+    for nome, filho in sorted(arvore["filhos"].items()):
+        desenhar(filho, nome, x, 0)
+        x += filho["n"] * escala
+    partes.append("</svg>")
+    return "\n".join(partes)
 
-            registrar_log(f"Processo {i} tramitado com sucesso.")
-            driver.back()
-            time.sleep(3)
+# ==============================
+# LINHA DE COMANDO
+# ==============================
 
-        progress.set(1.0)
-        atualizar_status("✅ Todos os processos foram tramitados com sucesso!")
-        registrar_log("Todos os processos concluídos com sucesso.")
+_parser = argparse.ArgumentParser(description="UECI Automação - SISPREV")
+_parser.add_argument("--gravar", metavar="ARQUIVO.zip", help="grava as respostas do SISPREV (anonimizadas) durante a execução")
+_parser.add_argument("--replay", metavar="ARQUIVO.zip", help="serve um arquivo de fixtures localmente em vez de abrir a interface")
+_parser.add_argument("--porta", type=int, default=REPLAY_PORTA, help="porta do servidor de replay")
+_parser.add_argument("--velocidade", type=float, default=1.0, help="fator de velocidade do replay (2 = duas vezes mais rápido)")
+_parser.add_argument("--profile", action="store_true", help="perfila cada execução (flame graph e top-N em UECI_PERFIL_DIR)")
+ARGS, _ = _parser.parse_known_args()
 
-    except Exception as e:
-        atualizar_status(f"❌ Erro: {str(e)}")
-        registrar_log(f"Erro: {str(e)}")
-        progress.set(0)
-    finally:
-        # Garante encerramento do ChromeDriver para evitar arquivos em uso no _MEI* (PyInstaller)
-        try:
-            if driver:
-                driver.quit()
-        except Exception:
-            pass
+if ARGS.gravar:
+    GRAVACAO_ARQUIVO = ARGS.gravar
+if ARGS.replay:
+    servir_replay(ARGS.replay, ARGS.porta, ARGS.velocidade)
+    sys.exit(0)
 
 # ==============================
 # INTERFACE GRÁFICA MODERNA
@@ -1328,6 +4658,7 @@ ctk.set_default_color_theme("blue")
 
 root = ctk.CTk()
 root.title("UECI Automação - SISPREV Inteligente")
+# 700 px de altura: cabe em telas 1366x768 descontando barra de tarefas e título da janela
 root.geometry("900x700")
 root.resizable(False, False)
 
@@ -1335,7 +4666,7 @@ root.resizable(False, False)
 root.configure(fg_color=("#E8EAF6", "#1A1A2E"))
 
 # ========== CABEÇALHO COM ESTILO ==========
-header_frame = ctk.CTkFrame(root, fg_color=("#C5CAE9", "#2D2D44"), corner_radius=20, height=130)
+header_frame = ctk.CTkFrame(root, fg_color=("#C5CAE9", "#2D2D44"), corner_radius=20, height=110)
 header_frame.pack(fill="x", padx=20, pady=(20, 10))
 header_frame.pack_propagate(False)
 
@@ -1343,10 +4674,10 @@ header_frame.pack_propagate(False)
 icon_label = ctk.CTkLabel(
     header_frame, 
     text="✨", 
-    font=ctk.CTkFont(size=45),
+    font=ctk.CTkFont(size=36),
     text_color=("#7E57C2", "#BB86FC")
 )
-icon_label.pack(pady=(10, 0))
+icon_label.pack(pady=(6, 0))
 
 title_label = ctk.CTkLabel(
     header_frame, 
@@ -1400,7 +4731,17 @@ responsavel_menu = ctk.CTkOptionMenu(
     dropdown_hover_color=("#CE93D8", "#5E5E7E"),
     dropdown_text_color=("#4A148C", "#E1BEE7")
 )
-responsavel_menu.pack(pady=(0, 15))
+responsavel_menu.pack(pady=(0, 8))
+
+perfil_var = ctk.BooleanVar(value=ARGS.profile)
+perfil_switch = ctk.CTkSwitch(
+    selection_frame,
+    text="🔬 Perfilar execução (flame graph)",
+    variable=perfil_var,
+    font=ctk.CTkFont(size=12),
+    progress_color=("#9C27B0", "#BB86FC")
+)
+perfil_switch.pack(pady=(0, 12))
 
 # ========== BARRA DE PROGRESSO MODERNA ==========
 progress_frame = ctk.CTkFrame(inner_container, fg_color="transparent")
@@ -1425,20 +4766,50 @@ progress = ctk.CTkProgressBar(
 progress.pack(fill="x")
 progress.set(0)
 
+# ========== PAINEL DE ACOMPANHAMENTO ==========
+painel_frame = ctk.CTkFrame(inner_container, fg_color=("#EDE7F6", "#383854"), corner_radius=15)
+painel_frame.pack(fill="x", pady=(10, 0))
+
+painel_valores = {}
+for coluna, (chave, titulo) in enumerate((
+    ("receber", "Recebidos"),
+    ("tramitar", "Tramitados"),
+    ("ritmo", "Ritmo"),
+    ("mediana", "Mediana/proc."),
+    ("falhas", "Falhas"),
+    ("eta", "Término previsto"),
+)):
+    painel_frame.grid_columnconfigure(coluna, weight=1)
+    ctk.CTkLabel(
+        painel_frame,
+        text=titulo,
+        font=ctk.CTkFont(size=10),
+        text_color=("#7E57C2", "#B39DDB"),
+        height=16
+    ).grid(row=0, column=coluna, padx=6, pady=(6, 0))
+    painel_valores[chave] = ctk.CTkLabel(
+        painel_frame,
+        text="—",
+        font=ctk.CTkFont(size=14, weight="bold"),
+        text_color=("#4A148C", "#E1BEE7"),
+        height=22
+    )
+    painel_valores[chave].grid(row=1, column=coluna, padx=6, pady=(0, 6))
+
 # ========== STATUS COM DESIGN ELEGANTE ==========
 status_frame = ctk.CTkFrame(
     inner_container,
     fg_color=("#EDE7F6", "#383854"),
     corner_radius=15,
-    height=80
+    height=60
 )
-status_frame.pack(fill="x", pady=(15, 20))
+status_frame.pack(fill="x", pady=(10, 10))
 status_frame.pack_propagate(False)
 
 status_icon = ctk.CTkLabel(
     status_frame,
     text="💫",
-    font=ctk.CTkFont(size=30)
+    font=ctk.CTkFont(size=26)
 )
 status_icon.pack(side="left", padx=(20, 10))
 
@@ -1461,20 +4832,148 @@ def iniciar():
     atualizar_status("🔄 Preparando automação...")
     btn_iniciar.configure(state="disabled", text="⏳ Processando...")
     
+    perfilar = perfil_var.get()
+
     def executar():
         try:
-            automatizar(resp, cpf)
+            with (PerfilAmostral() if perfilar else contextlib.nullcontext()):
+                automatizar(resp, cpf)
         finally:
-            btn_iniciar.configure(state="normal", text="🚀 Iniciar Automação")
+            publicar_gui(lambda: btn_iniciar.configure(state="normal", text="🚀 Iniciar Automação"))
     
     threading.Thread(target=executar, daemon=True).start()
 
+_painel_redesenho = {"t": 0.0}
+
+def atualizar_painel():
+    """Redesenha o painel; se houve tramitação concluída desde o último redesenho, leva a barra
+    a feitos/total da tramitação (os demais eventos não mexem na barra das fases iniciais)."""
+    for chave, texto in textos_painel(PAINEL).items():
+        painel_valores[chave].configure(text=texto)
+    tramitar = PAINEL.etapas["tramitar"]
+    if PAINEL.progresso_pendente and tramitar["total"]:
+        progress.set(0.4 + 0.6 * min(1.0, tramitar["feitos"] / tramitar["total"]))
+    PAINEL.progresso_pendente = False
+    _painel_redesenho["t"] = time.monotonic()
+
+def _drenar_fila_gui():
+    """Executa no laço do Tk as atualizações publicadas pelas threads/corrotinas de automação."""
+    eventos = 0
+    try:
+        while True:
+            funcao, args = _fila_gui.get_nowait()
+            eventos += 1
+            try:
+                funcao(*args)
+            except Exception as e:
+                registrar_log(f"[Aviso] Falha ao atualizar a interface: {e}")
+    except queue.Empty:
+        pass
+    # Redesenha com novos eventos ou a cada segundo (ritmo e previsão mudam com o relógio)
+    if eventos or time.monotonic() - _painel_redesenho["t"] >= 1.0:
+        try:
+            atualizar_painel()
+        except Exception as e:
+            registrar_log(f"[Aviso] Falha ao atualizar o painel: {e}")
+    root.after(100, _drenar_fila_gui)
+
+_visor_logs = {"janela": None}
+
 def abrir_logs():
-    if os.path.exists(LOG_FILE):
-        os.startfile(LOG_FILE)
-    else:
+    """Abre (ou traz à frente) o visualizador de logs com filtros e acompanhamento em tempo real."""
+    if not os.path.exists(LOG_FILE):
         registrar_log("Arquivo de log criado.")
-        os.startfile(LOG_FILE)
+    janela = _visor_logs["janela"]
+    if janela is not None and janela.winfo_exists():
+        janela.lift()
+        janela.focus_force()
+        return
+
+    top = ctk.CTkToplevel(root)
+    top.title("Logs UECI")
+    top.geometry("1000x600")
+    _visor_logs["janela"] = top
+    estado = {"indice": IndiceLog(LOG_FILE), "filtro": {}, "ao_vivo": True}
+
+    filtros = ctk.CTkFrame(top, fg_color="transparent")
+    filtros.pack(fill="x", padx=10, pady=(10, 5))
+
+    arquivo_var = ctk.StringVar(value=LOG_FILE)
+    nivel_var = ctk.StringVar(value="Todos")
+    processo_var = ctk.StringVar()
+    data_var = ctk.StringVar()
+
+    arquivo_menu = ctk.CTkOptionMenu(filtros, values=listar_logs(), variable=arquivo_var, width=260)
+    arquivo_menu.pack(side="left", padx=(0, 6))
+    niveis_padrao = ("Erro", "Aviso", "OK", "Info", "Diag", "Retry")
+    nivel_menu = ctk.CTkOptionMenu(filtros, values=["Todos", *niveis_padrao], variable=nivel_var, width=110)
+    nivel_menu.pack(side="left", padx=6)
+    ctk.CTkEntry(filtros, textvariable=processo_var, placeholder_text="Nº do processo", width=150).pack(side="left", padx=6)
+    ctk.CTkEntry(filtros, textvariable=data_var, placeholder_text="AAAA-MM-DD", width=120).pack(side="left", padx=6)
+
+    texto = ctk.CTkTextbox(top, font=ctk.CTkFont(family="Consolas", size=12), wrap="none")
+    texto.pack(fill="both", expand=True, padx=10, pady=(5, 10))
+
+    def _filtro_atual():
+        nivel = nivel_var.get()
+        return {
+            "nivel": None if nivel == "Todos" else nivel,
+            "processo": processo_var.get().strip() or None,
+            "data": data_var.get().strip() or None,
+        }
+
+    def aplicar_filtro(*_):
+        caminho = arquivo_var.get()
+        if estado["indice"].caminho != caminho:
+            estado["indice"] = IndiceLog(caminho)
+        # Acompanha em tempo real apenas o arquivo atual
+        estado["ao_vivo"] = (caminho == LOG_FILE)
+        estado["filtro"] = _filtro_atual()
+        indice = estado["indice"]
+        indice.atualizar()
+        nivel_menu.configure(values=["Todos", *niveis_padrao, *[n for n in indice.niveis() if n not in niveis_padrao]])
+        texto.configure(state="normal")
+        texto.delete("1.0", "end")
+        linhas = indice.filtrar(**estado["filtro"])
+        if linhas:
+            texto.insert("end", "\n".join(linhas) + "\n")
+        texto.see("end")
+        texto.configure(state="disabled")
+
+    def acompanhar():
+        if not top.winfo_exists():
+            return
+        if estado["ao_vivo"]:
+            indice = estado["indice"]
+            novas = [e for e in indice.atualizar() if IndiceLog.corresponde(e, **estado["filtro"])]
+            if novas:
+                texto.configure(state="normal")
+                texto.insert("end", "\n".join(indice.ler(novas)) + "\n")
+                # Mantém o visor enxuto: descarta o início quando passar do limite
+                excesso = int(texto.index("end-1c").split(".")[0]) - LOG_VISOR_LINHAS
+                if excesso > 0:
+                    texto.delete("1.0", f"{excesso + 1}.0")
+                texto.see("end")
+                texto.configure(state="disabled")
+        top.after(1000, acompanhar)
+
+    def abrir_no_editor():
+        try:
+            os.startfile(arquivo_var.get())
+        except Exception as e:
+            registrar_log(f"[Aviso] Não foi possível abrir o log no editor: {e}")
+
+    def atualizar_arquivos():
+        arquivo_menu.configure(values=listar_logs())
+
+    arquivo_menu.configure(command=lambda _v: aplicar_filtro())
+    nivel_menu.configure(command=lambda _v: aplicar_filtro())
+    ctk.CTkButton(filtros, text="🔎 Filtrar", width=90, command=aplicar_filtro).pack(side="left", padx=6)
+    ctk.CTkButton(filtros, text="↻", width=36, command=atualizar_arquivos).pack(side="left", padx=6)
+    ctk.CTkButton(filtros, text="📂 Abrir arquivo", width=120, command=abrir_no_editor).pack(side="right")
+
+    aplicar_filtro()
+    top.after(1000, acompanhar)
 
 btn_iniciar = ctk.CTkButton(
     buttons_frame,
@@ -1527,5 +5026,11 @@ footer_label = ctk.CTkLabel(
 )
 footer_label.pack(pady=(0, 15))
 
+iniciar_servidor_metricas()
 
+root.after(100, _drenar_fila_gui)
 root.mainloop()
+cancelar_orquestracao(espera=ASYNC_FECHAR_TIMEOUT + 2)
+# Garante encerramento do ChromeDriver para evitar arquivos em uso no _MEI* (PyInstaller)
+descartar_driver()
+encerrar_servico_chromedriver()
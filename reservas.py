@@ -0,0 +1,155 @@
+"""Reservas (leases) de números de processo compartilhadas entre operadores num arquivo SQLite.
+
+Só biblioteca padrão, para poder ser testado sem o navegador nem a interface (ver tests/).
+"""
+import contextlib
+import os
+import socket
+import sqlite3
+import time
+
+
+class ReservasProcessos:
+    """Reserva (lease com validade) de números de processo num arquivo SQLite compartilhado,
+    para que várias máquinas dividam a mesma caixa do setor sem trabalhar no mesmo processo.
+    Cada operação abre sua própria conexão e usa BEGIN IMMEDIATE (trava de escrita do SQLite).
+
+    Limitações:
+    - A exclusão depende da trava de arquivo do compartilhamento. A documentação do SQLite avisa
+      que travas em SMB/NFS podem falhar; nesse caso duas máquinas podem reservar o mesmo
+      processo. Use um compartilhamento com travas confiáveis (SMB de servidor Windows, sem
+      cache de escrita no cliente) e trate a reserva como proteção de melhor esforço.
+    - A validade não compara relógios de máquinas diferentes: cada gravação deixa uma marca
+      (`atualizado_em`), e uma reserva alheia só vence depois que *este* operador a viu sem mudar
+      por `ttl` segundos no próprio relógio monotônico. Sem observação tão longa (reserva de
+      quem caiu, vista pela primeira vez nesta execução), vale a hora de quem gravou com folga de
+      `tolerancia` segundos; diferenças de relógio maiores que essa folga ainda podem antecipar
+      a expiração de reservas abandonadas (nunca de reservas renovadas por um operador ativo
+      enquanto este operador as observa).
+    """
+
+    def __init__(self, caminho: str, dono: str | None = None, ttl: float = 600.0,
+                 ttl_concluido: float = 3600.0, tolerancia: float = 900.0, relogio=time.time):
+        self.caminho = caminho
+        self.dono = dono or f"{os.getenv('USERNAME', 'Usuário')}@{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+        self.ttl_concluido = ttl_concluido
+        self.tolerancia = tolerancia
+        self.relogio = relogio
+        self._renovadas = {}   # processo -> instante da última reserva/renovação deste operador
+        self._vistas = {}      # processo -> (marca da linha alheia, instante monotônico da 1ª vista)
+        with self._conexao() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS reservas ("
+                " processo TEXT PRIMARY KEY,"
+                " dono TEXT NOT NULL,"
+                " estado TEXT NOT NULL,"
+                " expira_em REAL NOT NULL,"
+                " atualizado_em REAL NOT NULL)"
+            )
+
+    @contextlib.contextmanager
+    def _conexao(self):
+        con = sqlite3.connect(self.caminho, timeout=15, isolation_level=None)
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        finally:
+            con.close()
+
+    def _validade(self, estado: str) -> float:
+        return self.ttl_concluido if estado == "concluido" else self.ttl
+
+    def _observar(self, processo: str, dono: str, estado: str, atualizado_em: float) -> float:
+        """Registra a linha vista; retorna há quantos segundos (relógio local) ela não muda."""
+        marca = (dono, estado, atualizado_em)
+        agora = time.monotonic()
+        vista = self._vistas.get(processo)
+        if vista is None or vista[0] != marca:
+            self._vistas[processo] = (marca, agora)
+            return 0.0
+        return agora - vista[1]
+
+    def _vencida(self, processo: str, dono: str, estado: str, atualizado_em: float) -> bool:
+        validade = self._validade(estado)
+        if self._observar(processo, dono, estado, atualizado_em) >= validade:
+            return True
+        return self.relogio() - atualizado_em >= validade + self.tolerancia
+
+    def observar(self):
+        """Começa a observar todas as reservas existentes (chamar ao abrir, antes de trabalhar)."""
+        with self._conexao() as con:
+            linhas = con.execute("SELECT processo, dono, estado, atualizado_em FROM reservas").fetchall()
+        for processo, dono, estado, atualizado_em in linhas:
+            if dono != self.dono:
+                self._observar(processo, dono, estado, atualizado_em)
+
+    def reservar(self, processo: str) -> bool:
+        """Reserva o processo para este operador. False se outro operador detém uma reserva válida
+        ou se o processo já foi concluído recentemente."""
+        agora = self.relogio()
+        with self._conexao() as con:
+            linha = con.execute("SELECT dono, estado, atualizado_em FROM reservas WHERE processo = ?", (processo,)).fetchone()
+            if linha:
+                dono, estado, atualizado_em = linha
+                if (estado == "concluido" or dono != self.dono) and not self._vencida(processo, dono, estado, atualizado_em):
+                    return False
+            con.execute(
+                "INSERT OR REPLACE INTO reservas (processo, dono, estado, expira_em, atualizado_em) VALUES (?, ?, 'em_andamento', ?, ?)",
+                (processo, self.dono, agora + self.ttl, agora),
+            )
+        self._vistas.pop(processo, None)
+        self._renovadas[processo] = time.monotonic()
+        return True
+
+    def renovar(self, processo: str) -> bool:
+        agora = self.relogio()
+        with self._conexao() as con:
+            cur = con.execute(
+                "UPDATE reservas SET expira_em = ?, atualizado_em = ? WHERE processo = ? AND dono = ? AND estado = 'em_andamento'",
+                (agora + self.ttl, agora, processo, self.dono),
+            )
+            renovada = cur.rowcount > 0
+        if renovada:
+            self._renovadas[processo] = time.monotonic()
+        return renovada
+
+    def manter(self, processo: str) -> bool:
+        """Renova a reserva só se a última renovação passou de um terço do TTL (barato para chamar
+        entre etapas e durante pausas). False se a reserva foi perdida para outro operador."""
+        if time.monotonic() - self._renovadas.get(processo, float("-inf")) < self.ttl / 3:
+            return True
+        return self.renovar(processo)
+
+    def concluir(self, processo: str):
+        """Marca como tramitado; bloqueia nova reserva até a lista dos outros operadores atualizar."""
+        self._renovadas.pop(processo, None)
+        agora = self.relogio()
+        with self._conexao() as con:
+            con.execute(
+                "UPDATE reservas SET estado = 'concluido', expira_em = ?, atualizado_em = ? WHERE processo = ? AND dono = ?",
+                (agora + self.ttl_concluido, agora, processo, self.dono),
+            )
+
+    def liberar(self, processo: str):
+        """Desfaz a reserva em andamento (falha), permitindo que outro operador tente."""
+        self._renovadas.pop(processo, None)
+        with self._conexao() as con:
+            con.execute(
+                "DELETE FROM reservas WHERE processo = ? AND dono = ? AND estado = 'em_andamento'",
+                (processo, self.dono),
+            )
+
+    def limpar_expiradas(self) -> int:
+        """Remove reservas vencidas há muito (validade + folga de relógio, pela hora de quem gravou)."""
+        agora = self.relogio()
+        with self._conexao() as con:
+            return con.execute(
+                "DELETE FROM reservas WHERE atualizado_em < ? - CASE estado WHEN 'concluido' THEN ? ELSE ? END",
+                (agora - self.tolerancia, self.ttl_concluido, self.ttl),
+            ).rowcount
@@ -0,0 +1,109 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reservas import ReservasProcessos  # noqa: E402
+
+TTL = 0.3
+
+
+class TestReservasProcessos(unittest.TestCase):
+    """Dois operadores (A e B) sobre o mesmo arquivo SQLite temporário."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.dir.name, "reservas.db")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def operador(self, dono, **kw):
+        kw.setdefault("ttl", TTL)
+        kw.setdefault("ttl_concluido", TTL)
+        kw.setdefault("tolerancia", 3600)
+        return ReservasProcessos(self.caminho, dono=dono, **kw)
+
+    def test_dois_donos_nao_reservam_o_mesmo_processo(self):
+        a, b = self.operador("A"), self.operador("B")
+        self.assertTrue(a.reservar("2024.000001"))
+        self.assertFalse(b.reservar("2024.000001"))
+        self.assertTrue(b.reservar("2024.000002"))
+        self.assertFalse(a.reservar("2024.000002"))
+        # O próprio dono pode reservar de novo (retentativa)
+        self.assertTrue(a.reservar("2024.000001"))
+
+    def test_concluido_bloqueia_ate_expirar(self):
+        a, b = self.operador("A"), self.operador("B")
+        self.assertTrue(a.reservar("1"))
+        a.concluir("1")
+        self.assertFalse(b.reservar("1"))
+        self.assertFalse(a.reservar("1"))
+        time.sleep(TTL + 0.1)
+        self.assertTrue(b.reservar("1"))
+
+    def test_liberar_permite_outro_dono(self):
+        a, b = self.operador("A"), self.operador("B")
+        self.assertTrue(a.reservar("1"))
+        a.liberar("1")
+        self.assertTrue(b.reservar("1"))
+
+    def test_expira_sem_renovacao(self):
+        a, b = self.operador("A"), self.operador("B")
+        self.assertTrue(a.reservar("1"))
+        self.assertFalse(b.reservar("1"))
+        time.sleep(TTL + 0.1)
+        self.assertTrue(b.reservar("1"))
+
+    def test_renovacao_mantem_a_reserva(self):
+        a, b = self.operador("A"), self.operador("B")
+        self.assertTrue(a.reservar("1"))
+        for _ in range(4):
+            self.assertFalse(b.reservar("1"))
+            time.sleep(TTL / 2)
+            self.assertTrue(a.manter("1"))
+        self.assertFalse(b.reservar("1"))
+
+    def test_reserva_perdida(self):
+        a, b = self.operador("A"), self.operador("B")
+        self.assertTrue(a.reservar("1"))
+        b.observar()
+        time.sleep(TTL + 0.1)
+        self.assertTrue(b.reservar("1"))
+        self.assertFalse(a.renovar("1"))
+        self.assertFalse(a.manter("1"))
+        # Concluir/liberar de quem perdeu não mexe na reserva do novo dono
+        a.liberar("1")
+        a.concluir("1")
+        self.assertTrue(b.renovar("1"))
+
+    def test_relogio_adiantado_nao_rouba_reserva_ativa(self):
+        a = self.operador("A")
+        b = self.operador("B", relogio=lambda: time.time() + 10 * TTL)
+        self.assertTrue(a.reservar("1"))
+        for _ in range(4):
+            self.assertFalse(b.reservar("1"))
+            time.sleep(TTL / 2)
+            self.assertTrue(a.manter("1"))
+
+    def test_reserva_abandonada_expira_pela_hora_de_quem_gravou(self):
+        # Gravada há mais que validade + folga: vence já na primeira vista, sem esperar o TTL
+        a = self.operador("A", tolerancia=60, relogio=lambda: time.time() - 120)
+        b = self.operador("B", tolerancia=60)
+        self.assertTrue(a.reservar("1"))
+        self.assertTrue(b.reservar("1"))
+
+    def test_limpar_expiradas(self):
+        antigo = self.operador("A", tolerancia=60, relogio=lambda: time.time() - 120)
+        self.assertTrue(antigo.reservar("1"))
+        a = self.operador("A", tolerancia=60)
+        self.assertTrue(a.reservar("2"))
+        self.assertEqual(a.limpar_expiradas(), 1)
+        self.assertFalse(self.operador("B").reservar("2"))
+
+
+if __name__ == "__main__":
+    unittest.main()